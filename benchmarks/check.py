@@ -0,0 +1,94 @@
+"""
+Microbenchmark of sections.check against the original breadth-first search.
+Both are run on the same raw (unchecked) sections of every world generator,
+and must give the same answer for each of them.
+
+Run from the root of the repository:
+    python -m benchmarks.check [--sections 200] [--seed 0]
+"""
+import argparse
+import time
+from collections import deque
+import numpy as np
+from crossyroadenv.const import *
+from crossyroadenv.sections import check
+from crossyroadenv.world import World
+
+def checkBFS(lst, max_steps, worldT):
+    """
+    The original sections.check: a breadth-first search over a box of
+    max_steps x len(lst) x GRIDWIDTH cells, without a visited set
+    """
+    box = []
+    copylst = [x.copy() for x in lst]
+
+    def generate_box_layer():
+        fullobs = []
+        for layer in copylst:
+            obs = TILE_BLOCKED[layer.observation(worldT)].astype(int)
+            fullobs.append(obs)
+            layer.update()
+        return np.array(fullobs)
+
+    for _ in range(max_steps):
+        box.append(generate_box_layer())
+
+    box = np.array(box)
+
+    directions = [(1,1,0),(1,0,1),(1,0,-1),(1,-1,0),(1,0,0)]
+    queue = deque([(0,0,ind) for ind, x in enumerate(box[0][0]) if x == 0])
+    newqueue = deque()
+
+    while queue:
+        while queue:
+            p = queue.popleft()
+            box[p[0]][p[1]][p[2]] = 2
+
+            if p[0] == len(lst)-1:
+                return True
+
+            for item in directions:
+                z = p[0] + item[0]
+                y = p[1] + item[1]
+                x = p[2] + item[2]
+
+                if z >= 0 and y >= 0 and x >= 0 and x < GRIDWIDTH and y < len(lst) and z < max_steps and box[z][y][x] != 1:
+                    newqueue.append((z,y,x))
+        queue = newqueue.copy()
+        newqueue.clear()
+
+    return False
+
+def rawSections(generator, n, rng):
+    """Generates n sections with generator, without rejecting any of them"""
+    add = generator.add.__wrapped__
+    return [(add(generator, t, rng), t) for t in rng.integers(0, 10000, size=n)]
+
+def timeit(func, sections, max_steps):
+    start = time.perf_counter()
+    answers = [func(lst, max_steps, t) for lst, t in sections]
+    return time.perf_counter() - start, answers
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=200, help="raw sections per world generator")
+    parser.add_argument("--max-steps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    world = World(seed=args.seed)
+
+    print(f"{'generator':<16}{'accepted':>10}{'bfs [ms]':>12}{'bits [ms]':>12}{'speedup':>10}")
+    for name in ['default', 'nologs', 'hybrid', 'lookalike', 'lookalikeincdif', 'allgrass', 'alllogs']:
+        sections = rawSections(world.getWorldGenerator(name), args.sections, rng)
+
+        old, expected = timeit(checkBFS, sections, args.max_steps)
+        new, answers = timeit(check, sections, args.max_steps)
+        if answers != expected:
+            raise AssertionError(f"check disagrees with the original search for {name}")
+
+        print(f"{name:<16}{sum(answers):>10}{1000*old/len(sections):>12.3f}{1000*new/len(sections):>12.4f}{old/new:>10.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark of the multi-process vector environment. Steps num_envs worlds with a
+fixed-seed random policy that favours moving up, in CrossyRoadVectorEnv in this
+process, in gymnasium's AsyncVectorEnv of scalar environments, and in
+SharedVectorEnv with 1, 2, 4, ... workers up to the number of cores, and prints
+the steps/s of each and the speedup of SharedVectorEnv over a single worker.
+
+Run from the root of the repository:
+    python -m benchmarks.parallel [--envs 256] [--steps 500] [--max-workers 64]
+"""
+import argparse
+import os
+import time
+import numpy as np
+import gymnasium as gym
+from crossyroadenv.env import CrossyRoadEnv
+from crossyroadenv.parallel import SharedVectorEnv
+from crossyroadenv.vector import CrossyRoadVectorEnv
+
+def throughput(env, actions, seed) -> float:
+    """Steps/s of env over the actions, one row per step"""
+    env.reset(seed=seed)
+    start = time.perf_counter()
+    for action in actions:
+        env.step(action)
+    elapsed = time.perf_counter() - start
+    env.close()
+    return actions.size / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--envs", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--async-envs", type=int, default=None, help="worlds of AsyncVectorEnv, one process each, min(envs, cores) by default")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    actions = rng.choice(5, p=[0.4, 0.15, 0.1, 0.15, 0.2], size=(args.steps, args.envs))
+    print(f"{'environment':<32}{'steps/s':>12}{'speedup':>10}")
+
+    rate = throughput(CrossyRoadVectorEnv(args.envs), actions, args.seed)
+    print(f"{'CrossyRoadVectorEnv':<32}{rate:>12.0f}")
+
+    asyncEnvs = args.async_envs or min(args.envs, os.cpu_count())
+    env = gym.vector.AsyncVectorEnv([lambda: CrossyRoadEnv() for _ in range(asyncEnvs)])
+    rate = throughput(env, actions[:, :asyncEnvs], args.seed)
+    print(f"{f'AsyncVectorEnv ({asyncEnvs} processes)':<32}{rate:>12.0f}")
+
+    workers, single = 1, None
+    while workers <= min(args.max_workers, args.envs):
+        rate = throughput(SharedVectorEnv(args.envs, workers=workers), actions, args.seed)
+        single = single or rate
+        print(f"{f'SharedVectorEnv ({workers} workers)':<32}{rate:>12.0f}{rate/single:>9.2f}x")
+        workers *= 2
+
+if __name__ == "__main__":
+    main()
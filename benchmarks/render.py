@@ -0,0 +1,56 @@
+"""
+Benchmark of rendering. A fixed-seed random policy that favours moving up
+is run, and every frame is rendered. Finished episodes are reset. Only the
+rendering is timed. The human mode times renderWorld in a headless display,
+the rgb_array mode times env.render, with --thumbnail k for thumbnails.
+
+Run from the root of the repository:
+    python -m benchmarks.render [--frames 2000] [--seed 0] [--mode human] [--thumbnail k]
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import time
+import numpy as np
+from crossyroadenv.env import CrossyRoadEnv
+from crossyroadenv.render import ATLAS, renderWorld
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default="human", choices=["human", "rgb_array"])
+    parser.add_argument("--thumbnail", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    actions = [int(a) for a in rng.choice(5, p=[0.4, 0.15, 0.1, 0.15, 0.2], size=args.frames)]
+
+    env = CrossyRoadEnv(render_mode=args.mode, thumbnail=args.thumbnail, copy=False)
+    draw = (lambda: renderWorld(env.world, env.agent)) if args.mode == "human" else env.render
+    env.reset(seed=args.seed)
+    renderTime = 0.0
+    resets = 0
+
+    for action in actions:
+        start = time.perf_counter()
+        draw()
+        renderTime += time.perf_counter() - start
+
+        _, _, terminated, truncated, _ = env.step(action)
+        if terminated or truncated:
+            resets += 1
+            env.reset(seed=args.seed+resets)
+    env.close()
+
+    print(f"frames     {args.frames:>10}")
+    print(f"frame [ms] {1e3*renderTime/args.frames:>10.3f}")
+    print(f"frames/s   {args.frames/renderTime:>10.0f}")
+    if args.mode == "human":
+        print(f"sprites    {len(ATLAS):>10}")
+        print(f"hits       {ATLAS.hits:>10}")
+        print(f"misses     {ATLAS.misses:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark of episode records. Episodes of a fixed-seed random policy that favours
+moving up are recorded to an episode file, which is then read back and verified
+by replaying every episode, in this process and with a pool of workers.
+
+Run from the root of the repository:
+    python -m benchmarks.replay [--episodes 1000] [--seed 0] [--workers 4] [--path episodes.bin]
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+from crossyroadenv.env import CrossyRoadEnv
+from crossyroadenv.replay import readEpisodes, writeEpisodes, verify
+
+def record(episodes, seed):
+    """Plays episodes episodes with a random policy and returns them"""
+    rng = np.random.default_rng(seed)
+    env = CrossyRoadEnv()
+    recorded = []
+    for i in range(episodes):
+        env.reset(seed=seed+i)
+        terminated = truncated = False
+        while not (terminated or truncated):
+            _, _, terminated, truncated, _ = env.step(int(rng.choice(5, p=[0.4, 0.1, 0.05, 0.1, 0.35])))
+        recorded.append(env.episode())
+    env.close()
+    return recorded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--path", default=None)
+    args = parser.parse_args()
+
+    episodes = record(args.episodes, args.seed)
+    steps = sum(len(episode.actions) for episode in episodes)
+    path = args.path or os.path.join(tempfile.mkdtemp(), "episodes.bin")
+
+    start = time.perf_counter()
+    writeEpisodes(path, episodes)
+    writeTime = time.perf_counter() - start
+    start = time.perf_counter()
+    assert list(readEpisodes(path)) == episodes
+    readTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    local = verify(readEpisodes(path), workers=0)
+    localTime = time.perf_counter() - start
+    start = time.perf_counter()
+    pooled = verify(readEpisodes(path), workers=args.workers)
+    poolTime = time.perf_counter() - start
+
+    size = os.path.getsize(path)
+    listSize = len(pickle.dumps([list(episode.actions) for episode in episodes]))
+    print(f"episodes           {args.episodes:>10}")
+    print(f"steps              {steps:>10}")
+    print(f"file [bytes]       {size:>10}")
+    print(f"bytes/episode      {size/args.episodes:>10.1f}")
+    print(f"bytes/step         {size/steps:>10.3f}")
+    print(f"pickled lists      {listSize:>10}")
+    print(f"write [ms]         {1e3*writeTime:>10.1f}")
+    print(f"read [ms]          {1e3*readTime:>10.1f}")
+    print(f"verify [steps/s]   {steps/localTime:>10.0f}")
+    print(f"pool [steps/s]     {steps/poolTime:>10.0f}")
+    print(f"mismatches         {len(local):>10} {len(pooled):>4}")
+
+if __name__ == "__main__":
+    main()
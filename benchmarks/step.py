@@ -0,0 +1,56 @@
+"""
+Benchmark of CrossyRoadEnv.step. A fixed-seed random policy that favours
+moving up is run for a number of steps, finished episodes are reset.
+Resets are timed separately, such that the step time only covers step.
+
+Run from the root of the repository:
+    python -m benchmarks.step [--steps 20000] [--seed 0]
+"""
+import argparse
+import time
+import numpy as np
+from crossyroadenv.env import CrossyRoadEnv
+
+def run(env, actions, seed):
+    """Runs the actions, returns the time spent in step and in reset and the number of resets"""
+    stepTime = resetTime = 0.0
+    resets = 0
+
+    start = time.perf_counter()
+    env.reset(seed=seed)
+    resetTime += time.perf_counter() - start
+
+    for action in actions:
+        start = time.perf_counter()
+        _, _, terminated, truncated, _ = env.step(action)
+        stepTime += time.perf_counter() - start
+
+        if terminated or truncated:
+            resets += 1
+            start = time.perf_counter()
+            env.reset(seed=seed+resets)
+            resetTime += time.perf_counter() - start
+
+    return stepTime, resetTime, resets
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    actions = [int(a) for a in rng.choice(5, p=[0.4, 0.15, 0.1, 0.15, 0.2], size=args.steps)]
+
+    env = CrossyRoadEnv()
+    stepTime, resetTime, resets = run(env, actions, args.seed)
+    env.close()
+
+    print(f"steps      {args.steps:>10}")
+    print(f"step [us]  {1e6*stepTime/args.steps:>10.1f}")
+    print(f"steps/s    {args.steps/stepTime:>10.0f}")
+    print(f"resets     {resets+1:>10}")
+    print(f"reset [ms] {1e3*resetTime/(resets+1):>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Benchmark suite of the environment. Measures, for every world generator, the
+step throughput, the reset latency, the calls of sections.check and the
+distribution of the retries of env_checker, then the throughput of the vector
+environment, which must step like the scalar one, followed by the observation,
+rendering and GIF export, the growth of the memory over a long run, and
+the cold start of a worker: the time and memory of importing the environment
+in a new interpreter, which must not import pygame or PIL, and the cost of
+metrics.enable, which must time every phase.
+Every metric is printed, and written to a JSON file with --json. Two JSON
+files are compared with --compare, which flags the metrics that got worse
+by more than --threshold and exits with status 1 if there are any.
+
+Run from the root of the repository:
+    python -m benchmarks.suite [--quick] [--json results.json] [--only step,render]
+    python -m benchmarks.suite --compare before.json after.json [--threshold 0.1]
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from contextlib import contextmanager
+from crossyroadenv import sections
+from crossyroadenv.config import DEFAULT_CONFIG
+from crossyroadenv.env import CrossyRoadEnv
+from crossyroadenv.sections import GENERATORS
+from crossyroadenv.vector import CrossyRoadVectorEnv
+
+# Number of steps, resets, ... of every benchmark, and of every benchmark with --quick
+SIZES = {
+    'steps': (20000, 2000),
+    'resets': (200, 20),
+    'sections': (500, 50),
+    'observations': (20000, 2000),
+    'frames': (1000, 100),
+    'gifSteps': (200, 40),
+    'rssSteps': (10**6, 20000),
+    'imports': (20, 5),
+    'vectorEnvs': (64, 16),
+    'vectorSteps': (500, 100),
+}
+
+# Configs of the vector benchmark, in each of which CrossyRoadVectorEnv must step like CrossyRoadEnv
+VECTOR_CONFIGS = {
+    'default': DEFAULT_CONFIG,
+    'static_rails': DEFAULT_CONFIG.replace(RAIL_DIRECTION_R=0, RAIL_DIRECTION_L=0, RAIL_DIRECTION_S=1, CHANCE_RAIL=0.4, CHANCE_LOGS=0),
+    'tall': DEFAULT_CONFIG.replace(GRIDHEIGHT=30, APPHEIGHT=900, OBS_WINDOW=(1, 28, 7, 7)),
+}
+
+# Modules whose import is timed, and whether they may import the rendering stack
+IMPORTS = {
+    'crossyroadenv.env': False,
+    'crossyroadenv.parallel': False,
+    'crossyroadenv.render': True,
+}
+
+# Measures the import of a module in a new interpreter: time, resident memory and rendering modules
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+with open('/proc/self/statm') as f:
+    rss = int(f.read().split()[1])
+print(elapsed, rss, int('pygame' in sys.modules or 'PIL' in sys.modules))
+"""
+
+class Results:
+    """Metrics by name, each with a value, a unit and whether higher or lower values are better"""
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better = None):
+        self.metrics[name] = {'value': float(value), 'unit': unit, 'better': better}
+        print(f"{name:<40}{value:>14.3f} {unit}", flush=True)
+
+def policy(n, seed) -> list[int]:
+    """Actions of a fixed-seed random policy that favours moving up"""
+    rng = np.random.default_rng(seed)
+    return [int(a) for a in rng.choice(5, p=[0.4, 0.15, 0.1, 0.15, 0.2], size=n)]
+
+@contextmanager
+def countChecks():
+    """Counts the calls of sections.check, which env_checker looks up at every call"""
+    calls = [0]
+    original = sections.check
+    def counted(*args, **kwargs):
+        calls[0] += 1
+        return original(*args, **kwargs)
+    sections.check = counted
+    try:
+        yield calls
+    finally:
+        sections.check = original
+
+def rss() -> float:
+    """Resident memory of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+def benchStep(results, sizes, seed):
+    """Steps/s, reset latency and calls of check while stepping, per world generator"""
+    actions = policy(sizes['steps'], seed)
+    for name in GENERATORS:
+        env = CrossyRoadEnv(WORLD_GENERATOR=name)
+        env.reset(seed=seed)
+        with countChecks() as calls:
+            stepTime, resets = 0.0, 0
+            for action in actions:
+                start = time.perf_counter()
+                _, _, terminated, truncated, _ = env.step(action)
+                stepTime += time.perf_counter() - start
+                if terminated or truncated:
+                    resets += 1
+                    env.reset(seed=seed+resets)
+
+            resetTimes = []
+            for i in range(sizes['resets']):
+                start = time.perf_counter()
+                env.reset(seed=seed+i)
+                resetTimes.append(time.perf_counter() - start)
+        env.close()
+
+        results.add(f"step.{name}.steps_per_s", len(actions)/stepTime, "steps/s", "higher")
+        results.add(f"reset.{name}.mean_ms", 1e3*np.mean(resetTimes), "ms", "lower")
+        results.add(f"reset.{name}.p90_ms", 1e3*np.percentile(resetTimes, 90), "ms", "lower")
+        results.add(f"check.{name}.calls_per_kstep", 1e3*calls[0]/(len(actions)+sizes['resets']), "calls", "lower")
+
+def benchVector(results, sizes, seed):
+    """
+    Steps/s of CrossyRoadVectorEnv in every config of VECTOR_CONFIGS. Its windows must match
+    a fresh evaluation of their layers, and its episodes those of CrossyRoadEnv
+    """
+    n, steps = sizes['vectorEnvs'], sizes['vectorSteps']
+    actions = np.array(policy(n*steps, seed)).reshape(steps, n)
+    for name, config in VECTOR_CONFIGS.items():
+        env = CrossyRoadVectorEnv(n, config=config)
+        obs, _ = env.reset(seed=seed)
+        episodes = [[(obs[i].copy(), 0.0, False, False)] for i in range(n)]
+        done = np.zeros(n, dtype=bool)
+        stepTime, stale = 0.0, 0
+        for row in actions:
+            start = time.perf_counter()
+            obs, rewards, terminated, truncated, _ = env.step(row)
+            stepTime += time.perf_counter() - start
+            for i in range(n):
+                stale += any(not np.array_equal(env.codes[i, j], layer.observation(int(env.t[i]))) for j, layer in enumerate(env._visible[i]))
+            for i in np.flatnonzero(~done):
+                episodes[i].append((obs[i].copy(), rewards[i], terminated[i], truncated[i]))
+            done |= terminated | truncated
+        env.close()
+        if stale:
+            raise RuntimeError(f"CrossyRoadVectorEnv kept {stale} stale windows with {name}")
+
+        scalar, different = CrossyRoadEnv(config=config), 0
+        for i in range(n):
+            obs, _ = scalar.reset(seed=seed+i)
+            transitions = [(obs, 0.0, False, False)]
+            for action in actions[:len(episodes[i])-1, i]:
+                obs, reward, terminated, truncated, _ = scalar.step(int(action))
+                transitions.append((obs, reward, terminated, truncated))
+            different += any(not np.array_equal(a[0], b[0]) or a[1:] != b[1:] for a, b in zip(transitions, episodes[i]))
+        scalar.close()
+        if different:
+            raise RuntimeError(f"{different} worlds of CrossyRoadVectorEnv differ from CrossyRoadEnv with {name}")
+        results.add(f"vector.{name}.steps_per_s", actions.size/stepTime, "steps/s", "higher")
+
+def benchGeneration(results, sizes, seed):
+    """Time per section and the distribution of the retries of env_checker, per world generator"""
+    rng = np.random.default_rng(seed)
+    for name in GENERATORS:
+        generator = GENERATORS[name](DEFAULT_CONFIG)
+        retries = []
+        with countChecks() as calls:
+            start = time.perf_counter()
+            for t in rng.integers(0, 10000, size=sizes['sections']):
+                before = calls[0]
+                generator.add(int(t), rng)
+                retries.append(calls[0] - before - 1)
+            elapsed = time.perf_counter() - start
+
+        results.add(f"generate.{name}.section_ms", 1e3*elapsed/sizes['sections'], "ms", "lower")
+        results.add(f"generate.{name}.retries_mean", np.mean(retries), "retries", "lower")
+        results.add(f"generate.{name}.retries_p90", np.percentile(retries, 90), "retries")
+        results.add(f"generate.{name}.retries_max", np.max(retries), "retries")
+        results.add(f"generate.{name}.no_retry_share", np.mean(np.array(retries) == 0), "share")
+
+def benchObservation(results, sizes, seed):
+    """getObservationFloats, Mask.apply and the observation of step"""
+    env = CrossyRoadEnv()
+    env.reset(seed=seed)
+    for action in policy(30, seed):
+        env.step(action)
+    world, agent, mask = env.world, env.agent, env.mask
+    n = sizes['observations']
+    floats = world.getObservationFloats(agent)
+    out = np.empty(mask.shapeObs)
+
+    for name, call in [
+        ("getObservationFloats", lambda: world.getObservationFloats(agent)),
+        ("Mask.apply", lambda: mask.apply(floats, agent, out)),
+        ("observation", env._getObservation),
+    ]:
+        start = time.perf_counter()
+        for i in range(n):
+            world.t += 1
+            call()
+        results.add(f"observation.{name}_us", 1e6*(time.perf_counter()-start)/n, "us", "lower")
+    env.close()
+
+def benchRender(results, sizes, seed):
+    """Frames/s of the human and the rgb_array render modes and of thumbnails"""
+    from crossyroadenv.render import renderWorld
+    actions = policy(sizes['frames'], seed)
+    for name, kwargs in [("human", dict(render_mode="human")), ("rgb_array", dict(render_mode="rgb_array", copy=False)),
+                         ("thumbnail", dict(render_mode="rgb_array", copy=False, thumbnail=4))]:
+        env = CrossyRoadEnv(**kwargs)
+        draw = (lambda: renderWorld(env.world, env.agent)) if name == "human" else env.render
+        env.reset(seed=seed)
+        renderTime, resets = 0.0, 0
+        for action in actions:
+            start = time.perf_counter()
+            draw()
+            renderTime += time.perf_counter() - start
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                resets += 1
+                env.reset(seed=seed+resets)
+        env.close()
+        results.add(f"render.{name}.fps", len(actions)/renderTime, "frames/s", "higher")
+
+def benchGif(results, sizes, seed):
+    """GIF export of an expert episode, in this process"""
+    from crossyroadenv.export import SKULL_FRAMES, exportGif
+    from crossyroadenv.oracle import expertEpisodes
+    episode = expertEpisodes([seed], steps=sizes['gifSteps'], workers=0)[0]
+    frames = len(episode.actions)+1+SKULL_FRAMES
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "episode.gif")
+        start = time.perf_counter()
+        exportGif(path, episode, workers=0)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    results.add("gif.frame_ms", 1e3*elapsed/frames, "ms", "lower")
+    results.add("gif.frame_kb", size/frames/2**10, "KB", "lower")
+
+def benchMemory(results, sizes, seed):
+    """Growth of the resident memory over a long run with eviction, after a warm-up of a tenth of the steps"""
+    steps = sizes['rssSteps']
+    rng = np.random.default_rng(seed)
+    env = CrossyRoadEnv(MAX_LAYERS_BEHIND=30)
+    env.reset(seed=seed)
+    resets, before = 0, None
+    for i, action in enumerate(rng.choice(5, p=[0.4, 0.15, 0.1, 0.15, 0.2], size=steps)):
+        if i == steps//10:
+            before = rss()
+        _, _, terminated, truncated, _ = env.step(int(action))
+        if terminated or truncated:
+            resets += 1
+            env.reset(seed=seed+resets)
+    after = rss()
+    env.close()
+    results.add("memory.rss_mb", after, "MB", "lower")
+    results.add("memory.rss_growth_mb", after-before, "MB", "lower")
+
+def benchImport(results, sizes, seed):
+    """Cold start: the import of the simulation and of the renderer, each in new interpreters"""
+    for module, rendering in IMPORTS.items():
+        times, starts, memory = [], [], []
+        for _ in range(sizes['imports']):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(module=module)],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            starts.append(time.perf_counter() - start)
+            times.append(float(output[0]))
+            memory.append(int(output[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20)
+            if int(output[2]) and not rendering:
+                raise RuntimeError(f"Importing {module} imports pygame or PIL")
+        results.add(f"import.{module}.ms", 1e3*np.median(times), "ms", "lower")
+        results.add(f"import.{module}.process_ms", 1e3*np.median(starts), "ms", "lower")
+        results.add(f"import.{module}.rss_mb", np.median(memory), "MB", "lower")
+
+def benchMetrics(results, sizes, seed):
+    """Step time with and without metrics enabled, which must time every phase of stepping and rendering"""
+    from crossyroadenv import metrics
+    actions = policy(sizes['frames'], seed)
+    stepTimes = {}
+    for enabled in (False, True):
+        stats = metrics.enable() if enabled else None
+        for mode in (None, "rgb_array", "human"):
+            env = CrossyRoadEnv(render_mode=mode)
+            env.reset(seed=seed)
+            start, resets = time.perf_counter(), 0
+            for action in actions:
+                _, _, terminated, truncated, _ = env.step(action)
+                if mode is not None:
+                    env.render()
+                if terminated or truncated:
+                    resets += 1
+                    env.reset(seed=seed+resets)
+            if mode is None:
+                stepTimes[enabled] = (time.perf_counter()-start) / len(actions)
+            env.close()
+        if enabled:
+            metrics.disable()
+            missing = {'step', 'reset', 'observation', 'mask', 'add_section', 'generate', 'check', 'render', 'raster'} - set(stats.calls)
+            if missing:
+                raise RuntimeError(f"metrics did not time the phases {sorted(missing)}")
+    results.add("metrics.step_us", 1e6*stepTimes[False], "us", "lower")
+    results.add("metrics.enabled_step_us", 1e6*stepTimes[True], "us", "lower")
+
+BENCHMARKS = {
+    'step': benchStep,
+    'vector': benchVector,
+    'generate': benchGeneration,
+    'observation': benchObservation,
+    'render': benchRender,
+    'gif': benchGif,
+    'memory': benchMemory,
+    'import': benchImport,
+    'metrics': benchMetrics,
+}
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def compare(before, after, threshold) -> int:
+    """Prints the change of every metric of both runs, returns the number of regressions"""
+    with open(before) as f:
+        old = json.load(f)['metrics']
+    with open(after) as f:
+        new = json.load(f)['metrics']
+
+    regressions = 0
+    print(f"{'metric':<40}{'before':>14}{'after':>14}{'change':>10}")
+    for name in [name for name in new if name in old]:
+        a, b, better = old[name]['value'], new[name]['value'], new[name]['better']
+        change = (b-a)/abs(a) if a else 0.0
+        worse = better == "higher" and change < -threshold or better == "lower" and change > threshold
+        regressions += worse
+        print(f"{name:<40}{a:>14.3f}{b:>14.3f}{100*change:>9.1f}%{'  REGRESSION' if worse else ''}")
+    for name in [name for name in old if name not in new] + [name for name in new if name not in old]:
+        print(f"{name:<40} only in {'before' if name in old else 'after'}")
+    print(f"{regressions} regressions")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, e.g. for CI")
+    parser.add_argument("--only", default=None, help=f"comma separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="path to write the results to")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), default=None)
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    sizes = {key: size[args.quick] for key, size in SIZES.items()}
+    names = list(BENCHMARKS) if args.only is None else args.only.split(',')
+    results = Results()
+    for name in names:
+        BENCHMARKS[name](results, sizes, args.seed)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'meta': {**metadata(), 'quick': args.quick, 'sizes': sizes}, 'metrics': results.metrics}, f, indent=1)
+
+if __name__ == "__main__":
+    main()
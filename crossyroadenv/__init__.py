@@ -3,4 +3,5 @@ from gymnasium.envs.registration import register
 register(
     id='CrossyRoadEnv-v0',
     entry_point='crossyroadenv.env:CrossyRoadEnv',
+    vector_entry_point='crossyroadenv.vector:CrossyRoadVectorEnv',
 )
\ No newline at end of file
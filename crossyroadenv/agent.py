@@ -1,29 +1,26 @@
 from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from array import array
 import numpy as np
 
 class Agent:
     """
-    Simple agent that just stores the position and the trace
+    Simple agent that just stores the position and the trace,
+    one byte per action
     """
-    def __init__(self):
+    def __init__(self, config: Config = DEFAULT_CONFIG):
         
-        self.x,self.y = np.array(STARTLOCATION)
+        self.config = config
+        self.x,self.y = config.STARTLOCATION
         self.lastAction = 2
-        self.trace_a = []
+        self.trace_a = array('B')
         
         self.highscore = 0
     
     def step(self, action):
-        if action == 0:
-            self.y += 1
-        elif action == 1:
-            self.x -= 1
-        elif action == 2:
-            self.y -= 1
-        elif action == 3:
-            self.x += 1
-        elif action == 4:
-            pass
+        dx, dy = ACTION_TUPLES[action]
+        self.x += dx
+        self.y += dy
         
         if action != 4:
             self.lastAction = action
@@ -35,8 +32,8 @@ class Agent:
         return (self.x, self.y)
     
     def reset(self):
-        self.x,self.y = np.array(STARTLOCATION)
-        self.trace_a.clear()
+        self.x,self.y = self.config.STARTLOCATION
+        del self.trace_a[:]
         self.lastAction = 2
         self.highscore = 0
         
@@ -0,0 +1,195 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.layers import *
+from crossyroadenv.sections import GENERATORS
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from functools import lru_cache
+import argparse
+import json
+import numpy as np
+
+"""
+A section bank is a file of pre-generated, validated sections of one world generator.
+Worlds that use a bank draw their sections from it by index, instead of generating
+and validating them live. The bank is memory-mapped, so every process that opens
+it shares the same pages.
+
+File layout:
+- a header of HEADER_SIZE bytes: MAGIC, followed by a json description of the bank
+- one layerDtype(width) record per layer, the layers of all sections one after another
+- sections+1 uint64 offsets, section i consists of the records offsets[i]:offsets[i+1]
+
+Since it is unknown at which t a section will be used, the sections are
+validated at t = 0, like the prefetched sections of World.
+
+A bank can only be used by worlds of its generator whose config has the same
+GENERATION_FIELDS as the config it was generated with, since those decide
+what the sections of the world are.
+"""
+
+MAGIC = b'CRSBANK1'
+HEADER_SIZE = 4096
+CACHED_SECTIONS = 10000     # Unpacked sections kept per bank, layers are never modified so worlds can share them
+
+LAYER_KINDS = [Empty, Bush, Logs, Road, Lilypad, Rail]
+DIRECTIONS = 'rls'
+
+# Fields of a Config that the sections of a generator depend on
+GENERATION_FIELDS = ['GRIDWIDTH'] + [f.name for f in fields(Config) if f.name.startswith(('BUSH_', 'LOGS_', 'ROAD_', 'LILYPAD_', 'RAIL_', 'CHANCE_'))]
+
+def layerDtype(width) -> np.dtype:
+    """Record of a layer of width cells"""
+    return np.dtype([
+        ('kind', np.uint8),
+        ('direction', np.uint8),
+        ('speed', np.uint8),
+        ('cycle', np.uint32),                       # cycle of Logs and Road, interval of Rail
+        ('representation', np.uint8, (width,)),     # one period for Logs and Road
+        ('figures', np.uint8, (width,)),            # figure of the car starting at every location
+    ])
+
+def pack(layer: Layer, config: Config = DEFAULT_CONFIG) -> np.ndarray:
+    """Converts a layer into a record"""
+    record = np.zeros((), dtype=layerDtype(config.GRIDWIDTH))
+    record['kind'] = LAYER_KINDS.index(type(layer))
+    if type(layer) == Rail:
+        record['direction'] = DIRECTIONS.index(layer.direction)
+        record['speed'] = layer.speed
+        record['cycle'] = layer.interval
+        return record
+
+    record['representation'] = layer.representation[:config.GRIDWIDTH]
+    if type(layer) in (Logs, Road):
+        record['direction'] = DIRECTIONS.index(layer.direction)
+        record['cycle'] = layer.cycle
+    if type(layer) == Road:
+        for loc, _, figure in layer.carConfiguration:
+            record['figures'][loc] = figure
+    return record
+
+def unpack(record, config: Config = DEFAULT_CONFIG) -> Layer:
+    """Converts a record back into a layer"""
+    kind = LAYER_KINDS[record['kind']]
+    direction = DIRECTIONS[record['direction']]
+    representation = np.array(record['representation'])
+
+    if kind == Rail:
+        return Rail(interval=int(record['cycle']), speed=int(record['speed']), direction=direction, config=config)
+    if kind == Logs:
+        return Logs(cycle=int(record['cycle']), direction=direction, representation=representation, config=config)
+    if kind == Road:
+        return Road(cycle=int(record['cycle']), direction=direction, representation=representation,
+                    figures=[int(f) for f in record['figures']], config=config)
+    if kind == Empty:
+        return Empty(config=config)
+    return kind(representation=representation, config=config)
+
+def _generateChunk(generator, seedSequence, sections, config) -> tuple[np.ndarray, np.ndarray]:
+    """Worker of generateBank: generates sections and returns their records and lengths"""
+    maker = GENERATORS[generator](config)
+    records, lengths = [], []
+    for child in seedSequence.spawn(sections):
+        section = maker.add(0, np.random.default_rng(child))
+        records.extend(pack(layer, config) for layer in section)
+        lengths.append(len(section))
+    return np.array(records, dtype=layerDtype(config.GRIDWIDTH)), np.array(lengths, dtype=np.uint64)
+
+def generateBank(path, generator = None, sections = 100000, workers = None, seed = None, chunk = 1000, config: Config = DEFAULT_CONFIG) -> None:
+    """
+    Generates a bank of sections of generator (WORLD_GENERATOR of config by default)
+    with a pool of workers and writes it to path. Every chunk of sections draws from its
+    own child stream of seed, so the bank is deterministic given the seed, regardless
+    of the number of workers.
+    """
+    generator = config.WORLD_GENERATOR if generator is None else generator
+    if generator not in GENERATORS:
+        raise ValueError(f"{generator} is not in {list(GENERATORS.keys())}")
+
+    sizes = [min(chunk, sections-i) for i in range(0, sections, chunk)]
+    seedSequence = np.random.SeedSequence(seed)
+    children = seedSequence.spawn(len(sizes))
+
+    offsets = [0]
+    with open(path, 'wb') as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        f.write(bytes(HEADER_SIZE))
+        for records, lengths in pool.map(_generateChunk, [generator]*len(sizes), children, sizes, [config]*len(sizes)):
+            f.write(records.tobytes())
+            offsets.extend(offsets[-1] + np.cumsum(lengths, dtype=np.uint64))
+
+        f.write(np.array(offsets, dtype=np.uint64).tobytes())
+        header = json.dumps({
+            'generator': generator,
+            'gridwidth': config.GRIDWIDTH,
+            'config': config.digest(),
+            'generation': {name: getattr(config, name) for name in GENERATION_FIELDS},
+            'sections': sections,
+            'layers': int(offsets[-1]),
+            'seed': seedSequence.entropy,
+        }).encode()
+        if len(MAGIC) + len(header) > HEADER_SIZE:
+            raise ValueError("Header of the section bank is too large")
+        f.seek(0)
+        f.write(MAGIC + header)
+
+class SectionBank:
+    """
+    Read-only view of a section bank file. Use SectionBank.open to share
+    a single memory map per file within a process.
+    """
+    _opened = {}
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if not header.startswith(MAGIC):
+            raise ValueError(f"{path} is not a section bank")
+        self.info = json.loads(header[len(MAGIC):].rstrip(b'\0'))
+
+        self.path = path
+        self.generator = self.info['generator']
+        layers = self.info['layers']
+        dtype = layerDtype(self.info['gridwidth'])
+        self.records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(layers,))
+        self.offsets = np.memmap(path, dtype=np.uint64, mode='r',
+                                 offset=HEADER_SIZE + layers*dtype.itemsize, shape=(self.info['sections']+1,))
+        self._section = lru_cache(maxsize=CACHED_SECTIONS)(self._unpackSection)
+
+    def check(self, config: Config) -> None:
+        """Raises a ValueError if worlds of config cannot use the bank, see GENERATION_FIELDS"""
+        if self.info['gridwidth'] != config.GRIDWIDTH:
+            raise ValueError(f"The section bank holds layers of width {self.info['gridwidth']}, expected {config.GRIDWIDTH}")
+        if self.generator != config.WORLD_GENERATOR:
+            raise ValueError(f"The section bank holds sections of {self.generator}, expected {config.WORLD_GENERATOR}")
+        generation = self.info.get('generation', {})
+        different = [name for name in GENERATION_FIELDS if name not in generation or generation[name] != getattr(config, name)]
+        if different:
+            raise ValueError(f"The section bank {self.path} was generated with other values of {different} than the config of the world")
+
+    @classmethod
+    def open(cls, path):
+        """Opens the bank at path, or returns it if it was already opened by this process"""
+        if path not in cls._opened:
+            cls._opened[path] = cls(path)
+        return cls._opened[path]
+
+    def _unpackSection(self, i, config) -> tuple[Layer]:
+        return tuple(unpack(record, config) for record in self.records[self.offsets[i]:self.offsets[i+1]])
+
+    def section(self, i, config: Config = DEFAULT_CONFIG) -> list[Layer]:
+        """The layers of section i, made with config"""
+        return list(self._section(int(i), config))
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generates a bank of validated sections")
+    parser.add_argument('path')
+    parser.add_argument('--generator', default=None, choices=list(GENERATORS.keys()))
+    parser.add_argument('--sections', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    generateBank(args.path, args.generator, args.sections, args.workers, args.seed)
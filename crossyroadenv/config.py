@@ -0,0 +1,169 @@
+from crossyroadenv.const import *
+from dataclasses import dataclass, fields, replace
+from functools import cached_property
+import hashlib
+import json
+import numpy as np
+
+"""
+Every tunable of const.py as a field of a frozen Config, such that environments
+with different configurations can live side by side in a single process.
+The fields are named after their constant and default to its value.
+Tables derived from a config are computed once per config and shared by every
+environment, world, layer and mask that uses it.
+"""
+
+@dataclass(frozen=True)
+class Config:
+    # App
+    GRIDWIDTH: int = GRIDWIDTH
+    GRIDHEIGHT: int = GRIDHEIGHT
+    APPWIDTH: int = APPWIDTH
+    APPHEIGHT: int = APPHEIGHT
+    WORLD_GENERATOR: str = WORLD_GENERATOR
+    MAX_AGE: int = MAX_AGE
+    MAX_LAYERS_BEHIND: int = MAX_LAYERS_BEHIND
+    PREFETCH_SECTIONS: int = PREFETCH_SECTIONS
+    SECTION_BANK: str = SECTION_BANK
+
+    # Agent
+    LAYERS_UNDERNEATH: int = LAYERS_UNDERNEATH
+
+    # State tags, as (tag, value) pairs
+    STATE_REP: tuple = tuple(STATE_REP.items())
+
+    # Vision
+    MASK: str = MASK
+    FLATTEN: bool = FLATTEN
+    OBS_MODE: str = OBS_MODE
+    OBS_DTYPE: str = OBS_DTYPE
+    OBS_WINDOW: tuple = OBS_WINDOW
+
+    # Rewards, REWARDS holds the reward of every action
+    REWARDS: tuple = tuple(REWARDS[a] for a in range(5))
+    REWARD_INVALID: float = REWARD_INVALID
+    REWARD_TERMINATED: float = REWARD_TERMINATED
+    REWARD_TRUNCATED: float = REWARD_TRUNCATED
+    REWARD_NEWLAYER: float = REWARD_NEWLAYER
+
+    # Layers
+    BUSH_DENSITY_LOW: float = BUSH_DENSITY_LOW
+    BUSH_DENSITY_HIGH: float = BUSH_DENSITY_HIGH
+
+    LOGS_DENSITY_LOW: float = LOGS_DENSITY_LOW
+    LOGS_DENSITY_HIGH: float = LOGS_DENSITY_HIGH
+    LOGS_CYCLE_LOW: int = LOGS_CYCLE_LOW
+    LOGS_CYCLE_HIGH: int = LOGS_CYCLE_HIGH
+    LOGS_DIRECTION_R: float = LOGS_DIRECTION_R
+    LOGS_DIRECTION_L: float = LOGS_DIRECTION_L
+    LOGS_DIRECTION_S: float = LOGS_DIRECTION_S
+
+    ROAD_DENSITY_LOW: float = ROAD_DENSITY_LOW
+    ROAD_DENSITY_HIGH: float = ROAD_DENSITY_HIGH
+    ROAD_CYCLE_LOW: int = ROAD_CYCLE_LOW
+    ROAD_CYCLE_HIGH: int = ROAD_CYCLE_HIGH
+    ROAD_DIRECTION_R: float = ROAD_DIRECTION_R
+    ROAD_DIRECTION_L: float = ROAD_DIRECTION_L
+    ROAD_DIRECTION_S: float = ROAD_DIRECTION_S
+
+    LILYPAD_DENSITY_LOW: float = LILYPAD_DENSITY_LOW
+    LILYPAD_DENSITY_HIGH: float = LILYPAD_DENSITY_HIGH
+
+    RAIL_SPEED_LOW: int = RAIL_SPEED_LOW
+    RAIL_SPEED_HIGH: int = RAIL_SPEED_HIGH
+    RAIL_INTERVAL_LOW: int = RAIL_INTERVAL_LOW
+    RAIL_INTERVAL_HIGH: int = RAIL_INTERVAL_HIGH
+    RAIL_DIRECTION_R: float = RAIL_DIRECTION_R
+    RAIL_DIRECTION_L: float = RAIL_DIRECTION_L
+    RAIL_DIRECTION_S: float = RAIL_DIRECTION_S
+    RAIL_WARN_STEPS: int = RAIL_WARN_STEPS
+
+    CHANCE_EMPTY: float = CHANCE_EMPTY
+    CHANCE_BUSH: float = CHANCE_BUSH
+    CHANCE_LOGS: float = CHANCE_LOGS
+    CHANCE_ROAD: float = CHANCE_ROAD
+    CHANCE_LILYPAD: float = CHANCE_LILYPAD
+    CHANCE_RAIL: float = CHANCE_RAIL
+
+    # Visuals
+    RECORD_PATH: str = RECORD_PATH
+    GIF_DURATION: int = GIF_DURATION
+    SHOWSCORE: bool = SHOWSCORE
+    FPS: int = FPS
+    OVERLAY: bool = OVERLAY
+
+    def __post_init__(self):
+        """Stores the dicts and lists of const.py as tuples, which keeps the config immutable and hashable"""
+        if isinstance(self.STATE_REP, dict):
+            object.__setattr__(self, 'STATE_REP', tuple(self.STATE_REP.items()))
+        if isinstance(self.REWARDS, dict):
+            object.__setattr__(self, 'REWARDS', tuple(self.REWARDS[a] for a in range(5)))
+        object.__setattr__(self, 'OBS_WINDOW', tuple(self.OBS_WINDOW))
+
+    def replace(self, **changes):
+        """A copy of this config with the given fields changed"""
+        return replace(self, **changes)
+
+    def digest(self) -> str:
+        """Stable hash of the fields, equal for equal configs in every process"""
+        if '_digest' not in self.__dict__:
+            values = {f.name: getattr(self, f.name) for f in fields(self)}
+            self.__dict__['_digest'] = hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()
+        return self.__dict__['_digest']
+
+    def __hash__(self):
+        return hash(self.digest())
+
+    def table(self, key, make):
+        """
+        The table key of this config, made by make() the first time it is asked for.
+        Arrays are made read-only, since the table is shared.
+        """
+        tables = self.__dict__.setdefault('_tables', {})
+        if key not in tables:
+            value = make()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            tables[key] = value
+        return tables[key]
+
+    def __getstate__(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    # Derived constants
+    @cached_property
+    def TILEWIDTH(self) -> int:
+        return self.APPWIDTH//self.GRIDWIDTH
+
+    @cached_property
+    def TILEHEIGHT(self) -> int:
+        return self.APPHEIGHT//self.GRIDHEIGHT
+
+    @cached_property
+    def HORIZON(self) -> int:
+        """Rows generated above the highscore of the agent, enough for a full window at any row"""
+        return self.GRIDHEIGHT + HORIZON_MARGIN
+
+    @cached_property
+    def STARTLOCATION(self) -> tuple:
+        return (self.GRIDWIDTH//2, self.LAYERS_UNDERNEATH-1)
+
+    @cached_property
+    def TILE_REP(self) -> np.ndarray:
+        """Float value of every tile code"""
+        rep = dict(self.STATE_REP)
+        table = np.array([rep[s] for s in TILES], dtype=np.float64)
+        table.flags.writeable = False
+        return table
+
+    @cached_property
+    def ACTION_REWARDS(self) -> np.ndarray:
+        """Reward of every action"""
+        table = np.array(self.REWARDS, dtype=np.float64)
+        table.flags.writeable = False
+        return table
+
+DEFAULT_CONFIG = Config()
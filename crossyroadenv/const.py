@@ -3,7 +3,8 @@ Constants file
 These constants will be used if no other adjustments
 are made to the parameters.
 """
-
+import numpy as np
+from pathlib import Path
 
 
 ###
@@ -18,8 +19,14 @@ APPHEIGHT = 700
 TILEWIDTH = APPWIDTH//GRIDWIDTH
 TILEHEIGHT = APPHEIGHT//GRIDHEIGHT
 
+HORIZON_MARGIN = 6                 # Rows generated beyond GRIDHEIGHT rows above the highscore
+HORIZON = GRIDHEIGHT + HORIZON_MARGIN
+
 WORLD_GENERATOR = 'hybrid'
 MAX_AGE = -1                       # Max age truncated the environment, -1 means endless
+MAX_LAYERS_BEHIND = -1             # Layers kept below the highscore, lower layers are freed and walled off. -1 keeps all layers
+PREFETCH_SECTIONS = 0              # Validated sections generated ahead by a background thread per world, 0 disables prefetching
+SECTION_BANK = None                # Path of a section bank (see bank.py) to draw sections from instead of generating them, None disables the bank
 
 ###
 # Agent
@@ -28,11 +35,14 @@ MAX_AGE = -1                       # Max age truncated the environment, -1 means
 LAYERS_UNDERNEATH = 2
 STARTLOCATION = [GRIDWIDTH//2, LAYERS_UNDERNEATH-1]
 
+# (dx,dy) of every action: up, left, down, right, still
+ACTION_TUPLES = {0: (0,1), 1: (-1,0), 2: (0,-1), 3: (1,0), 4: (0,0)}
+
 ###
 # State tags
 ###
 
-WALKABLE_STATES = 'L0Pt'
+WALKABLE_STATES = '0LPt'
 INVALID_STATES = 'B'
 TERMINAL_STATES = 'CW1T'
 
@@ -43,6 +53,20 @@ STATE_REP = {
 }
 STATE_REP['t'] = 0.5
 
+###
+# Tile codes
+# Layers store their cells as uint8 codes, which are indices into TILES.
+# The state tags above are turned into tables indexed by these codes.
+###
+
+TILES = WALKABLE_STATES + INVALID_STATES + TERMINAL_STATES
+TILE = {s:i for i,s in enumerate(TILES)}
+
+TILE_REP = np.array([STATE_REP[s] for s in TILES], dtype=np.float64)
+TILE_INVALID = np.array([s in INVALID_STATES for s in TILES])
+TILE_TERMINAL = np.array([s in TERMINAL_STATES for s in TILES])
+TILE_BLOCKED = TILE_INVALID | TILE_TERMINAL
+
 ###
 # Vision
 ###
@@ -54,6 +78,10 @@ MASK = """..x..
           ..x.."""
 FLATTEN = True
 
+OBS_MODE = 'mask'                  # 'mask': floats seen through MASK, 'channels': one-hot tile channels over OBS_WINDOW
+OBS_DTYPE = 'float64'              # 'float64', 'float32' or 'uint8', uint8 scales [0,1] to [0,255]
+OBS_WINDOW = (LAYERS_UNDERNEATH-1, GRIDHEIGHT-LAYERS_UNDERNEATH, GRIDWIDTH//2, GRIDWIDTH//2)   # Cells (below, above, left, right) of the agent in channels mode
+
 ###
 # Rewards
 ###
@@ -116,9 +144,15 @@ CHANCE_RAIL = 0.2
 # Visuals
 ###
 RECORD_PATH = "./gifs/"         # path where the gifs are saved
+GIF_DURATION = 100              # milliseconds per tick in the gifs
 SHOWSCORE = True
 FPS = 30
 
+ASSETS = Path(__file__).resolve().parent / "assets"
+
+# Sprite of the agent per last action, as (asset, flipped horizontally)
+AGENT_SPRITES = {0: ("chickup", False), 1: ("chickside", False), 2: ("chickdown", False), 3: ("chickside", True)}
+
 ###
 # Debug
 ###
@@ -0,0 +1,286 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.env import CrossyRoadEnv
+from crossyroadenv.oracle import ExpertPolicy
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import numpy as np
+import os
+
+"""
+Offline datasets of transitions, generated by playing a policy over many seeds with
+a pool of processes. Every transition is stored as a row of the columns below, in
+shards of SHARD_TRANSITIONS rows. A shard is a directory with a .npy file per column
+and episodes.npy, the first row and the seed of every episode that starts in it.
+The seeds are dealt to the workers in chunks of DATASET_CHUNK seeds, and every worker
+fills its shards one after the other with the episodes of all its chunks, so only the
+last shard of a worker is shorter. Workers write their shards through memory maps, so
+no process holds more than the pages it is writing, and index.json lists the shards
+once every worker is done.
+
+Row i holds the observation before action i, and the reward, terminal and truncated of
+that step, the tick of the world before the step and the highscore after it. The next
+observation of a row is the observation of the next row, unless the step ended the episode.
+An episode that is cut at steps steps is marked as truncated at its last row.
+
+Dataset reads the shards as memory maps, slices within a shard are views of the files.
+The shards are opened when they are first read, and only the OPEN_SHARDS shards read
+last are kept open, such that datasets of any size stay within the memory maps a
+process may hold.
+"""
+
+SHARD_TRANSITIONS = 1 << 20     # Rows per shard
+DATASET_CHUNK = 16              # Seeds dealt to a worker at a time
+OPEN_SHARDS = 64                # Shards of a Dataset whose memory maps are kept open
+
+# Every column besides obs: name, dtype
+COLUMNS = [
+    ('action', np.uint8),
+    ('reward', np.float32),
+    ('terminal', np.bool_),
+    ('truncated', np.bool_),
+    ('t', np.int32),
+    ('highscore', np.int32),
+]
+
+class RandomPolicy:
+    """Uniformly random actions, drawn from a stream seeded by the seed of the world at every episode"""
+    def __init__(self):
+        self.rng = None
+        self.env = None
+
+    def __call__(self, obs, env) -> int:
+        if env is not self.env or len(env.agent.trace_a) == 0:
+            self.env, self.rng = env, np.random.default_rng(env.world.seedSequence.entropy)
+        return int(self.rng.integers(5))
+
+# Policies by name, made once per worker
+POLICIES = {
+    'random': RandomPolicy,
+    'oracle': ExpertPolicy,
+}
+
+def _truncate(path, rows) -> None:
+    """
+    Shrinks the .npy file at path to its first rows rows in place: the shape in its header is
+    rewritten, padded to the same length, and the file is cut after the last row
+    """
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        start = f.tell()
+        header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran, 'shape': (rows, *shape[1:])})
+        offset = np.lib.format.MAGIC_LEN + (2 if version == (1, 0) else 4)
+        f.seek(offset)
+        f.write(header.ljust(start-offset-1).encode('latin1') + b'\n')
+        f.truncate(start + rows*int(np.prod(shape[1:], dtype=np.int64))*dtype.itemsize)
+
+class _ShardWriter:
+    """
+    Writes rows into the shards prefix-0000, prefix-0001, ... of the directory root, each of size rows.
+    The files of a shard are sparse until they are written, a shard that is not full is truncated.
+    """
+    def __init__(self, root: Path, prefix, columns: dict, size):
+        self.root, self.prefix, self.columns, self.size = root, prefix, columns, size
+        self.shards = []
+        self.arrays = None
+
+    def _open(self) -> None:
+        name = f"{self.prefix}-{len(self.shards):04d}"
+        (self.root / name).mkdir()
+        self.name, self.n, self.episodes = name, 0, []
+        self.arrays = {column: np.lib.format.open_memmap(self.root / name / f"{column}.npy", mode='w+', dtype=dtype, shape=(self.size, *shape))
+                       for column, (shape, dtype) in self.columns.items()}
+
+    def startEpisode(self, seed) -> None:
+        if self.arrays is None:
+            self._open()
+        self.episodes.append((self.n, seed))
+
+    def write(self, obs, action, reward, terminal, truncated, t, highscore) -> None:
+        if self.arrays is None:
+            self._open()
+        arrays, n = self.arrays, self.n
+        arrays['obs'][n] = obs
+        arrays['action'][n] = action
+        arrays['reward'][n] = reward
+        arrays['terminal'][n] = terminal
+        arrays['truncated'][n] = truncated
+        arrays['t'][n] = t
+        arrays['highscore'][n] = highscore
+        self.n += 1
+        if self.n == self.size:
+            self.close()
+
+    def close(self) -> None:
+        """Flushes the open shard, a shard that is not full is truncated to its rows"""
+        if self.arrays is None:
+            return
+        directory = self.root / self.name
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = None
+        if self.n < self.size:
+            for column in self.columns:
+                _truncate(directory / f"{column}.npy", self.n)
+        np.save(directory / "episodes.npy", np.array(self.episodes, dtype=np.int64).reshape(-1, 2))
+        self.shards.append({'path': self.name, 'length': self.n, 'episodes': len(self.episodes)})
+
+def _generate(worker, root, seeds, policy, steps, size, envKwargs) -> list[dict]:
+    """Worker of writeDataset: plays an episode of every seed, returns the shards it wrote"""
+    env = CrossyRoadEnv(**envKwargs)
+    policy = POLICIES[policy]() if isinstance(policy, str) else policy
+    writer = _ShardWriter(Path(root), f"shard-{worker:05d}", columns(env), min(size, steps*len(seeds)))
+    for seed in seeds:
+        obs, _ = env.reset(seed=seed)
+        writer.startEpisode(seed)
+        for step in range(steps):
+            t = env.world.t
+            action = policy(obs, env)
+            nextObs, reward, terminated, truncated, _ = env.step(action)
+            truncated = truncated or step == steps-1
+            writer.write(obs, action, reward, terminated, truncated, t, env.agent.highscore)
+            obs = nextObs
+            if terminated or truncated:
+                break
+    writer.close()
+    env.close()
+    return writer.shards
+
+def columns(env: CrossyRoadEnv) -> dict:
+    """The shape and dtype of a row of every column, for the observations of env"""
+    return {'obs': (tuple(int(n) for n in env.observer.shape), np.dtype(env.observer.dtype)), **{name: ((), np.dtype(dtype)) for name, dtype in COLUMNS}}
+
+def writeDataset(path, seeds, policy = 'random', steps = 1000, workers = None, config: Config = DEFAULT_CONFIG,
+                 shardSize = SHARD_TRANSITIONS, chunk = DATASET_CHUNK, **envKwargs) -> "Dataset":
+    """
+    Plays an episode of at most steps steps with policy in a world of every seed, with a pool of
+    workers processes (in this process if workers is 0), and writes the transitions to a new dataset
+    in the directory path. Chunks of chunk seeds are dealt to the workers in turn, and the rows of
+    every worker follow each other in the dataset. policy is 'random', 'oracle' (see oracle.ExpertPolicy),
+    or a callable policy(obs, env) -> action, which has to be picklable if workers is not 0. envKwargs
+    are given to CrossyRoadEnv, e.g. obs_mode and obs_dtype. Seeds are integers in [0, 2**63).
+    """
+    if isinstance(policy, str) and policy not in POLICIES:
+        raise ValueError(f"Unknown policy {policy}, expected one of {list(POLICIES)} or a callable")
+    if steps < 1 or shardSize < 1 or chunk < 1:
+        raise ValueError("steps, shardSize and chunk must be at least 1")
+    seeds = list(seeds)
+    if any(not isinstance(seed, (int, np.integer)) or not 0 <= seed < 1 << 63 for seed in seeds):
+        raise ValueError("Seeds of a dataset are integers in [0, 2**63)")
+    root = Path(path)
+    root.mkdir(parents=True, exist_ok=False)
+    envKwargs = dict(config=config, **envKwargs)
+
+    # Every worker fills its own shards, with chunks w, w+workers, w+2*workers, ... of the seeds
+    processes = 1 if workers == 0 else os.cpu_count() if workers is None else workers
+    chunks = [seeds[i:i+chunk] for i in range(0, len(seeds), chunk)]
+    tasks = [(w, root, [seed for c in chunks[w::processes] for seed in c], policy, steps, shardSize, envKwargs) for w in range(min(processes, len(chunks)))]
+    shards = []
+    if workers == 0:
+        for task in tasks:
+            shards.extend(_generate(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for written in pool.map(_generate, *zip(*tasks)):
+                shards.extend(written)
+
+    env = CrossyRoadEnv(**envKwargs)
+    index = {
+        'config': config.digest(),
+        'generator': config.WORLD_GENERATOR,
+        'policy': policy if isinstance(policy, str) else getattr(policy, '__name__', type(policy).__name__),
+        'steps': steps,
+        'columns': {name: [list(shape), dtype.str] for name, (shape, dtype) in columns(env).items()},
+        'transitions': sum(shard['length'] for shard in shards),
+        'episodes': sum(shard['episodes'] for shard in shards),
+        'shards': shards,
+    }
+    env.close()
+    with open(root / "index.json.tmp", 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(root / "index.json.tmp", root / "index.json")
+    return Dataset(root)
+
+class Dataset:
+    """
+    A dataset of writeDataset. dataset[i] and dataset[i:j] are dicts of the columns of rows i..j,
+    views of the memory maps if the rows are in a single shard. shard(s) holds the columns of shard s.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "index.json") as f:
+            self.index = json.load(f)
+        self.offsets = np.cumsum([0] + [shard['length'] for shard in self.index['shards']])
+        self._open = OrderedDict()
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def shard(self, s) -> dict:
+        """The memory maps of the columns of shard s, opened on first use, see OPEN_SHARDS"""
+        if s in self._open:
+            self._open.move_to_end(s)
+            return self._open[s]
+        directory = self.path / self.index['shards'][s]['path']
+        arrays = self._open[s] = {column: np.load(directory / f"{column}.npy", mmap_mode='r') for column in self.index['columns']}
+        if len(self._open) > OPEN_SHARDS:
+            self._open.popitem(last=False)
+        return arrays
+
+    def __getitem__(self, index) -> dict:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices of a dataset are supported")
+            if start >= stop:
+                return {column: array[:0] for column, array in self.shard(0).items()} if self.index['shards'] else {}
+            first = int(np.searchsorted(self.offsets, start, 'right'))-1
+            last = int(np.searchsorted(self.offsets, stop-1, 'right'))-1
+            if first == last:
+                offset = self.offsets[first]
+                return {column: array[start-offset:stop-offset] for column, array in self.shard(first).items()}
+            return {column: np.concatenate([self[max(start, self.offsets[s]):min(stop, self.offsets[s+1])][column] for s in range(first, last+1)])
+                    for column in self.index['columns']}
+        index = range(len(self))[index]
+        shard = int(np.searchsorted(self.offsets, index, 'right'))-1
+        return {column: array[index-self.offsets[shard]] for column, array in self.shard(shard).items()}
+
+    def column(self, name) -> list[np.ndarray]:
+        """The memory maps of column name, one per shard, which stay open as long as they are referenced"""
+        return [np.load(self.path / shard['path'] / f"{name}.npy", mmap_mode='r') for shard in self.index['shards']]
+
+    def episodes(self) -> np.ndarray:
+        """The first row, the number of rows and the seed of every episode, as an array [E, 3]"""
+        starts, seeds = [], []
+        for shard, offset in zip(self.index['shards'], self.offsets):
+            episodes = np.load(self.path / shard['path'] / "episodes.npy")
+            starts.append(episodes[:, 0] + offset)
+            seeds.append(episodes[:, 1])
+        starts, seeds = np.concatenate(starts or [[]]).astype(np.int64), np.concatenate(seeds or [[]]).astype(np.int64)
+        return np.stack([starts, np.diff(starts, append=len(self)), seeds], axis=1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes an offline dataset of transitions of a policy")
+    parser.add_argument('path')
+    parser.add_argument('--episodes', type=int, default=1000, help="episodes, of the seeds seed, seed+1, ...")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policy', default='random', choices=list(POLICIES))
+    parser.add_argument('--steps', type=int, default=1000, help="maximum steps of an episode")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shard-size', type=int, default=SHARD_TRANSITIONS)
+    parser.add_argument('--generator', default=DEFAULT_CONFIG.WORLD_GENERATOR)
+    parser.add_argument('--obs-mode', default=None)
+    parser.add_argument('--obs-dtype', default=None)
+    args = parser.parse_args()
+
+    dataset = writeDataset(args.path, range(args.seed, args.seed+args.episodes), args.policy, args.steps, args.workers,
+                           DEFAULT_CONFIG.replace(WORLD_GENERATOR=args.generator), args.shard_size,
+                           obs_mode=args.obs_mode, obs_dtype=args.obs_dtype)
+    print(f"{len(dataset)} transitions of {dataset.index['episodes']} episodes in {len(dataset.index['shards'])} shards")
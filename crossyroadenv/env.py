@@ -1,99 +1,139 @@
 import gymnasium as gym
+from array import array
 from gymnasium import spaces
 import numpy as np
 from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
 from crossyroadenv.world import World
 from crossyroadenv.agent import Agent
+from crossyroadenv.layers import Logs
 from crossyroadenv.mask import Mask
-from crossyroadenv.render import *
+from crossyroadenv.observation import Observer
+
+"""
+The rendering stack is imported by the render modes that need it only:
+pygame by render_mode = "human", and PIL by "rgb_array" and the GIF export,
+so that an environment without rendering imports neither.
+"""
 
 class CrossyRoadEnv(gym.Env):
     
-    metadata = {"render_modes": ["human"], "render_fps": 60}
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
 
-    def __init__(self, render_mode = None, **kwargs):
+    def __init__(self, render_mode = None, config: Config = None, obs_mode = None, obs_dtype = None, obs_window = None, copy = True, thumbnail = None, **kwargs):
+        """
+        config is the Config of the environment, DEFAULT_CONFIG by default. Any other
+        keyword argument named after a field of Config overrides that field.
+        obs_mode, obs_dtype and obs_window select the observation, see Observer.
+        If copy is False, every observation is written into the same buffer,
+        which is overwritten by the next step or reset. The same holds for the frames
+        of render_mode = "rgb_array".
+        thumbnail = k renders rgb_array frames as k x k pixels per cell, see Rasterizer.
+        """
         super(CrossyRoadEnv, self).__init__()
         
         self.render_mode = render_mode
+        self.config: Config = DEFAULT_CONFIG if config is None else config
+        if kwargs:
+            self.config = self.config.replace(**kwargs)
         
         # Agent position
-        self.agent: Agent = Agent()
+        self.agent: Agent = Agent(self.config)
         
         # World
-        self.world: World = World()
+        self.world: World = World(config=self.config)
         
-        # Mask observation
-        self.mask: Mask = Mask(MASK)
+        # Outcome of the episode: the sum of its rewards, and the step at which it first ended
+        self._return = 0.0
+        self._end = None
+        
+        # Observation, the mask is used in mask mode
+        self.observer: Observer = Observer(obs_mode, obs_dtype, obs_window, config=self.config)
+        self.mask: Mask = self.observer.mask
+        self.copy = copy
+        self._obs = np.empty(self.observer.shape, dtype=self.observer.dtype)
         
         # Define action and observation space
         self.action_space = spaces.Discrete(5) 
-        self.observation_space = spaces.Box(low=-1,high=1, shape=self.mask.shapeObs, dtype=float)
+        self.observation_space = self.observer.space
 
         # Setup visuals
+        self.thumbnail = thumbnail
         self._setupRendering()
 
     def _get_action_definitions(self) -> dict:
         return {0: "up", 1: "left", 2: "down", 3: "right", 4: "still"}
 
     def _get_action_tuples(self) -> dict:
-        return {0: (0,1), 1: (-1,0), 2: (0,-1), 3: (1,0), 4: (0,0)}
+        return ACTION_TUPLES
+    
+    def _getObservation(self) -> np.ndarray:
+        _, codes = self.world.getWindow(self.agent)
+        direction, phase = self.world.getWindowMotion(self.agent)
+        return self.observer.encode(codes, direction, phase, self.agent.x, out = None if self.copy else self._obs)
     
     def _setupRendering(self) -> None:
         """
-        Human render mode:
+        Human render mode: a pygame window
+        rgb_array render mode: a headless Rasterizer
         """
+        if self.render_mode == "rgb_array":
+            from crossyroadenv.raster import Rasterizer
+            self.rasterizer = Rasterizer(self.config, self.thumbnail)
         if self.render_mode == "human":
             import pygame
+            from crossyroadenv.render import ATLAS
             pygame.init()
             pygame.display.init()
-            self.window = pygame.display.set_mode((APPWIDTH,APPHEIGHT))
+            self.window = pygame.display.set_mode((self.config.APPWIDTH,self.config.APPHEIGHT))
             self.clock = pygame.time.Clock() 
+            ATLAS.preload(self.config)
     
     def _isTruncated(self, pos, action):
-        action = self._get_action_tuples()[action]
-        if not 0 <= pos[0]+action[0] < GRIDWIDTH:
+        action = ACTION_TUPLES[action]
+        if not 0 <= pos[0]+action[0] < self.config.GRIDWIDTH:
             return True
-        elif MAX_AGE != -1 and self.world.t > MAX_AGE:
+        elif self.config.MAX_AGE != -1 and self.world.t > self.config.MAX_AGE:
             return True
         return False
     
     def _isTerminal(self, obs, pos, action):
-        action = self._get_action_tuples()[action]
-        return obs[LAYERS_UNDERNEATH-1+action[1]][pos[0]+action[0]] in TERMINAL_STATES
+        action = ACTION_TUPLES[action]
+        return TILE_TERMINAL[obs[self.config.LAYERS_UNDERNEATH-1+action[1]][pos[0]+action[0]]]
         
     def _isInvalid(self, obs, pos, action):
-        action = self._get_action_tuples()[action]
-        return pos[1]+action[1] == 0 or obs[LAYERS_UNDERNEATH-1+action[1]][pos[0]+action[0]] in INVALID_STATES 
+        action = ACTION_TUPLES[action]
+        return pos[1]+action[1] == 0 or TILE_INVALID[obs[self.config.LAYERS_UNDERNEATH-1+action[1]][pos[0]+action[0]]] 
     
     def _newHighscore(self, agent: Agent, action):
-        action = self._get_action_tuples()[action]
-        return agent.pos()[1]+action[1] > agent.highscore
+        action = ACTION_TUPLES[action]
+        return agent.y+action[1] > agent.highscore
     
     def _correctLogOffset(self, agent, action):
-        obsInfo = self.world.getObservationInfo(agent)
         if action == 4:
-            if type(obsInfo[1]) == Logs and obsInfo[1].hasMoved:
-                if obsInfo[1].direction == "r":
+            layer = self.world.getWindow(agent)[0][self.config.LAYERS_UNDERNEATH-1]
+            if type(layer) == Logs and layer.moved(self.world.t):
+                if layer.direction == "r":
                     agent.x += 1
-                elif obsInfo[1].direction == "l":
+                elif layer.direction == "l":
                     agent.x -= 1
     
     def _getReward(self, isInvalid, isTruncated, isTerminal, newHighscore, action):
         if isInvalid:
-            return REWARD_INVALID
+            return self.config.REWARD_INVALID
         elif isTruncated:
-            return REWARD_TRUNCATED
+            return self.config.REWARD_TRUNCATED
         elif isTerminal:
-            return REWARD_TERMINATED
+            return self.config.REWARD_TERMINATED
         elif newHighscore:
-            return REWARD_NEWLAYER
+            return self.config.REWARD_NEWLAYER
         else:
-            return REWARDS[action]
+            return self.config.REWARDS[action]
          
     def step(self, action):
 
-        # Update world
-        obs = self.world.getObservation(self.agent)
+        # Visible window of this tick, every layer in it is evaluated once
+        _, obs = self.world.getWindow(self.agent)
         
         isTruncated = self._isTruncated(self.agent.pos(), action)
         
@@ -120,39 +160,48 @@ class CrossyRoadEnv(gym.Env):
         # Do the actual step in the environment                
         if not isTruncated and not isInvalid:
             self.agent.step(action)
+        else:
+            # Actions that did not move the agent are traced as well, the trace is replayed by the GIF export
+            self.agent.trace_a.append(action)
         
         r = self._getReward(isInvalid, isTruncated, isTerminal, newHighscore, action)
         
         # Update world
         self.world.t += 1
         
+        self._return += r
+        if self._end is None and (isTerminal or isTruncated):
+            self._end = (len(self.agent.trace_a), bool(isTerminal))
+        
         
         # Check whether new layer has been added
         if not isInvalid and not isTruncated:
-            while self.agent.highscore > len(self.world)-20:
+            while self.agent.highscore > len(self.world)-self.config.HORIZON:
                 self.world.add_section()
+            if self.config.MAX_LAYERS_BEHIND != -1:
+                self.world.evict(self.agent.highscore - self.config.MAX_LAYERS_BEHIND)
                 
         info = {
-            "onLayer": self.world.getObservationInfo(self.agent)[1],
+            "onLayer": self.world.getWindow(self.agent)[0][self.config.LAYERS_UNDERNEATH-1],
             "newHighscore": newHighscore
             }
         
-    
-        obs = self.world.getObservationFloats(self.agent)
-        obs = self.mask.apply(obs, self.agent)
+        obs = self._getObservation()
         
         return obs, r, isTerminal, isTruncated, info
     
     def reset(self, seed = None, options=None):
         
         self.agent.reset()
-        self.world = World(seed=seed)
+        self.world.close()
+        self.world = World(seed=seed, config=self.config)
+        self._return = 0.0
+        self._end = None
     
-        obs = self.world.getObservationFloats(self.agent)
-        obs = self.mask.apply(obs, self.agent)
+        obs = self._getObservation()
         
         info = {
-            "onLayer": self.world.getObservationInfo(self.agent)[1],
+            "onLayer": self.world.getWindow(self.agent)[0][self.config.LAYERS_UNDERNEATH-1],
             "newHighscore": False
             }
         
@@ -160,21 +209,53 @@ class CrossyRoadEnv(gym.Env):
 
     def render(self):
         if self.render_mode == None:
-            raise ValueError("Cannot render when not in render_mode = human")
+            raise ValueError("Cannot render when not in render_mode = human or rgb_array")
         
+        elif self.render_mode == "rgb_array":
+            frame = self.rasterizer.render(self.world, self.agent)
+            return frame.copy() if self.copy else frame
+
         elif self.render_mode == "human":
+            import pygame
+            from crossyroadenv.render import renderWorld
             self.window.blit(renderWorld(self.world, self.agent),(0,0))
             pygame.display.flip()
-            self.clock.tick(FPS)
+            self.clock.tick(self.config.FPS)
 
     def close(self):
+        self.world.close()
         if self.render_mode == "human":
+            import pygame
             pygame.display.quit()
             pygame.quit()
 
-    def saveGIF(self, path = RECORD_PATH):
-        if self.render_mode == None:
-            raise ValueError("Cannot render when not in render_mode = human")
-        
-        recordingToGif(path, self.world, self.agent)
+    def clone_state(self) -> tuple:
+        """
+        Snapshot of the state of the episode, which restore_state restores. A snapshot costs a few
+        microseconds, since the layers of the world are shared until the world changes, see World.cloneState
+        """
+        agent = self.agent
+        return (self.world, self.world.cloneState(), agent.x, agent.y, agent.highscore, agent.lastAction,
+                agent.trace_a.tobytes(), self._return, self._end)
+
+    def restore_state(self, state: tuple) -> None:
+        """Restores a snapshot of clone_state, which must have been taken since the last reset"""
+        world, worldState, x, y, highscore, lastAction, trace, self._return, self._end = state
+        if world is not self.world:
+            raise ValueError("The state was cloned from another episode")
+        world.restoreState(worldState)
+        agent = self.agent
+        agent.x, agent.y, agent.highscore, agent.lastAction = x, y, highscore, lastAction
+        agent.trace_a = array('B', trace)
+
+    def episode(self):
+        """The current episode and its outcome as a replay.Episode, which can be stored with replay.writeEpisodes"""
+        from crossyroadenv.replay import Episode
+        end, terminated = (None, None) if self._end is None else self._end
+        return Episode.of(self.world, self.agent, reward=self._return, end=end, terminated=terminated)
+
+    def saveGIF(self, path = None, **kwargs):
+        """Saves a replay of the current episode as a GIF in the directory path, see export.recordingToGif"""
+        from crossyroadenv.export import recordingToGif
+        recordingToGif(self.config.RECORD_PATH if path is None else path, self.world, self.agent, **kwargs)
         
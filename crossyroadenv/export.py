@@ -0,0 +1,201 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config
+from crossyroadenv.agent import Agent
+from crossyroadenv.raster import Rasterizer, sprite, opaque, blit, tileColors, agentColor, meanColor, GROUND_ASSETS
+from crossyroadenv.replay import Episode, replay
+from crossyroadenv.world import World
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from PIL import Image, GifImagePlugin
+import numpy as np
+import os
+
+"""
+Streaming GIF export of episodes.
+
+An episode is first replayed without rendering, which records its Timeline: the state of
+the agent at every tick, and when the world grew. Since the world is a function of its seed
+and of these times, the frames are then split into ranges that are rendered by a pool of
+processes, each rebuilding the world from the timeline. Frames are rendered headless by a
+Rasterizer, mapped onto a fixed palette of the sprites and LZW-encoded as soon as they are
+rendered, only encoding the box in which a frame differs from the previous one. The encoded
+ranges are written to the file in order, and only a few ranges are in flight at once, so
+memory does not grow with the length of the episode.
+"""
+
+SKULL_FRAMES = 8        # frames of the skull animation at the end of a gif
+CHUNK_FRAMES = 100      # frames per range rendered by a worker
+
+@dataclass(frozen=True)
+class Timeline:
+    """
+    The replayed states of an episode, for every tick t = 0..len(episode.actions):
+    the agent (x, y, lastAction) and the lowest kept row of the world (offset).
+    sections holds a (t, length) pair for every tick t at which the world grew to length rows.
+    """
+    episode: Episode
+    x: np.ndarray
+    y: np.ndarray
+    lastAction: np.ndarray
+    offset: np.ndarray
+    sections: tuple
+
+    @classmethod
+    def of(cls, episode: Episode) -> "Timeline":
+        states, sections = [], []
+        for world, agent in replay(episode):
+            if not sections or len(world) != sections[-1][1]:
+                sections.append((world.t, len(world)))
+            states.append((agent.x, agent.y, agent.lastAction, world.offset))
+        x, y, lastAction, offset = np.array(states, dtype=np.int64).T
+        return cls(episode, x, y, lastAction, offset, tuple(sections))
+
+@lru_cache(maxsize=None)
+def palette(config: Config) -> Image.Image:
+    """
+    Palette image of 256 colors for the frames of config, quantized once from the pixels
+    of every asset at the tile size of config and the colors of the thumbnails
+    """
+    pixels = [sprite(path.stem, 1, 1, config.TILEWIDTH, config.TILEHEIGHT)[:,:,:3].reshape(-1, 3) for path in sorted(ASSETS.glob("*.png"))]
+    pixels += [tileColors(), agentColor()[None], np.array([meanColor(img) for img in GROUND_ASSETS.values()])]
+    mosaic = np.concatenate(pixels).astype(np.uint8)[None]
+    return Image.fromarray(mosaic).quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+
+def quantize(frame: np.ndarray, config: Config) -> np.ndarray:
+    """Palette indices uint8[H, W] of a frame on the palette of config"""
+    return np.asarray(Image.fromarray(frame).quantize(palette=palette(config), dither=Image.Dither.NONE))
+
+def encodeFrame(indices: np.ndarray, config: Config, duration, previous: np.ndarray = None) -> bytes:
+    """
+    Palette indices of a frame as a GIF image block, shown for duration milliseconds.
+    If the indices of the previous frame are given, only the box in which they differ is encoded.
+    """
+    x0, y0 = 0, 0
+    if previous is not None:
+        changed = indices != previous
+        rows, cols = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+        if len(rows) == 0:
+            rows, cols = np.array([0]), np.array([0])
+        y0, x0 = rows[0], cols[0]
+        indices = indices[y0:rows[-1]+1, x0:cols[-1]+1]
+
+    image = Image.fromarray(np.ascontiguousarray(indices), mode="P")
+    image.putpalette(palette(config).getpalette())
+    return b"".join(GifImagePlugin.getdata(image, offset=(int(x0), int(y0)), duration=duration))
+
+def header(shape, config: Config) -> bytes:
+    """GIF header of frames of shape [H, W, 3] on the palette of config, looping forever"""
+    image = Image.new("P", (shape[1], shape[0]))
+    image.putpalette(palette(config).getpalette())
+    blocks, _ = GifImagePlugin.getheader(image, info={"loop": 0, "optimize": False})
+    return b"".join(blocks)
+
+def skull(nr, config: Config) -> tuple[np.ndarray, np.ndarray]:
+    """Frame nr of the skull animation, as made by raster.opaque"""
+    skulls = sprite("skulls", 4, 2, config.TILEWIDTH, config.TILEHEIGHT)
+    x, y = (nr%4)*config.TILEWIDTH, (nr//4)*config.TILEHEIGHT
+    return opaque(skulls[y:y+config.TILEHEIGHT, x:x+config.TILEWIDTH])
+
+def _renderRange(timeline: Timeline, frames, durations, thumbnail, base = None) -> bytes:
+    """
+    Worker of exportGif: renders and encodes frames, a list of (t, skull) pairs in increasing t,
+    where skull is the frame of the skull animation to draw over the agent or -1.
+    base is the frame before the range, which is rendered but only encoded against, such that
+    the encoding does not depend on how the frames are split into ranges.
+    The world is rebuilt by growing it at the same ticks as in the timeline.
+    """
+    episode = timeline.episode
+    config = episode.config
+    world = episode.world()
+    agent = Agent(config)
+    rasterizer = Rasterizer(config, thumbnail)
+    last = len(timeline.x)-1
+    sections = iter(timeline.sections)
+    growth = next(sections, None)
+
+    if base is not None:
+        frames, durations = [base] + frames, [None] + durations
+
+    data, previous = [], None
+    for (t, nr), duration in zip(frames, durations):
+        tick = min(t, last)
+        while growth is not None and growth[0] <= tick:
+            world.t = growth[0]
+            while len(world) < growth[1]:
+                world.add_section()
+            growth = next(sections, None)
+        world.evict(int(timeline.offset[tick]))
+
+        world.t = t
+        agent.x, agent.y, agent.lastAction = int(timeline.x[tick]), int(timeline.y[tick]), int(timeline.lastAction[tick])
+        frame = rasterizer.render(world, agent)
+        if nr >= 0 and thumbnail is None:
+            x = min(max(agent.x, -0.5), config.GRIDWIDTH-0.5)*config.TILEWIDTH
+            blit(frame, skull(nr, config), x, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*config.TILEHEIGHT)
+        indices = quantize(frame, config)
+        if duration is not None:
+            data.append(encodeFrame(indices, config, duration, previous))
+        previous = indices
+
+    world.close()
+    return b"".join(data)
+
+def exportGif(path, episode: Episode, workers = None, skip = 1, maxFrames = None, thumbnail = None, duration = None, chunk = CHUNK_FRAMES) -> None:
+    """
+    Replays episode into a GIF at path: a frame of every skip-th tick and of the last tick,
+    followed by the skull animation. Every frame is shown for skip ticks of duration
+    milliseconds (GIF_DURATION of the config by default). If maxFrames is given, only the
+    last maxFrames frames are kept. thumbnail renders thumbnails, see Rasterizer.
+    skip, maxFrames and chunk are at least 1.
+    The frames are rendered in ranges of chunk frames by a pool of workers processes,
+    or in this process if workers is 0.
+    """
+    if skip < 1:
+        raise ValueError(f"skip must be at least 1, got {skip}")
+    if maxFrames is not None and maxFrames < 1:
+        raise ValueError(f"maxFrames must be at least 1 or None, got {maxFrames}")
+    if chunk < 1:
+        raise ValueError(f"chunk must be at least 1, got {chunk}")
+    config = episode.config
+    duration = config.GIF_DURATION if duration is None else duration
+    last = len(episode.actions)
+
+    ticks = list(range(0, last+1, skip))
+    if ticks[-1] != last:
+        ticks.append(last)
+    frames = [(t, -1) for t in ticks] + [(last+i, i) for i in range(SKULL_FRAMES)]
+    durations = [duration*skip]*len(ticks) + [duration]*SKULL_FRAMES
+    if maxFrames is not None:
+        frames, durations = frames[-maxFrames:], durations[-maxFrames:]
+
+    timeline = Timeline.of(episode)
+    ranges = [(frames[i:i+chunk], durations[i:i+chunk], frames[i-1] if i else None) for i in range(0, len(frames), chunk)]
+
+    with open(path, 'wb') as f:
+        f.write(header(Rasterizer(config, thumbnail).shape, config))
+        if workers == 0:
+            for frames, durations, base in ranges:
+                f.write(_renderRange(timeline, frames, durations, thumbnail, base))
+        else:
+            workers = os.cpu_count() if workers is None else workers
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                inFlight = deque()
+                for frames, durations, base in ranges:
+                    inFlight.append(pool.submit(_renderRange, timeline, frames, durations, thumbnail, base))
+                    if len(inFlight) > 2*workers:
+                        f.write(inFlight.popleft().result())
+                while inFlight:
+                    f.write(inFlight.popleft().result())
+        f.write(b";")
+
+def recordingToGif(path, world: World, agent: Agent, **kwargs) -> None:
+    """
+    Saves a replay of the episode of agent in world as a GIF in the directory path,
+    see exportGif for the keyword arguments
+    """
+    Path(path).mkdir(parents=True, exist_ok=True)
+    episode = Episode.of(world, agent)
+    exportGif(Path(path) / f"{world.seed}-{agent.highscore}-{len(episode.actions)+SKULL_FRAMES}.gif", episode, **kwargs)
@@ -1,4 +1,5 @@
 from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
 import numpy as np
 
 """
@@ -12,13 +13,62 @@ B: bush
 W: water
 0: ground/free
 P: lilypad
+t: rail, warning for a train
+T: train
 
+Layers store these letters as uint8 tile codes (see TILES in const.py),
+use encode and decode to convert between the two.
 """
 
-def compactAttributes(lst, obstacleID, figID = False) -> list[tuple]:
+def encode(rep) -> np.ndarray:
+    """
+    Converts a string (or list) of letters into an array of tile codes
+    """
+    return np.array([TILE[x] for x in rep], dtype=np.uint8)
+
+def decode(codes) -> str:
+    """
+    Converts an array of tile codes back into a string of letters
+    """
+    return ''.join(TILES[x] for x in codes)
+
+def scrollTable(direction, cycle, width = GRIDWIDTH) -> np.ndarray:
+    """
+    Start of the visible window within a doubled representation, for every t of one cycle.
+    The layer is translated by translate_t = width*t/cycle cells (mod width), which is
+    computed as an exact fraction and rounded half to even like round(). The window is
+    representation[start:start+width] with start = width - round(translate_t).
+    """
+    n = width * np.arange(cycle, dtype=np.int64)
+    if direction == "l":
+        n = width*cycle - n
+    elif direction == "s":
+        n = np.zeros(cycle, dtype=np.int64)
+
+    q, r = np.divmod(n, cycle)
+    q += (2*r > cycle) | ((2*r == cycle) & (q % 2 == 1))
+    return (width - q).astype(np.uint16)
+
+def railTable(interval, speed, direction, width = GRIDWIDTH, warnSteps = RAIL_WARN_STEPS) -> np.ndarray:
+    """Rows of a rail for every t of an interval: a warning, then the train passing by"""
+    t = np.arange(interval)[:,None]
+    x = np.arange(width)[None,:]
+    tt = (t - warnSteps) * speed
+
+    warn = t < warnSteps + (width // speed)*2
+    train = warn & (t > warnSteps) & (tt-7 <= x) & (x < tt)
+
+    rows = np.where(train, TILE['T'], np.where(warn, TILE['t'], TILE['0'])).astype(np.uint8)
+    if direction == "l":
+        rows = rows[:,::-1]
+    return rows
+
+def compactAttributes(lst, obstacleID, figID = False, rng = None) -> list[tuple]:
     """
     Compacts a list of elements into a list with tuples with (location,length)
+    If figID, a random figure is drawn from rng for every obstacle: (location,length,figure)
     """
+    rng = np.random.default_rng() if rng is None else rng
     res = []
     
     i = 0
@@ -32,11 +82,11 @@ def compactAttributes(lst, obstacleID, figID = False) -> list[tuple]:
             
             if figID:
                 if length == 2:
-                    res.append((loc,length,np.random.randint(1,6)))
+                    res.append((loc,length,rng.integers(1,6)))
                 elif length == 3:
-                    res.append((loc,length,np.random.randint(1,3)))
+                    res.append((loc,length,rng.integers(1,3)))
                 elif length == 4:
-                    res.append((loc,length,np.random.randint(1,2)))
+                    res.append((loc,length,rng.integers(1,2)))
             else:
                 res.append((loc,length))
             
@@ -49,28 +99,45 @@ class Layer:
     """
     Default layer. Every new layer can inherit this class to avoid
     to forget the bare minimum that defines a layer.
+    Random layers draw from rng, the numpy Generator of the world they belong to,
+    unless their tile codes are given as representation (one period for moving layers).
+    The size of a layer and its tables are taken from config, the Config of its world.
+    Layers are slotted, every attribute of a layer must be listed in __slots__.
+    isStatic tells whether the layer moves, period is the number of ticks after which
+    its observation repeats, 1 for layers whose observation does not depend on t.
     """
-    def __init__(self):
-        self.representation = ['0']*GRIDWIDTH
+    __slots__ = ('representation', 'isStatic', 'period')
+
+    def __init__(self, rng = None, config: Config = DEFAULT_CONFIG):
+        self.representation = np.full(config.GRIDWIDTH, TILE['0'], dtype=np.uint8)
         self.isStatic = True
+        self.period = 1
 
     def update(self) -> None:
         return
-    def observation(self,t) -> list:
+    def observation(self,t) -> np.ndarray:
         return self.representation
+    def phase(self,t) -> float:
+        """Sub-cell offset of the layer at time t, in [0,1)"""
+        return 0.0
     def copy(self):
-        c = globals()[self.__class__.__name__]()
-        for key, value in dict(vars(self)).items():
-            setattr(c,key,value)
+        c = self.__class__.__new__(self.__class__)
+        for cls in self.__class__.__mro__:
+            for key in getattr(cls, '__slots__', ()):
+                if hasattr(self, key):
+                    setattr(c, key, getattr(self, key))
         return c
     
 class Empty(Layer):
     """
     The empty layer consists of just grass, which is walkable
     """
-    def __init__(self):
-        self.representation = ['0'] * GRIDWIDTH
+    __slots__ = ()
+
+    def __init__(self, rng = None, config: Config = DEFAULT_CONFIG):
+        self.representation = np.full(config.GRIDWIDTH, TILE['0'], dtype=np.uint8)
         self.isStatic = True
+        self.period = 1
   
 class Bush(Layer):
     """
@@ -78,12 +145,18 @@ class Bush(Layer):
     bushes are obstacles you cannot walk in. Taking an action that results 
     the agent to be in the position of the bush will count as an INVALID move.
     """
-    def __init__(self, density=0.3, border = False):
-        self.representation = list(np.random.choice(['0','B'], p=[1-density,density], size = GRIDWIDTH))
+    __slots__ = ()
+
+    def __init__(self, density=0.3, border = False, rng = None, representation = None, config: Config = DEFAULT_CONFIG):
+        if representation is None:
+            rng = np.random.default_rng() if rng is None else rng
+            representation = rng.choice(encode('0B'), p=[1-density,density], size = config.GRIDWIDTH)
+        self.representation = representation
         if border:
-            self.representation[0] = 'B'
-            self.representation[-1] = 'B'
+            self.representation[0] = TILE['B']
+            self.representation[-1] = TILE['B']
         self.isStatic = True
+        self.period = 1
 
 class Logs(Layer):
     """
@@ -95,124 +168,122 @@ class Logs(Layer):
     this layer results in getting in the grid cell that is rounded the closest to you
     You move in a grid based manner on the logs.
     """
-    def __init__(self, density = 0.6, cycle = 1500, direction = "s"):
+    __slots__ = ('direction', 'cycle', 'speed', 'maxtime', 'logConfiguration', 'starts', 'moves')
+
+    def __init__(self, density = 0.6, cycle = 1500, direction = "s", rng = None, representation = None, config: Config = DEFAULT_CONFIG):
         
         self.direction = direction
-        self.speed = GRIDWIDTH/cycle
-        self.maxtime = GRIDWIDTH
+        self.cycle = int(cycle)
+        self.speed = config.GRIDWIDTH/cycle
+        self.maxtime = config.GRIDWIDTH
 
         # self.representation = list(np.random.choice(['L','W'], p=[density,1-density], size = GRIDWIDTH))
-        self.representation = np.random.choice(
+        if representation is None:
+            rng = np.random.default_rng() if rng is None else rng
+            representation = np.resize(encode(rng.choice(
                                 ['WLLLWLLLWLLLWWW',
                                 'WWLLWWLLWWLLWWW',
                                 'WLLWWLLLWWLLWLL',
                                 'WWLLLLWLWLLLLWL',
                                 'WWWLLLWWWLLLWWW',
-                                'LWLLLWWLLWWLLWW'])
-        self.representation = list(self.representation)
-        self.representation = self.representation * 2
+                                'LWLLLWWLLWWLLWW'])), config.GRIDWIDTH)
+        self.representation = np.tile(representation, 2)
 
-        self.logConfiguration = compactAttributes(self.representation, obstacleID='L')
+        self.logConfiguration = compactAttributes(self.representation, obstacleID=TILE['L'])
         self.isStatic = False if direction != 's' else True
+        self.period = self.cycle if direction != 's' else 1
         
-        # Check whether log layer has moved in representation
-        self.prevPartition = [GRIDWIDTH - int(round(0)),GRIDWIDTH*2 -int(round(0))]
-        self.hasMoved = False
-           
+        # Window of every t in a cycle, and whether the window moved since t-1
+        self.starts = config.table(('scroll', direction, self.cycle), lambda: scrollTable(direction, self.cycle, self.maxtime))
+        self.moves = config.table(('moves', direction, self.cycle), lambda: self.starts % self.maxtime != np.roll(self.starts % self.maxtime, 1))
 
     def observation(self,t):
-        if self.direction == "r":
-            translate_t = ((self.speed * t) % GRIDWIDTH)
-            
-        elif self.direction == "l":
-            translate_t = GRIDWIDTH - ((self.speed * t) % GRIDWIDTH)
-                        
-        elif self.direction == "s":
-            translate_t = 0
-            
-        
-        
-        # Check whether log layer has moved
-        if self.prevPartition != [GRIDWIDTH - int(round(translate_t)),GRIDWIDTH*2 -int(round(translate_t))]:
-            self.prevPartition = [GRIDWIDTH - int(round(translate_t)),GRIDWIDTH*2 -int(round(translate_t))]
-            self.hasMoved = True
-        else:
-            self.hasMoved = False
-            
-        return self.representation[GRIDWIDTH - int(round(translate_t)): GRIDWIDTH*2 -int(round(translate_t))]
+        start = self.starts[t % self.cycle]
+        return self.representation[start:start+self.maxtime]
+
+    def phase(self,t):
+        return (self.maxtime * (t % self.cycle) % self.cycle) / self.cycle
+
+    def moved(self,t) -> bool:
+        """Whether the logs moved a cell between t-1 and t"""
+        return bool(self.moves[t % self.cycle])
     
 class Road(Layer):
     """
     The road section consists of roads where cars can come from one direction.
     The roads itself are safe to walk on. Hitting a car will TERMINATE the environment.
     """
-    def __init__(self, density=0.3, cycle = 1500, direction = "s"):
+    __slots__ = ('direction', 'cycle', 'speed', 'maxtime', 'carConfiguration', 'starts')
+
+    def __init__(self, density=0.3, cycle = 1500, direction = "s", rng = None, representation = None, figures = None, config: Config = DEFAULT_CONFIG):
+        """
+        figures holds the figure of the car starting at every location, as drawn by
+        compactAttributes, and must be given together with representation
+        """
 
         self.direction = direction
-        self.speed = GRIDWIDTH/cycle
-        self.maxtime = GRIDWIDTH
+        self.cycle = int(cycle)
+        self.speed = config.GRIDWIDTH/cycle
+        self.maxtime = config.GRIDWIDTH
         self.isStatic = False if direction != 's' else True
+        self.period = self.cycle if direction != 's' else 1
 
         # self.representation = list(np.random.choice(['C','0'], p=[density,1-density], size = GRIDWIDTH))
-        self.representation = np.random.choice([
+        if representation is None:
+            rng = np.random.default_rng() if rng is None else rng
+            representation = np.resize(encode(rng.choice([
                                 '00CCCC000000000',
                                 '000CCC000CCC000',
                                 '00CC000000CC000',
                                 '0CCC00CC00CC000',
                                 'CC0000CCC000000',
-                                '00CC00000000000'])
-        self.representation = list(self.representation)
-        self.carConfiguration = compactAttributes(self.representation,obstacleID='C',figID = True)
-        self.representation = self.representation * 2
-    
+                                '00CC00000000000'])), config.GRIDWIDTH)
+            self.carConfiguration = compactAttributes(representation,obstacleID=TILE['C'],figID = True, rng = rng)
+        else:
+            self.carConfiguration = [(loc,length,figures[loc]) for loc,length in compactAttributes(representation,obstacleID=TILE['C']) if figures[loc]]
+        self.representation = np.tile(representation, 2)
+
+        # Window of every t in a cycle
+        self.starts = config.table(('scroll', direction, self.cycle), lambda: scrollTable(direction, self.cycle, self.maxtime))
+
     def observation(self, t):
-        if self.direction == "r":
-            translate_t = ((self.speed * t) % GRIDWIDTH)
-            
-        elif self.direction == "l":
-            translate_t = GRIDWIDTH - ((self.speed * t) % GRIDWIDTH)
-                        
-        elif self.direction == "s":
-            translate_t = 0
-            
-        return self.representation[GRIDWIDTH - int(round(translate_t)): GRIDWIDTH*2 -int(round(translate_t))]
+        start = self.starts[t % self.cycle]
+        return self.representation[start:start+self.maxtime]
+
+    def phase(self,t):
+        return (self.maxtime * (t % self.cycle) % self.cycle) / self.cycle
 
 class Lilypad(Layer):
     """
     The lilypad layer consists of water, where a few lilypads are placed.
     Walking on water results in TERMINATION. The lilypads are static and safe to walk on.
     """
-    def __init__(self, density=0.6):
-        self.representation = list(np.random.choice(['W','P'], p=[1-density,density], size = GRIDWIDTH))
+    __slots__ = ()
+
+    def __init__(self, density=0.6, rng = None, representation = None, config: Config = DEFAULT_CONFIG):
+        if representation is None:
+            rng = np.random.default_rng() if rng is None else rng
+            representation = rng.choice(encode('WP'), p=[1-density,density], size = config.GRIDWIDTH)
+        self.representation = representation
         self.isStatic = True
+        self.period = 1
 
 class Rail(Layer):
-    def __init__(self, interval = 60, speed = 3, direction = "s"):
+    __slots__ = ('direction', 'interval', 'speed', 'rows')
+
+    def __init__(self, interval = 60, speed = 3, direction = "s", rng = None, config: Config = DEFAULT_CONFIG):
         
         self.direction = direction
         self.interval = interval
         
         self.speed = speed
-        self.isStatic = False if direction != 's' else True        
-    
-    def observation(self, t):
-        
-        translate_t = t % self.interval
-        
-        # Warn
-        if translate_t < RAIL_WARN_STEPS + (GRIDWIDTH // self.speed)*2:
-            representation = ['t']*GRIDWIDTH
-            
-            # Train
-            if translate_t > RAIL_WARN_STEPS:
-                tt = (translate_t - RAIL_WARN_STEPS) * self.speed
-                
-                representation[max(0,tt-7):min(tt,GRIDWIDTH)] = ['T']*(min(tt,GRIDWIDTH)-max(0,tt-7))
-                if self.direction == "l":
-                    representation = representation[::-1]
-                    
-        else:
-            representation = ['0']*GRIDWIDTH
+        # Trains of a rail that does not move still pass by, its rows depend on t in every direction
+        self.isStatic = False if direction != 's' else True
+        self.period = int(interval)
 
-        return representation
-        
+        # Rows of every t in an interval
+        self.rows = config.table(('rail', int(interval), int(speed), direction),
+                                 lambda: railTable(interval, speed, direction, config.GRIDWIDTH, config.RAIL_WARN_STEPS))
+
+    def observation(self, t):
+        return self.rows[t % self.interval]
@@ -1,9 +1,10 @@
 from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
 import numpy as np
 
 class Mask:
     
-    def __init__(self, mask: str):
+    def __init__(self, mask: str, config: Config = DEFAULT_CONFIG):
         """
         Make a mask via initializing what parts of the environment you want to see relative to the agent
         This is done via assigning where the agent is relative to your desired observed cell values
@@ -19,15 +20,18 @@ class Mask:
         This allows for more intricate shapes. Anything outside the environment is assigned a terminal value
         NOTE: since this does not always have to be a rectangular shape, the cells with '.' gets assigned -1 as value, and the shape will remain the same
         
+        The mask is compiled into gather indices for every agent x, such that applying it is a single take.
+        The indices are shared by all masks of the same config.
         """
         
+        self.config = config
         self.mask = [[y for y in ''.join(x.split())] for x in mask.split('\n')]
         self.agentPos = []
         self.maskPoints = []
         self.shape = np.array((len(self.mask),len(self.mask[0])))
         
         # Flattens into 1D array, without the need of -1 values
-        self.flatten = FLATTEN
+        self.flatten = config.FLATTEN
         
         if not self.flatten:
             self.shapeObs = np.array((len(self.mask),len(self.mask[0])))
@@ -35,6 +39,14 @@ class Mask:
             self.shapeObs = np.array((len(self.mask)*len(self.mask[0]) - mask.count('.'),))
         
         self._extractMask()
+        self.minX, self.maxX, self._gather = config.table(('mask', mask), self._compile)
+        
+        # Observation followed by the fill values, the observation is copied in on apply
+        size = config.GRIDHEIGHT*config.GRIDWIDTH
+        self._size = size
+        self._source = np.empty(size+2, dtype=np.float64)
+        self._source[size:] = (1, -1)
+        self._batchSource = np.empty((0, size+2), dtype=np.float64)
         
     def _extractMask(self):
         self.maskPoints = [(0,0)]
@@ -50,17 +62,78 @@ class Mask:
             for j in range(self.shape[1]):
                 if self.mask[i][j] == "x":
                     self.maskPoints.append((j-self.agentPos[0] , i-self.agentPos[1]))
- 
-    def apply(self, obs, agent):
-        maskobs = np.full(self.shape,-1,dtype='float64')
-        
-        for dx,dy in self.maskPoints:
-            if 0 <= LAYERS_UNDERNEATH-1+dy <= GRIDHEIGHT and 0 <= agent.x+dx < GRIDWIDTH:
-                maskobs[dy+self.agentPos[1]][dx+self.agentPos[0]] = obs[LAYERS_UNDERNEATH-1+dy][agent.x+dx]
+    
+    def _compile(self) -> tuple[int, int, np.ndarray]:
+        """
+        Gather indices of every output cell into an observation of GRIDHEIGHT x GRIDWIDTH
+        floats, followed by the fill values 1 (outside the environment) and -1 (not observed).
+        The output is the mask in reversed row order, or the observed cells in reversed order
+        when flattened. One table is made per agent x from minX to maxX, further out every
+        observed cell is outside the environment anyway.
+        """
+        width, height = self.config.GRIDWIDTH, self.config.GRIDHEIGHT
+        rows, cols = self.shape
+        observed = np.zeros(rows*cols, dtype=bool)
+        dx = np.zeros(rows*cols, dtype=np.int64)
+        dy = np.zeros(rows*cols, dtype=np.int64)
+        for px, py in self.maskPoints:
+            cell = (py+self.agentPos[1])*cols + px+self.agentPos[0]
+            observed[cell], dx[cell], dy[cell] = True, px, py
         
         if self.flatten:
-            maskobs = maskobs.flatten()
-            maskobs = maskobs[maskobs != -1]
-            
-        return maskobs[::-1]
+            order = np.flatnonzero(observed)[::-1]
+        else:
+            order = np.arange(rows*cols).reshape(rows, cols)[::-1].ravel()
+        observed, dx, row = observed[order], dx[order], self.config.LAYERS_UNDERNEATH-1+dy[order]
+        
+        minX = -int(np.abs(dx).max())-1
+        maxX = width + int(np.abs(dx).max())
+        x = np.arange(minX, maxX+1)[:,None] + dx[None,:]
+        inside = (0 <= row) & (row < height) & (0 <= x) & (x < width)
+        
+        size = height*width
+        gather = np.where(observed, np.where(inside, row*width + x, size), size+1)
+        gather.flags.writeable = False
+        return minX, maxX, gather
+    
+    def apply(self, obs, agent, out = None):
+        """
+        Applies the mask to an observation of GRIDHEIGHT x GRIDWIDTH floats around agent.
+        Rows missing from a shorter observation are outside the environment.
+        The result is written into out if given, otherwise into a new array.
+        """
+        obs = np.ravel(obs)
+        self._source[:obs.size] = obs
+        self._source[obs.size:self._size] = 1
+        if out is None:
+            out = np.empty(self.shapeObs, dtype=np.float64)
+        x = min(max(agent.x, self.minX), self.maxX)
+        np.take(self._source, self._gather[x - self.minX], out=out.reshape(-1), mode='clip')
+        return out
+    
+    def apply_batch(self, obs, xs, out = None):
+        """
+        Applies the mask to N observations obs[N, GRIDHEIGHT, GRIDWIDTH] of agents at
+        columns xs[N], like apply. The result is written into out[N, *shapeObs] if given,
+        otherwise into a new array.
+        """
+        n = len(obs)
+        if len(self._batchSource) != n:
+            self._batchSource = np.empty((n, self._source.size), dtype=np.float64)
+            self._batchSource[:,-2:] = (1, -1)
+            self._batchOffsets = np.arange(n)[:,None] * self._source.size
+            self._batchColumns = np.empty(n, dtype=np.int64)
+            self._batchIndices = np.empty((n, self._gather.shape[1]), dtype=self._gather.dtype)
+        obs = np.reshape(obs, (n, -1))
+        self._batchSource[:,:obs.shape[1]] = obs
+        self._batchSource[:,obs.shape[1]:self._size] = 1
+        
+        if out is None:
+            out = np.empty((n, *self.shapeObs), dtype=np.float64)
+        columns = np.clip(xs, self.minX, self.maxX, out=self._batchColumns)
+        np.subtract(columns, self.minX, out=columns)
+        indices = np.take(self._gather, columns, axis=0, out=self._batchIndices, mode='clip')
+        np.add(indices, self._batchOffsets, out=indices)
+        np.take(self._batchSource, indices, out=out.reshape(n, -1), mode='clip')
+        return out
         
\ No newline at end of file
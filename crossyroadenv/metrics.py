@@ -0,0 +1,197 @@
+from collections import Counter, defaultdict
+from functools import wraps
+from time import perf_counter
+import cProfile
+import pstats
+import sys
+import threading
+
+"""
+Optional instrumentation of the hot paths of the environment.
+
+enable() wraps the phases below with timers and counters, and disable() puts the
+original functions back, so instrumentation costs nothing while it is disabled.
+Instrumentation is process-wide: every environment of the process is measured
+by the same Metrics. Phases:
+- step, reset and observation: CrossyRoadEnv.step, reset and _getObservation
+- add_section: World.add_section
+- generate: the add of every world generator, which retries until check accepts a section
+- check: sections.check
+- mask: Mask.apply and Mask.apply_batch, which builds the observations of mask mode
+- render and raster: renderWorld and Rasterizer.render, once an environment with a render
+  mode imports them, or if they were imported before enable
+
+Hooks are called as hook(phase, entering) around every phase, e.g. ProfileHook.
+"""
+
+class Metrics:
+    """
+    Per-phase timers (seconds, including the phases called within) and call counters,
+    a histogram of the number of retries of every generated section, and gauges of the
+    length of the last stepped world
+    """
+    def __init__(self, info = False):
+        self.info = info
+        self.hooks = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears every timer, counter, histogram and gauge"""
+        self.timers = defaultdict(float)
+        self.calls = Counter()
+        self.retries = Counter()
+        self.gauges = {}
+
+    def addHook(self, hook) -> None:
+        """Calls hook(phase, entering) when a phase is entered and left"""
+        self.hooks.append(hook)
+
+    def removeHook(self, hook) -> None:
+        self.hooks.remove(hook)
+
+    def summary(self) -> dict:
+        """The metrics as a dict of plain values"""
+        return {
+            'phases': {phase: {'calls': self.calls[phase], 'seconds': self.timers[phase],
+                               'mean_us': 1e6*self.timers[phase]/self.calls[phase]} for phase in self.calls},
+            'retries': dict(sorted(self.retries.items())),
+            'gauges': dict(self.gauges),
+        }
+
+class ProfileHook:
+    """Hook that runs cProfile while any of phases (all phases if None) is entered"""
+    def __init__(self, phases = None):
+        self.phases = phases
+        self.profile = cProfile.Profile()
+        self.depth = 0
+
+    def __call__(self, phase, entering) -> None:
+        if self.phases is not None and phase not in self.phases:
+            return
+        if entering:
+            self.depth += 1
+            if self.depth == 1:
+                self.profile.enable()
+        else:
+            self.depth -= 1
+            if self.depth == 0:
+                self.profile.disable()
+
+    def stats(self) -> pstats.Stats:
+        return pstats.Stats(self.profile)
+
+METRICS: Metrics = None     # The Metrics of enable, None while instrumentation is disabled
+_originals = []             # (owner, name, function) of every wrapped function
+_local = threading.local()  # Calls of check per thread, the prefetch threads generate sections as well
+
+def _timed(metrics: Metrics, phase, func):
+    """func, timed as phase"""
+    timers, calls, hooks = metrics.timers, metrics.calls, metrics.hooks
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for hook in hooks:
+            hook(phase, True)
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timers[phase] += perf_counter() - start
+            calls[phase] += 1
+            for hook in hooks:
+                hook(phase, False)
+    return wrapper
+
+def _wrap(owner, name, wrapper) -> None:
+    original = getattr(owner, name)
+    _originals.append((owner, name, original))
+    setattr(owner, name, wrapper(original))
+
+def enable(info = False) -> Metrics:
+    """
+    Instruments the phases and returns their Metrics. If info is True, the summary of
+    the metrics is added to the info of every step and reset as info["metrics"].
+    """
+    global METRICS
+    if METRICS is not None:
+        disable()
+    from crossyroadenv import sections
+    from crossyroadenv.env import CrossyRoadEnv
+    from crossyroadenv.world import World
+    from crossyroadenv.mask import Mask
+    metrics = METRICS = Metrics(info)
+
+    def counted(check):
+        timed = _timed(metrics, 'check', check)
+        @wraps(check)
+        def wrapper(*args, **kwargs):
+            _local.checks = getattr(_local, 'checks', 0) + 1
+            return timed(*args, **kwargs)
+        return wrapper
+
+    def generate(add):
+        timed = _timed(metrics, 'generate', add)
+        @wraps(add)
+        def wrapper(*args, **kwargs):
+            before = getattr(_local, 'checks', 0)
+            section = timed(*args, **kwargs)
+            checks = getattr(_local, 'checks', 0) - before
+            if checks:
+                metrics.retries[checks-1] += 1
+            return section
+        return wrapper
+
+    def stepped(phase):
+        def wrap(func):
+            timed = _timed(metrics, phase, func)
+            @wraps(func)
+            def wrapper(self, *args, **kwargs):
+                result = timed(self, *args, **kwargs)
+                metrics.gauges['world_length'] = len(self.world)
+                metrics.gauges['world_layers'] = len(self.world.world)
+                if metrics.info:
+                    result[-1]['metrics'] = metrics.summary()
+                return result
+            return wrapper
+        return wrap
+
+    _wrap(sections, 'check', counted)
+    for generator in set(sections.GENERATORS.values()):
+        if 'add' in generator.__dict__:
+            _wrap(generator, 'add', generate)
+    _wrap(CrossyRoadEnv, 'step', stepped('step'))
+    _wrap(CrossyRoadEnv, 'reset', stepped('reset'))
+    _wrap(CrossyRoadEnv, '_getObservation', lambda f: _timed(metrics, 'observation', f))
+    _wrap(World, 'add_section', lambda f: _timed(metrics, 'add_section', f))
+    _wrap(Mask, 'apply', lambda f: _timed(metrics, 'mask', f))
+    _wrap(Mask, 'apply_batch', lambda f: _timed(metrics, 'mask', f))
+
+    # The rendering modules are imported by the render modes that need them, see env.py
+    def rendering(setup):
+        @wraps(setup)
+        def wrapper(self, *args, **kwargs):
+            setup(self, *args, **kwargs)
+            _instrumentRendering(metrics)
+        return wrapper
+    _wrap(CrossyRoadEnv, '_setupRendering', rendering)
+    _instrumentRendering(metrics)
+    return metrics
+
+def _instrumentRendering(metrics: Metrics) -> None:
+    """Instruments renderWorld and Rasterizer.render once their modules are imported"""
+    wrapped = {(owner, name) for owner, name, _ in _originals}
+    if 'crossyroadenv.render' in sys.modules:
+        render = sys.modules['crossyroadenv.render']
+        if (render, 'renderWorld') not in wrapped:
+            _wrap(render, 'renderWorld', lambda f: _timed(metrics, 'render', f))
+    if 'crossyroadenv.raster' in sys.modules:
+        Rasterizer = sys.modules['crossyroadenv.raster'].Rasterizer
+        if (Rasterizer, 'render') not in wrapped:
+            _wrap(Rasterizer, 'render', lambda f: _timed(metrics, 'raster', f))
+
+def disable() -> None:
+    """Puts the original functions back"""
+    global METRICS
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+    METRICS = None
@@ -0,0 +1,156 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.mask import Mask
+from crossyroadenv.world import interpolateFloats
+from gymnasium import spaces
+import numpy as np
+
+"""
+Observations are made from the visible window of a world: its tile codes,
+and the direction and sub-cell phase of every row, see World.getWindow.
+"""
+
+OBS_MODES = ['mask', 'channels']
+OBS_DTYPES = {'float64': np.float64, 'float32': np.float32, 'uint8': np.uint8}
+
+# Channels of the channels mode: one per tile type, then the moving rows
+CHANNELS = list(TILES) + ['left', 'right', 'phase']
+
+class Observer:
+    """
+    Turns visible windows into observations, in one of two modes:
+    - mask: the floats of World.getObservationFloats seen through a Mask
+    - channels: a tensor [C, h, w] over an egocentric window of (below, above, left, right)
+      cells around the agent, with the rows ahead on top. There is a one-hot channel
+      per tile type, cells outside the visible window are tile '1'. The channels left
+      and right mark the cells of rows moving in that direction, and phase holds the
+      sub-cell phase of the moving rows.
+    uint8 observations scale [0,1] to [0,255], unobserved cells (-1) of a mask become 0.
+    Observations are written into out if given, every intermediate buffer is reused.
+    The mode, dtype, window and mask default to the OBS_* fields and MASK of config.
+    """
+
+    def __init__(self, mode = None, dtype = None, window = None, mask = None, config: Config = DEFAULT_CONFIG):
+        mode = config.OBS_MODE if mode is None else mode
+        dtype = config.OBS_DTYPE if dtype is None else dtype
+        window = config.OBS_WINDOW if window is None else tuple(window)
+        mask = config.MASK if mask is None else mask
+        if mode not in OBS_MODES:
+            raise ValueError(f"{mode} is not in {OBS_MODES}")
+        if dtype not in OBS_DTYPES:
+            raise ValueError(f"{dtype} is not in {list(OBS_DTYPES.keys())}")
+
+        self.config = config
+        self.mode = mode
+        self.dtype = OBS_DTYPES[dtype]
+        self.scale = 255 if self.dtype == np.uint8 else 1
+        self.mask: Mask = Mask(mask, config)
+
+        if mode == 'mask':
+            self.shape = tuple(self.mask.shapeObs)
+            low = 0 if self.dtype == np.uint8 else -1
+        else:
+            self.below, self.above, self.left, self.right = window
+            self.shape = (len(CHANNELS), self.below+self.above+1, self.left+self.right+1)
+            low = 0
+            self.minX, self.maxX, self._gather = config.table(('window', window), self._compile)
+            self._tiles = np.arange(len(TILES), dtype=np.uint8)[None,:,None]
+        self.space = spaces.Box(low=low, high=self.scale, shape=self.shape, dtype=self.dtype)
+
+        self._buffers = {}
+
+    def _compile(self) -> tuple[int, int, np.ndarray]:
+        """
+        Gather indices of every cell of the egocentric window into a window of GRIDHEIGHT x GRIDWIDTH
+        cells followed by a row of outside cells, for every agent x from minX to maxX
+        """
+        width, height = self.config.GRIDWIDTH, self.config.GRIDHEIGHT
+        h, w = self.shape[1:]
+        dy = self.above - np.arange(h)[:,None]
+        dx = np.arange(w)[None,:] - self.left
+        row = self.config.LAYERS_UNDERNEATH-1+dy
+
+        minX = -self.right-1
+        maxX = width + self.left
+        x = np.arange(minX, maxX+1)[:,None,None] + dx[None]
+        inside = (0 <= row) & (row < height) & (0 <= x) & (x < width)
+        gather = np.where(inside, row*width + x, height*width).reshape(len(x), h*w)
+        gather.flags.writeable = False
+        return minX, maxX, gather
+
+    def _buffer(self, name, shape, dtype):
+        """A buffer that is allocated once per name and shape"""
+        key = (name, shape)
+        if key not in self._buffers:
+            self._buffers[key] = np.empty(shape, dtype=dtype)
+        return self._buffers[key]
+
+    def encode(self, codes, direction, phase, x, out = None) -> np.ndarray:
+        """Observation of a single window codes[H, W] with its rows' direction[H] and phase[H]"""
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        self.encode_batch(codes[None], direction[None], phase[None], [x], out[None])
+        return out
+
+    def encode_batch(self, codes, direction, phase, xs, out = None) -> np.ndarray:
+        """Observations of N windows codes[N, H, W] with direction[N, H] and phase[N, H] of agents at columns xs[N]"""
+        n = len(codes)
+        if out is None:
+            out = np.empty((n, *self.shape), dtype=self.dtype)
+        if self.mode == 'mask':
+            self._encodeMask(codes, direction, phase, xs, out)
+        else:
+            self._encodeChannels(codes, direction, phase, xs, out)
+        return out
+
+    def _encodeMask(self, codes, direction, phase, xs, out):
+        floats = interpolateFloats(codes, direction, phase, self.config.TILE_REP, self._buffer('floats', codes.shape, np.float64), self._buffer)
+        if self.dtype == np.float64:
+            self.mask.apply_batch(floats, xs, out)
+            return
+
+        obs = self.mask.apply_batch(floats, xs, self._buffer('mask', out.shape, np.float64))
+        if self.dtype == np.uint8:
+            np.clip(obs, 0, 1, out=obs)
+            np.multiply(obs, self.scale, out=obs)
+            np.rint(obs, out=obs)
+        out[...] = obs
+
+    def _encodeChannels(self, codes, direction, phase, xs, out):
+        n = len(codes)
+        tiles = len(TILES)
+        height, width = self.config.GRIDHEIGHT, self.config.GRIDWIDTH
+
+        # Per cell sources followed by a row of outside cells
+        cellCodes = self._buffer('codes', (n, height+1, width), np.uint8)
+        cellDirection = self._buffer('direction', (n, height+1, width), np.int8)
+        cellPhase = self._buffer('phase', (n, height+1, width), np.float64)
+        cellCodes[:,:height] = codes
+        cellDirection[:,:height] = direction[:,:,None]
+        cellPhase[:,:height] = phase[:,:,None]
+        cellCodes[:,height], cellDirection[:,height], cellPhase[:,height] = TILE['1'], 0, 0
+
+        # Every index is in range, mode='clip' spares take from buffering the output
+        cells = self._gather.shape[1]
+        offsets = self._buffer('offsets', (n, 1), np.int64)
+        offsets[:,0] = np.arange(n) * cellCodes[0].size
+        columns = np.clip(xs, self.minX, self.maxX, out=self._buffer('columns', (n,), np.int64))
+        np.subtract(columns, self.minX, out=columns)
+        indices = np.take(self._gather, columns, axis=0, out=self._buffer('indices', (n, cells), self._gather.dtype), mode='clip')
+        np.add(indices, offsets, out=indices)
+
+        out = out.reshape(n, len(CHANNELS), -1)
+        onehot = self._buffer('onehot', (n, tiles, cells), bool)
+        np.equal(np.take(cellCodes, indices, out=self._buffer('cellCodes', (n, cells), np.uint8), mode='clip')[:,None,:], self._tiles, out=onehot)
+        np.multiply(onehot, self.scale, out=out[:,:tiles], casting='unsafe')
+
+        moving = np.take(cellDirection, indices, out=self._buffer('cellDirection', (n, cells), np.int8), mode='clip')
+        isMoving = self._buffer('moving', (n, cells), bool)
+        np.multiply(np.equal(moving, -1, out=isMoving), self.scale, out=out[:,tiles], casting='unsafe')
+        np.multiply(np.equal(moving, 1, out=isMoving), self.scale, out=out[:,tiles+1], casting='unsafe')
+
+        cells = np.take(cellPhase, indices, out=self._buffer('cellPhase', (n, cells), np.float64), mode='clip')
+        np.multiply(cells, self.scale, out=cells)
+        if self.dtype == np.uint8:
+            np.rint(cells, out=cells)
+        out[:,tiles+2] = cells
@@ -0,0 +1,226 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.layers import *
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+"""
+Optimal paths over the time-expanded grid of a world.
+
+Like sections.check, the cells that can be reached at every tick are kept as a bitmask
+per row and advanced with shifts and ANDs, but every tick follows the rules of
+CrossyRoadEnv.step exactly: a move is safe if its target cell is neither invalid nor
+terminal at the tick of the move, and standing still on logs that move drifts along.
+Only the rows that are generated can be searched, since the rows above the horizon
+depend on when the agent gets there. Later evictions of the world are not taken into
+account, a shortest path does not walk MAX_LAYERS_BEHIND rows back.
+
+The masks of a layer are computed once for every tick of its period (see Layer.period)
+and shared by every search in its world.
+"""
+
+ORACLE_STEPS = 200      # Ticks searched ahead by default
+
+class Occupancy:
+    """
+    Masks of a layer for every tick of its period: the cells that can be entered,
+    the invalid cells, the terminal cells, and the drift of an agent that stands still
+    """
+    __slots__ = ('layer', 'period', 'enter', 'invalid', 'terminal', 'drift')
+
+    def __init__(self, layer: Layer):
+        self.layer = layer
+        self.period = layer.period
+        codes = np.stack([layer.observation(t) for t in range(self.period)])
+        self.invalid = bitmasks(TILE_INVALID[codes])
+        self.terminal = bitmasks(TILE_TERMINAL[codes])
+        self.enter = bitmasks(~TILE_BLOCKED[codes])
+        self.drift = [0]*self.period
+        if type(layer) == Logs:
+            step = 1 if layer.direction == "r" else -1 if layer.direction == "l" else 0
+            self.drift = [step if layer.moved(t) else 0 for t in range(self.period)]
+
+def bitmasks(cells) -> list[int]:
+    """The rows of a boolean array [N, W] as integers, bit x is set if cell x is set"""
+    return [int.from_bytes(row.tobytes(), 'little') for row in np.packbits(cells, axis=1, bitorder='little')]
+
+def occupancy(world, row) -> Occupancy:
+    """The occupancy of a row of world, cached on the world as long as the row holds the same layer"""
+    cache = world._occupancy
+    layer = world[row]
+    entry = cache.get(row)
+    if entry is None or entry.layer is not layer:
+        entry = cache[row] = Occupancy(layer)
+        if len(cache) > 4*len(world.world):
+            for r in [r for r in cache if r < world.offset]:
+                del cache[r]
+    return entry
+
+class Search:
+    """
+    The cells that can be reached safely from (x, y) at the current tick of world, one list of
+    row masks per tick, for the rows bottom..top of the world
+    """
+    def __init__(self, world, x, y):
+        self.world = world
+        self.config: Config = world.config
+        self.t0 = world.t
+        self.bottom = world.offset
+        self.top = len(world)-1
+        self.rows = [occupancy(world, row) for row in range(self.bottom, self.top+1)]
+        self.full = (1 << self.config.GRIDWIDTH)-1
+        reach = [0]*len(self.rows)
+        reach[y-self.bottom] = 1 << x
+        self.reach = [reach]
+
+    def masks(self, t) -> tuple[list, list, list, list]:
+        """Masks of every row at tick t: enter, invalid, terminal and drift"""
+        enter, invalid, terminal, drift = [], [], [], []
+        for occupancy in self.rows:
+            i = t % occupancy.period
+            enter.append(occupancy.enter[i])
+            invalid.append(occupancy.invalid[i])
+            terminal.append(occupancy.terminal[i])
+            drift.append(occupancy.drift[i])
+        return enter, invalid, terminal, drift
+
+    def advance(self) -> bool:
+        """Advances the search by a tick, returns whether any cell is still reachable"""
+        t = self.t0 + len(self.reach)-1
+        maxAge = self.config.MAX_AGE
+        reach = self.reach[-1]
+        if maxAge != -1 and t > maxAge:
+            self.reach.append([0]*len(reach))
+            return False
+
+        enter, invalid, terminal, drift = self.masks(t)
+        full = self.full
+        new = []
+        for y in range(len(reach)):
+            r = ((reach[y] << 1) | (reach[y] >> 1)) & full
+            if y > 0:
+                r |= reach[y-1]
+            if y+1 < len(reach):
+                r |= reach[y+1]
+            r &= enter[y]
+
+            still = reach[y] & ~invalid[y]
+            if drift[y] == 1:
+                still = (still << 1) & full
+            elif drift[y] == -1:
+                still >>= 1
+            new.append(r | (still & ~terminal[y]))
+        # Row 0 of the world can never be entered
+        if self.bottom == 0:
+            new[0] = 0
+        self.reach.append(new)
+        return any(new)
+
+    def path(self, x, y, tick) -> list[int]:
+        """Actions that reach cell (x, y) tick ticks after the start of the search"""
+        actions = []
+        y -= self.bottom
+        for k in range(tick-1, -1, -1):
+            reach = self.reach[k]
+            enter, invalid, terminal, drift = self.masks(self.t0+k)
+            bit = 1 << x
+            for action, (dx, dy) in ACTION_TUPLES.items():
+                if action == 4:
+                    px, py = x - drift[y], y
+                    found = 0 <= px < self.config.GRIDWIDTH and reach[y] >> px & 1 and not invalid[y] >> px & 1 and not terminal[y] & bit
+                else:
+                    px, py = x-dx, y-dy
+                    found = 0 <= px < self.config.GRIDWIDTH and 0 <= py < len(reach) and reach[py] >> px & 1 and enter[y] & bit
+                if found:
+                    actions.append(action)
+                    x, y = px, py
+                    break
+        return actions[::-1]
+
+def lowestBit(mask) -> int:
+    return (mask & -mask).bit_length()-1
+
+def shortestPath(world, x, y, row = None, maxSteps = ORACLE_STEPS) -> list[int]:
+    """
+    Shortest safe sequence of actions from cell (x, y) at the current tick of world to row,
+    or None if there is none within maxSteps ticks. If row is None, the shortest path to the
+    highest row that can be reached within maxSteps ticks, at most the horizon of the world.
+    """
+    search = Search(world, x, y)
+    if row is not None and not search.bottom <= row <= search.top:
+        raise ValueError(f"Row {row} is not in the generated rows {search.bottom}..{search.top} of the world")
+
+    best = (y, 0, x)
+    for tick in range(maxSteps+1):
+        reach = search.reach[-1]
+        if row is not None and reach[row-search.bottom]:
+            return search.path(lowestBit(reach[row-search.bottom]), row, tick)
+        high = max((i for i in range(len(reach)) if reach[i]), default=-1) + search.bottom
+        if high > best[0]:
+            best = (high, tick, lowestBit(reach[high-search.bottom]))
+        if high == search.top or tick == maxSteps or not search.advance():
+            break
+
+    if row is not None:
+        return None
+    high, tick, x = best
+    return search.path(x, high, tick)
+
+def survivalPath(world, x, y, maxSteps = ORACLE_STEPS) -> list[int]:
+    """
+    Longest safe sequence of actions from cell (x, y) at the current tick of world, of at most
+    maxSteps actions. Its length is the number of ticks before the agent dies at best,
+    within the generated rows of the world.
+    """
+    search = Search(world, x, y)
+    for _ in range(maxSteps):
+        if not search.advance():
+            break
+    tick = max(k for k, reach in enumerate(search.reach) if any(reach))
+    reach = search.reach[tick]
+    high = max(i for i in range(len(reach)) if reach[i])
+    return search.path(lowestBit(reach[high]), high+search.bottom, tick)
+
+class ExpertPolicy:
+    """
+    Policy that follows the shortest path to the horizon of the world, replanned whenever it is
+    reached, or the longest survival if the horizon cannot be reached. Called as policy(obs, env).
+    """
+    def __init__(self):
+        self.plan = []
+        self.env = None
+
+    def __call__(self, obs, env) -> int:
+        # A new environment or episode starts a new plan
+        if env is not self.env or len(env.agent.trace_a) == 0:
+            self.env, self.plan = env, []
+        if not self.plan:
+            world, agent = env.world, env.agent
+            self.plan = (world.shortestPath(agent) or survivalPath(world, agent.x, agent.y)[:1] or [0])[::-1]
+        return self.plan.pop()
+
+def _playExpert(seed, steps, config: Config):
+    """Worker of expertEpisodes: plays an episode with an ExpertPolicy, returns it as a replay.Episode"""
+    from crossyroadenv.env import CrossyRoadEnv
+    env = CrossyRoadEnv(config=config)
+    obs, _ = env.reset(seed=seed)
+    policy = ExpertPolicy()
+    for _ in range(steps):
+        obs, _, terminated, truncated, _ = env.step(policy(obs, env))
+        if terminated or truncated:
+            break
+    episode = env.episode()
+    env.close()
+    return episode
+
+def expertEpisodes(seeds, steps = 1000, workers = None, config: Config = DEFAULT_CONFIG, chunk = 8) -> list:
+    """
+    Plays an episode of at most steps steps in a world of every seed by following the shortest
+    path to the horizon, replanned whenever it is reached, with a pool of workers processes
+    (in this process if workers is 0). Returns the episodes as replay.Episodes, see replay.writeEpisodes.
+    """
+    seeds = list(seeds)
+    if workers == 0:
+        return [_playExpert(seed, steps, config) for seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_playExpert, seeds, [steps]*len(seeds), [config]*len(seeds), chunksize=chunk))
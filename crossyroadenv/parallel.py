@@ -0,0 +1,224 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.observation import Observer
+from crossyroadenv.vector import CrossyRoadVectorEnv
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import traceback
+import numpy as np
+import os
+
+"""
+Multi-process version of CrossyRoadVectorEnv. Every worker process hosts a
+CrossyRoadVectorEnv of a contiguous slice of the worlds, and all workers share
+a single block of shared memory with the actions, observations, rewards and
+flags of every world. The observations are written by the workers straight
+into the block, and only a command of a few bytes passes through the pipe of
+every worker per step, so no arrays are pickled.
+
+Workers are pinned to a core each where the platform supports it, and import
+the simulation only, never pygame.
+
+Every world draws its seeds from its own child of a seed sequence: given a seed,
+reset spawns a child per world, and every later episode of a world is seeded
+from a new child of the stream of that world. The transitions are thus the same
+for any number of workers.
+"""
+
+# Arrays of the shared block besides the observations: name, dtype
+SHARED_ARRAYS = [
+    ('actions', np.int64),
+    ('rewards', np.float64),
+    ('terminated', np.bool_),
+    ('truncated', np.bool_),
+    ('newHighscore', np.bool_),
+    ('highscore', np.int64),
+]
+
+def seedOf(seedSequence: np.random.SeedSequence) -> int:
+    """A 128 bit integer seed of a seed sequence, which replay.Episode can record"""
+    return int.from_bytes(seedSequence.generate_state(4, np.uint32).tobytes(), 'little')
+
+def _layout(numEnvs, shape, dtype) -> tuple[dict, int]:
+    """Offset, shape and dtype of every array of the shared block, and the size of the block"""
+    layout, size = {}, 0
+    for name, arrayShape, arrayDtype in [('obs', (numEnvs, *shape), dtype)] + [(name, (numEnvs,), dt) for name, dt in SHARED_ARRAYS]:
+        arrayDtype = np.dtype(arrayDtype)
+        size = -(-size // 64) * 64      # Every array starts on its own cache line
+        layout[name] = (size, arrayShape, arrayDtype)
+        size += int(np.prod(arrayShape)) * arrayDtype.itemsize
+    return layout, max(size, 1)
+
+def _views(buffer, layout) -> dict:
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset) for name, (offset, shape, dtype) in layout.items()}
+
+class _WorkerEnv(CrossyRoadVectorEnv):
+    """CrossyRoadVectorEnv whose worlds draw the seed of every episode from their own seed sequence"""
+    def __init__(self, num_envs, **kwargs):
+        super().__init__(num_envs, **kwargs)
+        self.streams = [np.random.SeedSequence() for _ in range(num_envs)]
+
+    def _resetWorld(self, i, seed = None) -> None:
+        if seed is None:
+            seed = seedOf(self.streams[i].spawn(1)[0])
+        super()._resetWorld(i, seed)
+
+def _work(pipe, name, layout, start, stop, core, kwargs) -> None:
+    """Worker process of worlds start..stop, steered by commands on pipe"""
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+    block = shared_memory.SharedMemory(name=name)
+    shared = {key: array[start:stop] for key, array in _views(block.buf, layout).items()}
+    env = None
+    try:
+        env = _WorkerEnv(stop-start, copy=False, **kwargs)
+        env._obs = shared['obs']
+        while True:
+            command, data = pipe.recv()
+            try:
+                if command == 'step':
+                    _, rewards, terminated, truncated, info = env.step(shared['actions'])
+                    shared['rewards'][:] = rewards
+                    shared['terminated'][:] = terminated
+                    shared['truncated'][:] = truncated
+                    shared['newHighscore'][:] = info['newHighscore']
+                elif command == 'reset':
+                    streams = data
+                    if streams is not None:
+                        env.streams = streams
+                    env.reset(seed=[seedOf(stream.spawn(1)[0]) for stream in env.streams])
+                    shared['rewards'][:] = 0
+                    shared['terminated'][:] = False
+                    shared['truncated'][:] = False
+                    shared['newHighscore'][:] = False
+                elif command == 'close':
+                    env.close()
+                    pipe.send((True, None))
+                    break
+                shared['highscore'][:] = env.highscore
+                pipe.send((True, None))
+            except Exception:
+                pipe.send((False, traceback.format_exc()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # The views of the block have to be gone before it is closed
+        env = shared = None
+        block.close()
+
+class SharedVectorEnv(VectorEnv):
+    """
+    CrossyRoadVectorEnv stepped by workers processes that share their arrays, see parallel.py.
+    num_envs worlds are split into contiguous slices, one per worker (os.cpu_count() by default).
+    cores are the cores the workers are pinned to in turn, all usable cores by default, or
+    none if pin is False. The other arguments are those of CrossyRoadVectorEnv.
+
+    The info holds newHighscore and highscore, but not the onLayer of the scalar environment,
+    since the layers stay in the workers. If copy is False, the observations returned are a
+    view of the shared block, which is overwritten by the next step or reset.
+    """
+
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(self, num_envs = 1, workers = None, cores = None, pin = True, context = None,
+                 render_mode = None, config: Config = None, obs_mode = None, obs_dtype = None, obs_window = None, copy = True, **kwargs):
+        if render_mode is not None:
+            raise ValueError("SharedVectorEnv does not support rendering")
+
+        self.config: Config = DEFAULT_CONFIG if config is None else config
+        if kwargs:
+            self.config = self.config.replace(**kwargs)
+
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+        self.copy = copy
+        observer = Observer(obs_mode, obs_dtype, obs_window, config=self.config)
+
+        self.single_action_space = spaces.Discrete(5)
+        self.single_observation_space = observer.space
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        # Shared block
+        layout, size = _layout(num_envs, observer.shape, observer.dtype)
+        self._block = shared_memory.SharedMemory(create=True, size=size)
+        self._shared = _views(self._block.buf, layout)
+
+        # Workers, each of a contiguous slice of the worlds
+        workers = min(os.cpu_count() if workers is None else workers, num_envs)
+        if cores is None and pin and hasattr(os, 'sched_getaffinity'):
+            cores = sorted(os.sched_getaffinity(0))
+        if not pin or not hasattr(os, 'sched_setaffinity'):
+            cores = None
+        self.slices = [(w*num_envs//workers, (w+1)*num_envs//workers) for w in range(workers)]
+        kwargs = dict(config=self.config, obs_mode=obs_mode, obs_dtype=obs_dtype, obs_window=obs_window)
+        context = mp.get_context(context)
+        self._pipes, self._processes = [], []
+        for w, (start, stop) in enumerate(self.slices):
+            pipe, workerPipe = context.Pipe()
+            core = None if cores is None else cores[w % len(cores)]
+            process = context.Process(target=_work, args=(workerPipe, self._block.name, layout, start, stop, core, kwargs), daemon=True)
+            process.start()
+            workerPipe.close()
+            self._pipes.append(pipe)
+            self._processes.append(process)
+
+    def _command(self, command, data = None) -> None:
+        """Sends command to every worker (data is a list of one item per worker) and waits until all are done"""
+        for w, pipe in enumerate(self._pipes):
+            pipe.send((command, None if data is None else data[w]))
+        errors = []
+        for w, pipe in enumerate(self._pipes):
+            ok, error = pipe.recv()
+            if not ok:
+                errors.append(f"Worker {w}:\n{error}")
+        if errors:
+            raise RuntimeError("\n".join(errors))
+
+    def _result(self) -> tuple:
+        shared = self._shared
+        obs = shared['obs'].copy() if self.copy else shared['obs']
+        info = {
+            "newHighscore": shared['newHighscore'].copy(), "_newHighscore": np.ones(self.num_envs, dtype=bool),
+            "highscore": shared['highscore'].copy(), "_highscore": np.ones(self.num_envs, dtype=bool),
+        }
+        return obs, info
+
+    def reset(self, seed = None, options = None):
+        """
+        Resets every world. An int seed (or None for fresh entropy) is the root of the seed sequences of
+        the worlds, a list of seeds gives the root of the seed sequence of every world.
+        """
+        if isinstance(seed, list):
+            if len(seed) != self.num_envs:
+                raise ValueError(f"Expected {self.num_envs} seeds, got {len(seed)}")
+            streams = [np.random.SeedSequence(s) for s in seed]
+        else:
+            streams = np.random.SeedSequence(seed).spawn(self.num_envs)
+        self._command('reset', [streams[start:stop] for start, stop in self.slices])
+        return self._result()
+
+    def step(self, actions):
+        self._shared['actions'][:] = actions
+        self._command('step')
+        obs, info = self._result()
+        shared = self._shared
+        return obs, shared['rewards'].copy(), shared['terminated'].copy(), shared['truncated'].copy(), info
+
+    def close_extras(self, **kwargs):
+        try:
+            self._command('close')
+        except (OSError, EOFError, RuntimeError):
+            pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for pipe in self._pipes:
+            pipe.close()
+        del self._shared
+        self._block.close()
+        self._block.unlink()
@@ -0,0 +1,264 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.layers import *
+from crossyroadenv.world import World
+from crossyroadenv.agent import Agent
+from functools import lru_cache
+from PIL import Image
+import numpy as np
+
+"""
+Headless rasterizer of the rgb_array render mode. Frames are composed with numpy
+into a preallocated uint8[H, W, 3] array, from the sprites of the assets and the
+visible window of a world. It does not use pygame, so no display is needed.
+Sprites are pasted with a binary alpha: pixels with an alpha of at least 128 are drawn.
+"""
+
+# Asset whose mean color is the color of every tile in a thumbnail, None for black
+TILE_ASSETS = {'0': "grass", 'L': "log2", 'P': "lilypad", 't': "redlight", 'B': "bush",
+               'C': "car1", 'W': "water", '1': None, 'T': "train2"}
+
+# Asset of the free cells ('0') of every layer in a thumbnail
+GROUND_ASSETS = {Road: "road", Rail: "gravel"}
+
+@lru_cache(maxsize=None)
+def sprite(img, w = 1, h = 1, tileWidth = TILEWIDTH, tileHeight = TILEHEIGHT, flip = False, rotate = False, colorkey = None) -> np.ndarray:
+    """
+    The asset img as uint8[h*tileHeight, w*tileWidth, 4] RGBA, optionally flipped
+    horizontally, rotated by 180 degrees and with the pixels of colorkey made transparent
+    """
+    image = Image.open(ASSETS / f"{img}.png").convert("RGBA")
+    rgba = np.array(image.resize((int(w*tileWidth), int(h*tileHeight)), Image.NEAREST))
+    if flip:
+        rgba = rgba[:,::-1]
+    if rotate:
+        rgba = rgba[::-1,::-1]
+    rgba = np.ascontiguousarray(rgba)
+    if colorkey is not None:
+        rgba[(rgba[:,:,:3] == colorkey).all(axis=2), 3] = 0
+    rgba.flags.writeable = False
+    return rgba
+
+@lru_cache(maxsize=None)
+def meanColor(img) -> np.ndarray:
+    """Alpha-weighted mean color of the asset img"""
+    rgba = np.array(Image.open(ASSETS / f"{img}.png").convert("RGBA"), dtype=np.float64)
+    alpha = rgba[:,:,3:] / 255
+    return np.rint((rgba[:,:,:3] * alpha).sum(axis=(0,1)) / max(alpha.sum(), 1)).astype(np.uint8)
+
+@lru_cache(maxsize=None)
+def tileColors() -> np.ndarray:
+    """uint8[len(TILES), 3] mean color of every tile, see TILE_ASSETS"""
+    colors = np.zeros((len(TILES), 3), dtype=np.uint8)
+    for tile, img in TILE_ASSETS.items():
+        if img is not None:
+            colors[TILE[tile]] = meanColor(img)
+    colors.flags.writeable = False
+    return colors
+
+@lru_cache(maxsize=None)
+def agentColor() -> np.ndarray:
+    """Mean color of the visible pixels of the agent sprite"""
+    rgba = np.array(Image.open(ASSETS / "chickdown.png").convert("RGBA"), dtype=np.float64)
+    visible = (rgba[:,:,3] >= 128) & ~(rgba[:,:,:3] == 255).all(axis=2)
+    return np.rint(rgba[visible,:3].mean(axis=0)).astype(np.uint8)
+
+def paste(frame, rgba, x, y) -> None:
+    """
+    Draws the sprite rgba onto the RGB or RGBA frame with its top left corner at (x, y),
+    clipped to the frame
+    """
+    h, w = rgba.shape[:2]
+    x, y = int(x), int(y)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x+w, frame.shape[1]), min(y+h, frame.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    src = rgba[y0-y:y1-y, x0-x:x1-x]
+    np.copyto(frame[y0:y1, x0:x1], src[:,:,:frame.shape[2]], where=src[:,:,3:] >= 128)
+
+def opaque(rgba) -> tuple[np.ndarray, np.ndarray]:
+    """The RGB pixels of the sprite rgba and the mask of the pixels that are drawn, for blit"""
+    rgb = np.ascontiguousarray(rgba[:,:,:3])
+    mask = np.ascontiguousarray(np.repeat(rgba[:,:,3:] >= 128, 3, axis=2))
+    rgb.flags.writeable = mask.flags.writeable = False
+    return rgb, mask
+
+@lru_cache(maxsize=None)
+def opaqueSprite(*args, **kwargs) -> tuple[np.ndarray, np.ndarray]:
+    """opaque of sprite(*args, **kwargs)"""
+    return opaque(sprite(*args, **kwargs))
+
+def blit(frame, sprite, x, y) -> None:
+    """Like paste for an RGB frame, with a sprite made by opaque, which skips converting the alpha"""
+    rgb, mask = sprite
+    h, w = rgb.shape[:2]
+    x, y = int(x), int(y)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x+w, frame.shape[1]), min(y+h, frame.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    np.copyto(frame[y0:y1, x0:x1], rgb[y0-y:y1-y, x0-x:x1-x], where=mask[y0-y:y1-y, x0-x:x1-x])
+
+def tiledRow(img, width, config: Config) -> np.ndarray:
+    """The asset img repeated over width tiles, as RGB"""
+    return np.tile(sprite(img, 1, 1, config.TILEWIDTH, config.TILEHEIGHT)[:,:,:3], (1, width, 1))
+
+def buildRow(layer: Layer, config: Config) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The parts of the row of layer that do not change over time, like render.buildLayer:
+    its RGB background, and the sprites that move over it as made by opaque (a double-width
+    strip of the logs or cars for Logs and Road, the train for Rail, None for the static layers)
+    """
+    tw, th = config.TILEWIDTH, config.TILEHEIGHT
+    sprites = None
+
+    if type(layer) in (Empty, Bush):
+        background = tiledRow("grass", config.GRIDWIDTH, config)
+        if type(layer) == Bush:
+            bush = sprite("bush", 1, 1, tw, th)
+            for ind in np.flatnonzero(layer.representation[:config.GRIDWIDTH] == TILE['B']):
+                paste(background, bush, ind*tw, 0)
+
+    elif type(layer) == Lilypad:
+        background = tiledRow("water", config.GRIDWIDTH, config)
+        lilypad = sprite("lilypad", 1, 1, tw, th)
+        for ind in np.flatnonzero(layer.representation[:config.GRIDWIDTH] == TILE['P']):
+            paste(background, lilypad, ind*tw, 0)
+
+    elif type(layer) == Logs:
+        background = tiledRow("water", config.GRIDWIDTH, config)
+        sprites = np.zeros((th, 2*config.GRIDWIDTH*tw, 4), dtype=np.uint8)
+        for pos, length in layer.logConfiguration:
+            paste(sprites, sprite(f"log{length}", length, 1, tw, th), pos*tw, 0)
+
+    elif type(layer) == Road:
+        background = tiledRow("road", config.GRIDWIDTH, config)
+        sprites = np.zeros((th, 2*config.GRIDWIDTH*tw, 4), dtype=np.uint8)
+        names = {2: "car", 3: "truck", 4: "trailer"}
+        for pos, length, figure in layer.carConfiguration:
+            if length in names:
+                car = sprite(f"{names[length]}{figure}", length, 1, tw, th, rotate=layer.direction == "l")
+                paste(sprites, car, pos*tw, 0)
+                paste(sprites, car, (pos+config.GRIDWIDTH)*tw, 0)
+
+    elif type(layer) == Rail:
+        background = tiledRow("gravel", config.GRIDWIDTH, config)
+        rail = sprite("rail (2)", 1, 1, tw, th)
+        for i in range(config.GRIDWIDTH):
+            paste(background, rail, i*tw, 0)
+        sprites = sprite("train2", 7, 1, tw, th, flip=layer.direction == "l")
+
+    else:
+        background = np.zeros((th, config.GRIDWIDTH*tw, 3), dtype=np.uint8)
+
+    return background, None if sprites is None else opaque(sprites)
+
+class Rasterizer:
+    """
+    Renders worlds into uint8[H, W, 3] frames without a display. The full frame has the
+    size of the human render mode and draws the same sprites, without the score and overlay.
+    With thumbnail = k, every cell of the visible window is k x k pixels of the mean color
+    of its tile (see tileColors), free cells of roads and rails have the color of the road
+    and gravel, and the agent is the mean color of its sprite.
+    Frames are written into the same buffer, which is overwritten by the next render.
+    """
+
+    def __init__(self, config: Config = DEFAULT_CONFIG, thumbnail: int = None):
+        self.config = config
+        self.thumbnail = thumbnail
+        if thumbnail is None:
+            self.shape = (config.GRIDHEIGHT*config.TILEHEIGHT, config.GRIDWIDTH*config.TILEWIDTH, 3)
+        else:
+            self.shape = (config.GRIDHEIGHT*thumbnail, config.GRIDWIDTH*thumbnail, 3)
+            self._cells = np.empty((config.GRIDHEIGHT, config.GRIDWIDTH, 3), dtype=np.uint8)
+        self.frame = np.zeros(self.shape, dtype=np.uint8)
+
+        # Rows of the visible layers, by id of the layer
+        self._rows = {}
+
+    def render(self, world: World, agent: Agent) -> np.ndarray:
+        """Renders world with agent into self.frame, which is returned"""
+        if self.thumbnail is not None:
+            return self._renderThumbnail(world, agent)
+
+        config = self.config
+        tw, th = config.TILEWIDTH, config.TILEHEIGHT
+        layers, codes = world.getWindow(agent)
+        frame = self.frame
+
+        rows = {}
+        for ind, layer in enumerate(layers):
+            entry = self._rows.get(id(layer))
+            if entry is None or entry[0] is not layer:
+                entry = (layer, *buildRow(layer, config))
+            rows[id(layer)] = entry
+            _, background, sprites = entry
+
+            y = (config.GRIDHEIGHT-1-ind)*th
+            row = frame[y:y+th]
+            row[...] = background
+            if sprites is None:
+                continue
+
+            if type(layer) in (Logs, Road):
+                if layer.direction == "r":
+                    blit(row, sprites, (((world.t*layer.speed)%layer.maxtime)-config.GRIDWIDTH) *tw, 0)
+                elif layer.direction == "l":
+                    blit(row, sprites, (-((world.t*layer.speed)%layer.maxtime)) *tw, 0)
+
+            elif type(layer) == Rail:
+                rep = codes[ind]
+                if (rep == TILE['t']).any():
+                    blit(row, opaqueSprite("redlight", 0.25, 1, tw, th), tw*6, 0)
+                    train = np.flatnonzero(rep == TILE['T'])
+                    if len(train):
+                        if train[0] < 7:
+                            blit(row, sprites, (train[0]-(7-len(train)))*tw, 0)
+                        else:
+                            blit(row, sprites, train[0]*tw, 0)
+                else:
+                    blit(row, opaqueSprite("greenlight", 0.25, 1, tw, th), tw*6, 0)
+        self._rows = rows
+
+        blit(frame, self._agentSprite(agent), self._agentX(world, agent)*tw, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*th)
+        return frame
+
+    def _agentSprite(self, agent: Agent) -> tuple[np.ndarray, np.ndarray]:
+        img, flip = AGENT_SPRITES[agent.lastAction]
+        return opaqueSprite(img, 1, 1, self.config.TILEWIDTH, self.config.TILEHEIGHT, flip=flip, colorkey=(255,255,255))
+
+    def _agentX(self, world: World, agent: Agent) -> float:
+        """Column of the agent in the frame, which follows the log it stands on like render.renderWorld"""
+        layer = world[agent.y]
+        if type(layer) != Logs:
+            return agent.x
+        offset = layer.phase(world.t)
+        if layer.direction == "r":
+            if round(offset) == 1 or layer.moved(world.t):
+                return agent.x - (1-offset)
+            return agent.x + offset
+        elif layer.direction == "l":
+            if round(offset) == 0 and not layer.moved(world.t):
+                return agent.x - offset
+            return agent.x + (1-offset)
+        return agent.x
+
+    def _renderThumbnail(self, world: World, agent: Agent) -> np.ndarray:
+        config = self.config
+        layers, codes = world.getWindow(agent)
+        np.take(tileColors(), codes[::-1], axis=0, out=self._cells)
+
+        # Free cells of roads and rails have the color of the road and gravel
+        for ind, layer in enumerate(layers):
+            if type(layer) in GROUND_ASSETS:
+                row = config.GRIDHEIGHT-1-ind
+                self._cells[row, codes[ind] == TILE['0']] = meanColor(GROUND_ASSETS[type(layer)])
+
+        row, col = config.GRIDHEIGHT-config.LAYERS_UNDERNEATH, agent.x
+        if 0 <= col < config.GRIDWIDTH:
+            self._cells[row, col] = agentColor()
+
+        k = self.thumbnail
+        self.frame.reshape(config.GRIDHEIGHT, k, config.GRIDWIDTH, k, 3)[...] = self._cells[:,None,:,None,:]
+        return self.frame
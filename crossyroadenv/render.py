@@ -1,156 +1,253 @@
 from crossyroadenv.world import World
 from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
 from crossyroadenv.layers import *
 from crossyroadenv.agent import Agent
-import os
 import pygame
-from PIL import Image
-from pathlib import Path
+import weakref
 pygame.init()
 
-def getImage(img, w = 1, h = 1) -> pygame.Surface:
+class SpriteAtlas:
     """
-    Returns the image img with a certain width and height according to the TILEWIDTH and TILEHEIGHT
+    Process-wide cache of the sprites of the renderer. Every asset is loaded from
+    disk once, and every size and variant of it (flipped, rotated, colorkeyed) is
+    made once, such that drawing a frame does not touch the disk.
+    hits and misses count the lookups that were and were not cached.
     """
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    surface = pygame.image.load(dir_path+f"\\assets\\{img}.png")
-    surface = pygame.transform.scale(surface, (w*TILEWIDTH,h*TILEHEIGHT))
-    return surface
 
-def drawLayer(layer: Layer, world: World) -> pygame.Surface:
-    
-    surface = pygame.Surface((TILEWIDTH*GRIDWIDTH, TILEHEIGHT))
+    def __init__(self):
+        self._images = {}
+        self._sprites = {}
+        self.hits = 0
+        self.misses = 0
+
+    def image(self, img) -> pygame.Surface:
+        """The unscaled asset img"""
+        if img not in self._images:
+            self._images[img] = pygame.image.load(ASSETS / f"{img}.png")
+        return self._images[img]
+
+    def get(self, img, w = 1, h = 1, config: Config = DEFAULT_CONFIG, flip = False, rotate = 0, colorkey = None) -> pygame.Surface:
+        """
+        The asset img scaled to w x h tiles of config, optionally flipped horizontally,
+        rotated by rotate degrees and converted with a colorkey.
+        The surface is shared, it must not be drawn on.
+        """
+        key = (img, w, h, config.TILEWIDTH, config.TILEHEIGHT, flip, rotate, colorkey)
+        if key in self._sprites:
+            self.hits += 1
+            return self._sprites[key]
+        self.misses += 1
+
+        surface = pygame.transform.scale(self.image(img), (w*config.TILEWIDTH,h*config.TILEHEIGHT))
+        if flip:
+            surface = pygame.transform.flip(surface, True, False)
+        if rotate:
+            surface = pygame.transform.rotate(surface, rotate)
+        if colorkey is not None:
+            surface = surface.convert_alpha()
+            surface.set_colorkey(colorkey)
+        self._sprites[key] = surface
+        return surface
+
+    def preload(self, config: Config = DEFAULT_CONFIG) -> None:
+        """Makes every sprite the renderer can draw at the size of config, needs a display mode for the agent sprites"""
+        for img in ("grass", "bush", "water", "road", "lilypad", "gravel", "rail (2)"):
+            self.get(img, config=config)
+        for length in range(1, 6):
+            self.get(f"log{length}", w=length, config=config)
+        for name, length, figures in (("car", 2, 5), ("truck", 3, 2), ("trailer", 4, 1)):
+            for figure in range(1, figures+1):
+                self.get(f"{name}{figure}", w=length, config=config)
+                self.get(f"{name}{figure}", w=length, config=config, rotate=180)
+        self.get("train2", w=7, config=config)
+        self.get("train2", w=7, config=config, flip=True)
+        self.get("greenlight", w=0.25, config=config)
+        self.get("redlight", w=0.25, config=config)
+        self.get("skulls", w=4, h=2, config=config)
+        for img, flip in AGENT_SPRITES.values():
+            self.get(img, config=config, flip=flip, colorkey=(255,255,255))
+
+    def clear(self) -> None:
+        self._images.clear()
+        self._sprites.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._sprites)
+
+ATLAS = SpriteAtlas()
+
+def getImage(img, w = 1, h = 1, config: Config = DEFAULT_CONFIG, flip = False, rotate = 0) -> pygame.Surface:
+    """
+    Returns the image img with a certain width and height according to the TILEWIDTH and TILEHEIGHT of config,
+    from the sprite atlas
+    """
+    return ATLAS.get(img, w, h, config, flip, rotate)
+
+# Cached surfaces of the visible layers of every world, see layerSurfaces
+LAYER_SURFACES = weakref.WeakKeyDictionary()
+
+def buildLayer(layer: Layer, config: Config) -> tuple[pygame.Surface, pygame.Surface]:
+    """
+    Builds the surfaces of layer that do not change over time: its background, and the sprites
+    that move over it. These are a double-width strip of the logs or cars for Logs and Road,
+    the train for Rail, and None for the static layers.
+    """
+    background = pygame.Surface((config.TILEWIDTH*config.GRIDWIDTH, config.TILEHEIGHT))
+    sprites = None
     
     if type(layer) == Empty:
-        grass = getImage("grass")
-        for i in range(GRIDWIDTH):
-            surface.blit(grass, (i*TILEWIDTH, 0))
+        grass = getImage("grass", config=config)
+        for i in range(config.GRIDWIDTH):
+            background.blit(grass, (i*config.TILEWIDTH, 0))
             
     
     elif type(layer) == Bush:
-        grass = getImage("grass")
-        for i in range(GRIDWIDTH):
-            surface.blit(grass, (i*TILEWIDTH, 0))
+        grass = getImage("grass", config=config)
+        for i in range(config.GRIDWIDTH):
+            background.blit(grass, (i*config.TILEWIDTH, 0))
 
-        bush = getImage("bush")
+        bush = getImage("bush", config=config)
         for ind, item in enumerate(layer.representation):
-            if item == 'B':
-                surface.blit(bush, (ind*TILEWIDTH, 0))  
+            if item == TILE['B']:
+                background.blit(bush, (ind*config.TILEWIDTH, 0))  
         
     elif type(layer) == Logs:
-        water = getImage("water")
-        for i in range(GRIDWIDTH):
-            surface.blit(water, (i*TILEWIDTH, 0))
+        water = getImage("water", config=config)
+        for i in range(config.GRIDWIDTH):
+            background.blit(water, (i*config.TILEWIDTH, 0))
 
-        logsurface = pygame.Surface((TILEWIDTH*GRIDWIDTH*2, TILEHEIGHT))
-        logsurface = logsurface.convert_alpha()
-        logsurface.fill((0, 0, 0, 0))
+        sprites = pygame.Surface((config.TILEWIDTH*config.GRIDWIDTH*2, config.TILEHEIGHT))
+        sprites = sprites.convert_alpha()
+        sprites.fill((0, 0, 0, 0))
         for pos, len in layer.logConfiguration:
-            logsurface.blit(getImage(f"log{len}",w=len,h=1),(pos*TILEWIDTH,0))
-            
-        if layer.direction == "r":
-            surface.blit(logsurface, ((((world.t*layer.speed)%layer.maxtime)-GRIDWIDTH) *TILEWIDTH, 0))
-        elif layer.direction == "l":
-            surface.blit(logsurface, ((-((world.t*layer.speed)%layer.maxtime)) *TILEWIDTH, 0))
-        
+            sprites.blit(getImage(f"log{len}",w=len,h=1, config=config),(pos*config.TILEWIDTH,0))
     
     elif type(layer) == Road:
 
-        road = getImage("road")
-        for i in range(GRIDWIDTH):
-            surface.blit(road, (i*TILEWIDTH, 0))
+        road = getImage("road", config=config)
+        for i in range(config.GRIDWIDTH):
+            background.blit(road, (i*config.TILEWIDTH, 0))
 
 
-        carSurface = pygame.Surface((TILEWIDTH*GRIDWIDTH*2, TILEHEIGHT))
-        carSurface = carSurface.convert_alpha()
-        carSurface.fill((0, 0, 0, 0))
+        sprites = pygame.Surface((config.TILEWIDTH*config.GRIDWIDTH*2, config.TILEHEIGHT))
+        sprites = sprites.convert_alpha()
+        sprites.fill((0, 0, 0, 0))
     
         for pos, len, randomcar in layer.carConfiguration:
             
             if len == 2:
-                carimg = getImage(f"car{randomcar}",w=len,h=1)
-                if layer.direction == "l":
-                    carimg = pygame.transform.rotate(carimg, 180)
-                carSurface.blit(carimg,(pos*TILEWIDTH,0))
-                carSurface.blit(carimg,((pos+GRIDWIDTH)*TILEWIDTH,0))
+                carimg = getImage(f"car{randomcar}",w=len,h=1, config=config, rotate=180 if layer.direction == "l" else 0)
+                sprites.blit(carimg,(pos*config.TILEWIDTH,0))
+                sprites.blit(carimg,((pos+config.GRIDWIDTH)*config.TILEWIDTH,0))
             elif len == 3:
-                carimg = getImage(f"truck{randomcar}",w=len,h=1)
-                if layer.direction == "l":
-                    carimg = pygame.transform.rotate(carimg, 180)
-                carSurface.blit(carimg,(pos*TILEWIDTH,0))
-                carSurface.blit(carimg,((pos+GRIDWIDTH)*TILEWIDTH,0))
+                carimg = getImage(f"truck{randomcar}",w=len,h=1, config=config, rotate=180 if layer.direction == "l" else 0)
+                sprites.blit(carimg,(pos*config.TILEWIDTH,0))
+                sprites.blit(carimg,((pos+config.GRIDWIDTH)*config.TILEWIDTH,0))
 
             elif len == 4:
-                carimg = getImage(f"trailer{randomcar}",w=len,h=1)
-                if layer.direction == "l":
-                    carimg = pygame.transform.rotate(carimg, 180)
-                carSurface.blit(carimg,(pos*TILEWIDTH,0))
-                carSurface.blit(carimg,((pos+GRIDWIDTH)*TILEWIDTH,0))
-            else:
-                for i in range(pos,pos+len):
-                    layer.representation[i] = '0'
-                    layer.representation[i+GRIDWIDTH] = '0'
-        if layer.direction == "r":
-            surface.blit(carSurface, ((((world.t*layer.speed)%layer.maxtime)-GRIDWIDTH) *TILEWIDTH, 0))
-        
-        elif layer.direction == "l":
-            surface.blit(carSurface, ((-((world.t*layer.speed)%layer.maxtime)) *TILEWIDTH, 0))
-            
+                carimg = getImage(f"trailer{randomcar}",w=len,h=1, config=config, rotate=180 if layer.direction == "l" else 0)
+                sprites.blit(carimg,(pos*config.TILEWIDTH,0))
+                sprites.blit(carimg,((pos+config.GRIDWIDTH)*config.TILEWIDTH,0))
+            # There is no sprite of cars of other lengths. They are not drawn, and the layer is
+            # left as it is, since layers are shared by worlds, snapshots and section banks
             
     elif type(layer) == Lilypad:
-        water = getImage("water")
-        for i in range(GRIDWIDTH):
-            surface.blit(water, (i*TILEWIDTH, 0))
+        water = getImage("water", config=config)
+        for i in range(config.GRIDWIDTH):
+            background.blit(water, (i*config.TILEWIDTH, 0))
 
-        lilypad = getImage("lilypad")
+        lilypad = getImage("lilypad", config=config)
         for ind, item in enumerate(layer.representation):
-            if item == 'P':
-                surface.blit(lilypad, (ind*TILEWIDTH, 0))
+            if item == TILE['P']:
+                background.blit(lilypad, (ind*config.TILEWIDTH, 0))
 
     elif type(layer) == Rail:
-        gravel = getImage("gravel")
-        rail = getImage("rail (2)")
+        gravel = getImage("gravel", config=config)
+        rail = getImage("rail (2)", config=config)
         
-        for i in range(GRIDWIDTH):
-            surface.blit(gravel, (i*TILEWIDTH, 0))
-            surface.blit(rail,(i*TILEWIDTH, 0))
+        for i in range(config.GRIDWIDTH):
+            background.blit(gravel, (i*config.TILEWIDTH, 0))
+            background.blit(rail,(i*config.TILEWIDTH, 0))
+    
+        train = getImage('train2',w=7, config=config, flip=layer.direction == "l")
+        sprites = pygame.Surface((config.TILEWIDTH*7, config.TILEHEIGHT))
+        sprites = sprites.convert_alpha()
+        sprites.fill((0, 0, 0, 0))
+        sprites.blit(train,(0,0))
     
+    return background, sprites
+
+def layerSurfaces(layer: Layer, world: World) -> tuple[pygame.Surface, pygame.Surface]:
+    """
+    Returns the surfaces of buildLayer of a layer of world, which are built once
+    while the layer is visible. renderWorld releases them when it scrolls out of view.
+    """
+    cache = LAYER_SURFACES.setdefault(world, {})
+    entry = cache.get(id(layer))
+    if entry is None or entry[0] is not layer:
+        entry = cache[id(layer)] = (layer, *buildLayer(layer, world.config))
+    return entry[1], entry[2]
+
+def drawLayer(layer: Layer, world: World, surface: pygame.Surface = None, y = 0) -> pygame.Surface:
+    """
+    Draws layer at time world.t onto row y of surface, or onto a new surface of a single row.
+    Static layers are a single blit of their background, moving layers add a blit of their sprites.
+    """
+    config = world.config
+    if surface is None:
+        surface = pygame.Surface((config.TILEWIDTH*config.GRIDWIDTH, config.TILEHEIGHT))
+    background, sprites = layerSurfaces(layer, world)
+    surface.blit(background, (0, y))
+    if sprites is None:
+        return surface
+
+    # Moving sprites are clipped to the row
+    clip = surface.get_clip()
+    surface.set_clip(clip.clip(pygame.Rect(0, y, background.get_width(), background.get_height())))
+    
+    if type(layer) in (Logs, Road):
+        if layer.direction == "r":
+            surface.blit(sprites, ((((world.t*layer.speed)%layer.maxtime)-config.GRIDWIDTH) *config.TILEWIDTH, y))
+        elif layer.direction == "l":
+            surface.blit(sprites, ((-((world.t*layer.speed)%layer.maxtime)) *config.TILEWIDTH, y))
+
+    elif type(layer) == Rail:
         # lights and train
-        train = getImage('train2',w=7)
-        greenlight = getImage("greenlight",w=0.25)
-        redlight = getImage("redlight",w=0.25)
-
-        trainsurface = pygame.Surface((TILEWIDTH*7, TILEHEIGHT))
-        trainsurface = trainsurface.convert_alpha()
-        trainsurface.fill((0, 0, 0, 0))
-        if layer.direction == "l":
-            train = pygame.transform.flip(train, True, False)
-        trainsurface.blit(train,(0,0))
+        greenlight = getImage("greenlight",w=0.25, config=config)
+        redlight = getImage("redlight",w=0.25, config=config)
         
-        rep = layer.observation(world.t)
+        rep = decode(layer.observation(world.t))
         if 't' in rep:
-            surface.blit(redlight,(TILEWIDTH*6,0))
+            surface.blit(redlight,(config.TILEWIDTH*6,y))
             
             if 'T' in rep:
                 ind = rep.index('T')
                 if ind < 7:
-                    surface.blit(trainsurface,((rep.index('T')-(7-rep.count('T')))*TILEWIDTH,0))
+                    surface.blit(sprites,((rep.index('T')-(7-rep.count('T')))*config.TILEWIDTH,y))
                 else:
-                    surface.blit(trainsurface,(rep.index('T')*TILEWIDTH,0))
+                    surface.blit(sprites,(rep.index('T')*config.TILEWIDTH,y))
             
         else:
-            surface.blit(greenlight,(TILEWIDTH*6,0))
-        
-            
+            surface.blit(greenlight,(config.TILEWIDTH*6,y))
     
+    surface.set_clip(clip)
     return surface
 
+def releaseLayers(world: World, visible: list[Layer]) -> None:
+    """Releases the cached surfaces of the layers of world that are not visible"""
+    cache = LAYER_SURFACES.get(world)
+    if cache is not None and len(cache) > len(visible):
+        LAYER_SURFACES[world] = {id(layer): cache[id(layer)] for layer in visible if id(layer) in cache}
+
 def overlay(world: World, agent: Agent) -> pygame.Surface:
     """
     Returns an overlay (according to BINARY_VISION) 
     that shows the hitboxes as well as the vision grid
     """                
-    overlaySurface = pygame.Surface((APPWIDTH,APPHEIGHT))
+    config = world.config
+    overlaySurface = pygame.Surface((config.APPWIDTH,config.APPHEIGHT))
     overlaySurface = overlaySurface.convert_alpha()
     overlaySurface.fill((0,0,0,0))
     overlaySurface.set_alpha(128) 
@@ -164,16 +261,16 @@ def overlay(world: World, agent: Agent) -> pygame.Surface:
     for i,layer in enumerate(floatobs):
         for j in range(len(layer)):
             
-            pygame.draw.rect(overlaySurface, (255*floatobs[i][j],255*(1-floatobs[i][j]),0), [j*TILEWIDTH ,i*TILEHEIGHT, TILEWIDTH, TILEHEIGHT])
+            pygame.draw.rect(overlaySurface, (255*floatobs[i][j],255*(1-floatobs[i][j]),0), [j*config.TILEWIDTH ,i*config.TILEHEIGHT, config.TILEWIDTH, config.TILEHEIGHT])
             text = font.render(str(layer[j]), True, (255,0,0))
-            text_rect = text.get_rect(center=(j*TILEWIDTH + TILEWIDTH//2,i*TILEHEIGHT + TILEHEIGHT//2))
+            text_rect = text.get_rect(center=(j*config.TILEWIDTH + config.TILEWIDTH//2,i*config.TILEHEIGHT + config.TILEHEIGHT//2))
             overlaySurface.blit(text, text_rect)
 
     # Grid lines
-    for i in range(GRIDHEIGHT):
-        pygame.draw.line(overlaySurface, (255,255,255), [0,i*TILEHEIGHT],[APPWIDTH,i*TILEHEIGHT])
-    for i in range(GRIDWIDTH):
-        pygame.draw.line(overlaySurface, (255,255,255), [i*TILEWIDTH,0],[i*TILEHEIGHT,APPHEIGHT])
+    for i in range(config.GRIDHEIGHT):
+        pygame.draw.line(overlaySurface, (255,255,255), [0,i*config.TILEHEIGHT],[config.APPWIDTH,i*config.TILEHEIGHT])
+    for i in range(config.GRIDWIDTH):
+        pygame.draw.line(overlaySurface, (255,255,255), [i*config.TILEWIDTH,0],[i*config.TILEHEIGHT,config.APPHEIGHT])
     
     
     return overlaySurface
@@ -182,110 +279,60 @@ def renderWorld(world: World, agent: Agent) -> pygame.Surface:
     """
     Draws the entire overlay as a pygame.Surface
     """
+    config = world.config
     
     def getAgentSprite() -> pygame.Surface:
         """
         Returns the sprite of the agent in the right direction (based on the last action taken
         that is not standing still)
         """
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        
-        chosen = {
-            0:"chickup",
-            1:"chickside",
-            2:"chickdown",
-            3:"chickside"
-        }        
-        surface = pygame.image.load(dir_path+f"./assets/{chosen[agent.lastAction]}.png")
-        agentSprite = pygame.transform.scale(surface, (TILEWIDTH,TILEHEIGHT))
-        agentSprite = agentSprite.convert_alpha()
-        agentSprite.set_colorkey((255,255,255))
-        if agent.lastAction == 3:
-            agentSprite = pygame.transform.flip(agentSprite, True, False)
-            agentSprite = agentSprite.convert_alpha()
-            agentSprite.set_colorkey((255,255,255))
-        return agentSprite
+        img, flip = AGENT_SPRITES[agent.lastAction]
+        return ATLAS.get(img, config=config, flip=flip, colorkey=(255,255,255))
     
-    surface = pygame.Surface((APPWIDTH,APPHEIGHT))
+    surface = pygame.Surface((config.APPWIDTH,config.APPHEIGHT))
     # Clear current surface
     surface.fill((0,0,0,0))
     
     # Draw layers bottom up # NOTE: unsure about range agentpos[1]+1
-    for ind, layer in enumerate(world[agent.y-LAYERS_UNDERNEATH+1:agent.y-LAYERS_UNDERNEATH+1+GRIDHEIGHT]):
-        surface.blit(drawLayer(layer, world), (0, (GRIDHEIGHT-1-ind)*TILEHEIGHT))
+    visible = world[agent.y-config.LAYERS_UNDERNEATH+1:agent.y-config.LAYERS_UNDERNEATH+1+config.GRIDHEIGHT]
+    for ind, layer in enumerate(visible):
+        drawLayer(layer, world, surface, (config.GRIDHEIGHT-1-ind)*config.TILEHEIGHT)
+    releaseLayers(world, visible)
     
     # Draw agent
     if type(world[agent.y]) == Logs:
 
         layer = world[agent.y]
-        offset = ((layer.speed * world.t) % GRIDWIDTH) % 1
+        offset = layer.phase(world.t)
         if layer.direction in "r":
-            if round(offset) == 1 or layer.hasMoved:
-                surface.blit(getAgentSprite(),((agent.x - (1-offset))*TILEWIDTH, (GRIDHEIGHT-LAYERS_UNDERNEATH)*TILEHEIGHT))
+            if round(offset) == 1 or layer.moved(world.t):
+                surface.blit(getAgentSprite(),((agent.x - (1-offset))*config.TILEWIDTH, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*config.TILEHEIGHT))
             else:
-                surface.blit(getAgentSprite(),((agent.x + offset)*TILEWIDTH, (GRIDHEIGHT-LAYERS_UNDERNEATH)*TILEHEIGHT))
+                surface.blit(getAgentSprite(),((agent.x + offset)*config.TILEWIDTH, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*config.TILEHEIGHT))
         elif layer.direction == 'l':
-            if round(offset) == 0 and not layer.hasMoved:
-                surface.blit(getAgentSprite(),((agent.x -offset)*TILEWIDTH, (GRIDHEIGHT-LAYERS_UNDERNEATH)*TILEHEIGHT))
+            if round(offset) == 0 and not layer.moved(world.t):
+                surface.blit(getAgentSprite(),((agent.x -offset)*config.TILEWIDTH, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*config.TILEHEIGHT))
             else:
-                surface.blit(getAgentSprite(),((agent.x + (1-offset))*TILEWIDTH, (GRIDHEIGHT-LAYERS_UNDERNEATH)*TILEHEIGHT))
+                surface.blit(getAgentSprite(),((agent.x + (1-offset))*config.TILEWIDTH, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*config.TILEHEIGHT))
         else:
-            surface.blit(getAgentSprite(),(agent.x*TILEWIDTH, (GRIDHEIGHT-LAYERS_UNDERNEATH)*TILEHEIGHT))
+            surface.blit(getAgentSprite(),(agent.x*config.TILEWIDTH, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*config.TILEHEIGHT))
     else:
-        surface.blit(getAgentSprite(),(agent.x*TILEWIDTH, (GRIDHEIGHT-LAYERS_UNDERNEATH)*TILEHEIGHT))
+        surface.blit(getAgentSprite(),(agent.x*config.TILEWIDTH, (config.GRIDHEIGHT-config.LAYERS_UNDERNEATH)*config.TILEHEIGHT))
 
     # If showscore, show it in the top left corner
-    if SHOWSCORE:
+    if config.SHOWSCORE:
         font = pygame.font.SysFont(None, 24)
         txt = font.render(f'Score: {agent.highscore}', True, (255,255,255))
         surface.blit(txt, (0, 0))
 
     # Draw overlay
-    if OVERLAY:
+    if config.OVERLAY:
         o = overlay(world,agent)
         surface.blit(o, (0,0))
 
     return surface
 
-def recordingToGif(path, world: World, agent: Agent) -> None:
-    """
-    Saves the recording frames to a GIF
-    :param pos: last position of the agent
-    """
-    def getSkull(nr):
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        surface = pygame.image.load(dir_path+"./assets/skulls.png")
-        surface = pygame.transform.scale(surface, (4*TILEWIDTH,2*TILEHEIGHT))
-        subsurface = surface.subsurface(((nr%4)*TILEWIDTH, (nr//4)*TILEHEIGHT, TILEWIDTH, TILEHEIGHT))
-        return subsurface
-    
-    # Replay
-    replayAgent = Agent()
-    actionTrace = agent.trace_a
-    world.t = 0
-    frames = []
-    
-    for a in actionTrace:
-        frame = renderWorld(world, replayAgent)
-        frames.append(Image.frombytes("RGBA",(APPWIDTH,APPHEIGHT),pygame.image.tostring(frame,"RGBA",False)))
-        replayAgent.step(a)
-        world.t += 1
-        
-    endframe = renderWorld(world, replayAgent)
-    endframeFig = Image.frombytes("RGBA",(APPWIDTH,APPHEIGHT),pygame.image.tostring(frame,"RGBA",False))
-    frames.append(endframeFig)
-
-    for i in range(8):
-        newframe = renderWorld(world, replayAgent)
-
-        newframe.blit(getSkull(i),[(min(max(replayAgent.x,-0.5),GRIDWIDTH-0.5))*TILEWIDTH,(GRIDHEIGHT-LAYERS_UNDERNEATH)*TILEHEIGHT])
-        
-        frames.append(Image.frombytes("RGBA",(APPWIDTH,APPHEIGHT),pygame.image.tostring(newframe,"RGBA",False)))
-
-        world.t += 1
-    
-    
-    Path(path).mkdir(parents=True, exist_ok=True)
-    
-    frames[0].save(f"{path}{world.seed}-{agent.highscore}-{world.t}.gif", format="GIF", append_images=frames[1:],
-        save_all=True, duration=100, loop=0)
+def recordingToGif(path, world: World, agent: Agent, **kwargs) -> None:
+    """See export.recordingToGif"""
+    from crossyroadenv.export import recordingToGif
+    recordingToGif(path, world, agent, **kwargs)
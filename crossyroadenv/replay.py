@@ -0,0 +1,240 @@
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.world import World
+from crossyroadenv.agent import Agent
+from crossyroadenv.env import CrossyRoadEnv
+from crossyroadenv.sections import GENERATORS
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import groupby, islice
+from typing import Iterable, Iterator
+import argparse
+import struct
+import numpy as np
+import os
+
+"""
+Episodes are replayed from their seed and actions through the rules of CrossyRoadEnv,
+since the world is a function of the seed and of the times at which it grew.
+
+Episodes are stored in an episode file, MAGIC followed by one record per episode:
+- a RECORD header: the index of the generator in GENERATORS, the seed as 16 bytes,
+  the first 8 bytes of the digest of the config, the prefetch of the world (-1 by default),
+  the sum of the rewards, the step at which the episode ended (-1 if it did not),
+  whether it terminated, and the lengths of the bank path and of the actions
+- the path of the section bank of the world in utf-8, usually empty
+- the actions, a byte per action, where a streak of n <= STILL_RUN stills is a single byte 0x80 | n-1
+Since GENERATORS keeps its order, new generators are appended to keep the ids of the old ones.
+"""
+
+MAGIC = b'CRSEPIS1'
+RECORD = struct.Struct('<B16s8sidi?HI')
+STILL_RUN = 128             # longest streak of stills in a byte
+VERIFY_CHUNK = 64           # episodes per task of verify
+
+@dataclass(frozen=True)
+class Episode:
+    """
+    Everything needed to replay an episode: the seed of its world, every action
+    given to step, the config, and the prefetch and section bank (path) of the world.
+    The outcome is optional: the sum of the rewards, the step at which the episode
+    first terminated or truncated, and whether it terminated.
+    """
+    seed: int
+    actions: tuple
+    config: Config = DEFAULT_CONFIG
+    prefetch: int = None
+    bank: str = None
+    reward: float = None
+    end: int = None
+    terminated: bool = None
+
+    @classmethod
+    def of(cls, world: World, agent: Agent, **outcome) -> "Episode":
+        """The episode played so far in world by agent, see CrossyRoadEnv.episode for its outcome"""
+        return cls(
+            seed=world.seedSequence.entropy,
+            actions=tuple(agent.trace_a),
+            config=world.config,
+            prefetch=world.prefetch,
+            bank=None if world.bank is None else world.bank.path,
+            **outcome,
+        )
+
+    def world(self) -> World:
+        """A new world of the episode, at t = 0"""
+        return World(seed=self.seed, prefetch=self.prefetch, bank=self.bank, config=self.config)
+
+def _env(episode: Episode, env: CrossyRoadEnv = None) -> CrossyRoadEnv:
+    """An environment in a new world of episode, env (of the config of the episode) is reused if it is given"""
+    env = CrossyRoadEnv(config=episode.config) if env is None else env
+    env.agent.reset()
+    env.world.close()
+    env.world = episode.world()
+    return env
+
+def replay(episode: Episode) -> Iterator[tuple[World, Agent]]:
+    """
+    Replays episode in a new world. Yields the world and agent before every action,
+    and after the last one. Both are updated in place.
+    """
+    env = _env(episode)
+    try:
+        yield env.world, env.agent
+        for action in episode.actions:
+            env.step(action)
+            yield env.world, env.agent
+    finally:
+        env.close()
+
+def check(episode: Episode, env: CrossyRoadEnv = None) -> str:
+    """
+    Replays episode without rendering, returns how its outcome differs from the recorded one, or None.
+    The episode is replayed in env if it is given, which needs the config of the episode.
+    """
+    reused = env is not None
+    env = _env(episode, env)
+    reward, end, terminated = 0.0, None, None
+    try:
+        for i, action in enumerate(episode.actions):
+            _, r, isTerminal, isTruncated, _ = env.step(action)
+            reward += r
+            if end is None and (isTerminal or isTruncated):
+                end, terminated = i+1, bool(isTerminal)
+    finally:
+        if not reused:
+            env.close()
+
+    if episode.end is not None and (end, terminated) != (episode.end, episode.terminated):
+        return f"ended at step {end} (terminated {terminated}), recorded {episode.end} (terminated {episode.terminated})"
+    if episode.end is None and end is not None:
+        return f"ended at step {end} (terminated {terminated}), recorded to not end"
+    if episode.reward is not None and reward != episode.reward:
+        return f"reward {reward}, recorded {episode.reward}"
+    return None
+
+def packActions(actions) -> bytes:
+    """The actions as bytes, a streak of stills is run-length encoded"""
+    data = bytearray()
+    for action, streak in groupby(actions):
+        n = sum(1 for _ in streak)
+        if action == 4:
+            data.extend(0x80 | STILL_RUN-1 for _ in range(n//STILL_RUN))
+            if n % STILL_RUN:
+                data.append(0x80 | n%STILL_RUN-1)
+        else:
+            data.extend([action]*n)
+    return bytes(data)
+
+def unpackActions(data: bytes) -> tuple:
+    """The actions of packActions"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    still = data >= 0x80
+    actions = np.repeat(np.where(still, 4, data), np.where(still, (data & 0x7f)+1, 1))
+    return tuple(actions.tolist())
+
+def encodeEpisode(episode: Episode) -> bytes:
+    """A record of episode"""
+    config = episode.config
+    if not isinstance(episode.seed, int) or not 0 <= episode.seed < 1 << 128:
+        raise ValueError(f"Only seeds in [0, 2**128) can be recorded, got {episode.seed}")
+    bank = b'' if episode.bank is None else str(episode.bank).encode()
+    actions = packActions(episode.actions)
+    return RECORD.pack(
+        list(GENERATORS).index(config.WORLD_GENERATOR),
+        episode.seed.to_bytes(16, 'little'),
+        bytes.fromhex(config.digest()[:16]),
+        -1 if episode.prefetch is None else episode.prefetch,
+        float('nan') if episode.reward is None else episode.reward,
+        -1 if episode.end is None else episode.end,
+        bool(episode.terminated),
+        len(bank),
+        len(actions),
+    ) + bank + actions
+
+def writeEpisodes(path, episodes: Iterable[Episode]) -> None:
+    """Writes the records of episodes to an episode file at path"""
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        for episode in episodes:
+            f.write(encodeEpisode(episode))
+
+def readEpisodes(path, config: Config = DEFAULT_CONFIG) -> Iterator[Episode]:
+    """
+    The episodes of the episode file at path, played with config, or config with the
+    WORLD_GENERATOR of the record. Raises a ValueError if the digest of that config
+    differs from the recorded one.
+    """
+    configs = {}
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an episode file")
+        while header := f.read(RECORD.size):
+            generator, seed, digest, prefetch, reward, end, terminated, banks, actions = RECORD.unpack(header)
+            if generator not in configs:
+                name = list(GENERATORS)[generator]
+                configs[generator] = config if config.WORLD_GENERATOR == name else config.replace(WORLD_GENERATOR=name)
+            episodeConfig = configs[generator]
+            if bytes.fromhex(episodeConfig.digest()[:16]) != digest:
+                raise ValueError(f"An episode of {path} was recorded with a different config")
+            bank = f.read(banks).decode()
+            yield Episode(
+                seed=int.from_bytes(seed, 'little'),
+                actions=unpackActions(f.read(actions)),
+                config=episodeConfig,
+                prefetch=None if prefetch == -1 else prefetch,
+                bank=bank or None,
+                reward=None if reward != reward else reward,
+                end=None if end == -1 else end,
+                terminated=terminated if end != -1 else None,
+            )
+
+def _checkChunk(episodes: list[Episode]) -> list[str]:
+    """Worker of verify, the episodes share an environment as long as they share a config"""
+    differences, env = [], None
+    for episode in episodes:
+        if env is None or env.config != episode.config:
+            if env is not None:
+                env.close()
+            env = CrossyRoadEnv(config=episode.config)
+        differences.append(check(episode, env))
+    if env is not None:
+        env.close()
+    return differences
+
+def verify(episodes: Iterable[Episode], workers = None, chunk = VERIFY_CHUNK) -> list[tuple[int, str]]:
+    """
+    Replays episodes in chunks of chunk episodes by a pool of workers processes, or in this
+    process if workers is 0. Returns (index, difference) for every episode whose outcome
+    differs from the recorded one, see check. Episodes are read lazily, so an episode file
+    of any size can be verified with verify(readEpisodes(path)).
+    """
+    episodes = iter(episodes)
+    chunks = iter(lambda: list(islice(episodes, chunk)), [])
+    results = []
+    if workers == 0:
+        results = [_checkChunk(episodeChunk) for episodeChunk in chunks]
+    else:
+        workers = os.cpu_count() if workers is None else workers
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            inFlight = deque()
+            for episodeChunk in chunks:
+                inFlight.append(pool.submit(_checkChunk, episodeChunk))
+                if len(inFlight) > 2*workers:
+                    results.append(inFlight.popleft().result())
+            results.extend(future.result() for future in inFlight)
+
+    differences = (difference for result in results for difference in result)
+    return [(i, difference) for i, difference in enumerate(differences) if difference is not None]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays the episodes of an episode file and checks their outcome")
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    mismatches = verify(readEpisodes(args.path), args.workers)
+    for i, difference in mismatches:
+        print(f"episode {i}: {difference}")
+    print(f"{len(mismatches)} mismatches")
@@ -1,82 +1,75 @@
 from crossyroadenv.layers import *
 import numpy as np
 from crossyroadenv.const import *
-from collections import deque
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from functools import wraps
+
+def freeBits(row) -> int:
+    """
+    Encodes the free cells of a row of tile codes as an integer, bit x is set if cell x is free
+    """
+    return int.from_bytes(np.packbits(~TILE_BLOCKED[row], bitorder='little').tobytes(), 'little')
+
+def advance(reach, free) -> list[int]:
+    """
+    One tick of the time-expanded search. reach and free hold a bitmask per row:
+    every reachable cell may stay, or move one cell left, right, up or down,
+    as long as it ends up in a free cell.
+    """
+    new = []
+    for y in range(len(reach)):
+        r = reach[y] | (reach[y] << 1) | (reach[y] >> 1)
+        if y > 0:
+            r |= reach[y-1]
+        if y+1 < len(reach):
+            r |= reach[y+1]
+        new.append(r & free[y])
+    return new
 
 def check(lst, max_steps, worldT):
     """
-    3D-frame A* path finding I guess
+    Bit-parallel time-expanded path finding. Every row is a bitmask of its free cells,
+    the set of reachable cells is advanced one tick at a time with shifts and ANDs.
+    Every layer is evaluated at worldT, and like the original search a path is found
+    once a cell entered from the first layer is still reachable after len(lst)-1 ticks.
     :param lst: lst of the layers that are about to get added
     :param max_steps: the maximum steps to look ahead in order to say there is a path or not
     return: bool
     """
+    if len(lst)-1 >= max_steps:
+        return False
     
-    # environment, GRIDWIDTH * len(lst) * LCM(lst.cycle)
-    box = []
-    copylst = [x.copy() for x in lst]
-
-    def generate_box_layer():
-        
-        fullobs = []
-        for layer in copylst:
-            obs = np.array([1 if x in TERMINAL_STATES+INVALID_STATES else 0 for x in layer.observation(worldT)])
-            fullobs.append(obs)
-            layer.update()
-        return np.array(fullobs)
-    
-    # Add first layer
-    for _ in range(max_steps):
-        box.append(generate_box_layer())
-    
-    box = np.array(box)
+    free = [freeBits(layer.observation(worldT)) for layer in lst]
+    reach = [free[0]] + [0]*(len(lst)-1)
     
-    directions = [(1,1,0),(1,0,1),(1,0,-1),(1,-1,0),(1,0,0)]
-    queue = deque([(0,0,ind) for ind, x in enumerate(box[0][0]) if x == 0])
-    newqueue = deque()
+    for _ in range(len(lst)-1):
+        reach = advance(reach, free)
+        if not any(reach):
+            return False
     
-    # Keep going
-    while queue:
-        while queue:
-            
-            p = queue[0]
-            queue.popleft()
-            
-            box[p[0]][p[1]][p[2]] = 2
-            
-            if p[0] == len(lst)-1:
-                return True
-            
-            for item in directions:
-                z = p[0] + item[0]
-                y = p[1] + item[1]
-                x = p[2] + item[2]
-                
-                if z >= 0 and y >= 0 and x >= 0 and x < GRIDWIDTH and y < len(lst) and z < max_steps and box[z][y][x] != 1:
-                    newqueue.append((z,y,x))
-        queue = newqueue.copy()
-        newqueue.clear()
-    
-    return False
+    return any(reach)
 
 def env_checker(func, max_steps = 50):
-    def wrapper(*args, **kwargs):
-        lst = func(*args, **kwargs)
-        while not check(lst, max_steps=max_steps, worldT = args[-1]):
-            lst = func(*args, **kwargs)
+    @wraps(func)
+    def wrapper(self, t, rng):
+        lst = func(self, t, rng)
+        while not check(lst, max_steps=max_steps, worldT = t):
+            lst = func(self, t, rng)
         return lst
     return wrapper
 
 class Sections:
 
-    def __init__(self):
+    def __init__(self, config: Config = DEFAULT_CONFIG):
         """
         The basic section class.
         Must contain:
-        - add() -> Layer
+        - add(t, rng) -> list[Layer], drawing every random choice from the numpy Generator rng
+          and making every layer with config
         """
-        pass
+        self.config = config
     
-    def add(self) -> list[Layer]:
+    def add(self, t, rng) -> list[Layer]:
         raise Exception("Must be implemented!")
     def copy(self):
         c = globals()[self.__class__.__name__]()
@@ -90,33 +83,43 @@ class Default(Sections):
     """
 
     @env_checker
-    def add(self,t):
+    def add(self, t, rng):
         lst = []
         for i in range(5):
-            lst.append(np.random.choice([
-            Empty(),
+            lst.append(rng.choice([
+            Empty(rng=rng, config=self.config),
             Bush(
-                density=np.random.uniform(BUSH_DENSITY_LOW,BUSH_DENSITY_HIGH),
+                density=rng.uniform(self.config.BUSH_DENSITY_LOW,self.config.BUSH_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             Logs(
-                density=np.random.uniform(LOGS_DENSITY_LOW,LOGS_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[LOGS_DIRECTION_R,LOGS_DIRECTION_L,LOGS_DIRECTION_S]), 
-                cycle=np.random.randint(LOGS_CYCLE_LOW,LOGS_CYCLE_HIGH),
+                density=rng.uniform(self.config.LOGS_DENSITY_LOW,self.config.LOGS_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.LOGS_DIRECTION_R,self.config.LOGS_DIRECTION_L,self.config.LOGS_DIRECTION_S]), 
+                cycle=rng.integers(self.config.LOGS_CYCLE_LOW,self.config.LOGS_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             Road(
-                density=np.random.uniform(ROAD_DENSITY_LOW,ROAD_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[ROAD_DIRECTION_R,ROAD_DIRECTION_L,ROAD_DIRECTION_S]), 
-                cycle=np.random.randint(ROAD_CYCLE_LOW,ROAD_CYCLE_HIGH),
+                density=rng.uniform(self.config.ROAD_DENSITY_LOW,self.config.ROAD_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.ROAD_DIRECTION_R,self.config.ROAD_DIRECTION_L,self.config.ROAD_DIRECTION_S]), 
+                cycle=rng.integers(self.config.ROAD_CYCLE_LOW,self.config.ROAD_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             Lilypad(
-                density=np.random.uniform(LILYPAD_DENSITY_LOW,LILYPAD_DENSITY_HIGH),
+                density=rng.uniform(self.config.LILYPAD_DENSITY_LOW,self.config.LILYPAD_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             Rail(
-                direction=np.random.choice(['r','l','s'], p=[RAIL_DIRECTION_R,RAIL_DIRECTION_L,RAIL_DIRECTION_S]),
-                speed=np.random.randint(RAIL_SPEED_LOW,RAIL_SPEED_HIGH+1),
-                interval=np.random.randint(RAIL_INTERVAL_LOW,RAIL_INTERVAL_HIGH),
+                direction=rng.choice(['r','l','s'], p=[self.config.RAIL_DIRECTION_R,self.config.RAIL_DIRECTION_L,self.config.RAIL_DIRECTION_S]),
+                speed=rng.integers(self.config.RAIL_SPEED_LOW,self.config.RAIL_SPEED_HIGH+1),
+                interval=rng.integers(self.config.RAIL_INTERVAL_LOW,self.config.RAIL_INTERVAL_HIGH),
+                rng=rng,
+                config=self.config,
             )
-            ], p=[CHANCE_EMPTY,CHANCE_BUSH,CHANCE_LOGS,CHANCE_ROAD,CHANCE_LILYPAD,CHANCE_RAIL]))
+            ], p=[self.config.CHANCE_EMPTY,self.config.CHANCE_BUSH,self.config.CHANCE_LOGS,self.config.CHANCE_ROAD,self.config.CHANCE_LILYPAD,self.config.CHANCE_RAIL]))
         return lst
     
 class NoLogs(Sections):
@@ -125,26 +128,34 @@ class NoLogs(Sections):
     """
 
     @env_checker
-    def add(self,t) -> list[Layer]:
+    def add(self, t, rng) -> list[Layer]:
         lst = []
         for i in range(5):
-            lst.append(np.random.choice([
-            Empty(),
+            lst.append(rng.choice([
+            Empty(rng=rng, config=self.config),
             Bush(
-                density=np.random.uniform(BUSH_DENSITY_LOW,BUSH_DENSITY_HIGH),
+                density=rng.uniform(self.config.BUSH_DENSITY_LOW,self.config.BUSH_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             Road(
-                density=np.random.uniform(ROAD_DENSITY_LOW,ROAD_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[ROAD_DIRECTION_R,ROAD_DIRECTION_L,ROAD_DIRECTION_S]), 
-                cycle=np.random.randint(ROAD_CYCLE_LOW,ROAD_CYCLE_HIGH),
+                density=rng.uniform(self.config.ROAD_DENSITY_LOW,self.config.ROAD_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.ROAD_DIRECTION_R,self.config.ROAD_DIRECTION_L,self.config.ROAD_DIRECTION_S]), 
+                cycle=rng.integers(self.config.ROAD_CYCLE_LOW,self.config.ROAD_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             Lilypad(
-                density=np.random.uniform(LILYPAD_DENSITY_LOW,LILYPAD_DENSITY_HIGH),
+                density=rng.uniform(self.config.LILYPAD_DENSITY_LOW,self.config.LILYPAD_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             Rail(
-                direction=np.random.choice(['r','l','s'], p=[RAIL_DIRECTION_R,RAIL_DIRECTION_L,RAIL_DIRECTION_S]),
-                speed=np.random.randint(RAIL_SPEED_LOW,RAIL_SPEED_HIGH+1),
-                interval=np.random.randint(RAIL_INTERVAL_LOW,RAIL_INTERVAL_HIGH),
+                direction=rng.choice(['r','l','s'], p=[self.config.RAIL_DIRECTION_R,self.config.RAIL_DIRECTION_L,self.config.RAIL_DIRECTION_S]),
+                speed=rng.integers(self.config.RAIL_SPEED_LOW,self.config.RAIL_SPEED_HIGH+1),
+                interval=rng.integers(self.config.RAIL_INTERVAL_LOW,self.config.RAIL_INTERVAL_HIGH),
+                rng=rng,
+                config=self.config,
             )
             ], p=[0.2]*5))
         return lst 
@@ -157,64 +168,73 @@ class Hybrid(Sections):
     as non-static.
     """
     
-    def addLogs(self):
+    def addLogs(self, rng):
         return Logs(
-                density=np.random.uniform(LOGS_DENSITY_LOW,LOGS_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[LOGS_DIRECTION_R,LOGS_DIRECTION_L,LOGS_DIRECTION_S]), 
-                cycle=np.random.randint(LOGS_CYCLE_LOW,LOGS_CYCLE_HIGH),
+                density=rng.uniform(self.config.LOGS_DENSITY_LOW,self.config.LOGS_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.LOGS_DIRECTION_R,self.config.LOGS_DIRECTION_L,self.config.LOGS_DIRECTION_S]), 
+                cycle=rng.integers(self.config.LOGS_CYCLE_LOW,self.config.LOGS_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addRoad(self):
+    def addRoad(self, rng):
         return Road(
-                density=np.random.uniform(ROAD_DENSITY_LOW,ROAD_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[ROAD_DIRECTION_R,ROAD_DIRECTION_L,ROAD_DIRECTION_S]), 
-                cycle=np.random.randint(ROAD_CYCLE_LOW,ROAD_CYCLE_HIGH),
+                density=rng.uniform(self.config.ROAD_DENSITY_LOW,self.config.ROAD_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.ROAD_DIRECTION_R,self.config.ROAD_DIRECTION_L,self.config.ROAD_DIRECTION_S]), 
+                cycle=rng.integers(self.config.ROAD_CYCLE_LOW,self.config.ROAD_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addRails(self):
+    def addRails(self, rng):
         return Rail(
-                direction=np.random.choice(['r','l','s'], p=[RAIL_DIRECTION_R,RAIL_DIRECTION_L,RAIL_DIRECTION_S]),
-                speed=np.random.randint(RAIL_SPEED_LOW,RAIL_SPEED_HIGH+1),
-                interval=np.random.randint(RAIL_INTERVAL_LOW,RAIL_INTERVAL_HIGH),
+                direction=rng.choice(['r','l','s'], p=[self.config.RAIL_DIRECTION_R,self.config.RAIL_DIRECTION_L,self.config.RAIL_DIRECTION_S]),
+                speed=rng.integers(self.config.RAIL_SPEED_LOW,self.config.RAIL_SPEED_HIGH+1),
+                interval=rng.integers(self.config.RAIL_INTERVAL_LOW,self.config.RAIL_INTERVAL_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addLilypads(self):
+    def addLilypads(self, rng):
         return Lilypad(
-                density=np.random.uniform(LILYPAD_DENSITY_LOW,LILYPAD_DENSITY_HIGH),
+                density=rng.uniform(self.config.LILYPAD_DENSITY_LOW,self.config.LILYPAD_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addBush(self):
+    def addBush(self, rng):
         return Bush(
-                density=np.random.uniform(BUSH_DENSITY_LOW,BUSH_DENSITY_HIGH),
+                density=rng.uniform(self.config.BUSH_DENSITY_LOW,self.config.BUSH_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addEmpty(self):
-        return Empty(
-                )
+    def addEmpty(self, rng):
+        return Empty(rng=rng, config=self.config)
     
     @env_checker
-    def add(self,t) -> list[Layer]:
+    def add(self, t, rng) -> list[Layer]:
         
-        nonstatic = np.random.randint(0,3)
-        static = np.random.randint(0,3)
-        nrlayers = np.random.randint(1,5)
+        nonstatic = rng.integers(0,3)
+        static = rng.integers(0,3)
+        nrlayers = rng.integers(1,5)
 
         lst = []
         for l in range(nrlayers):
             if nonstatic == 0: 
-                newlayer = self.addLogs()
+                newlayer = self.addLogs(rng)
             elif nonstatic == 1:
-                newlayer = self.addRails()
+                newlayer = self.addRails(rng)
             elif nonstatic == 2:
-                newlayer = self.addRoad()
+                newlayer = self.addRoad(rng)
             lst.append(newlayer)
         
         if static == 0: 
-            newlayer = self.addBush()
+            newlayer = self.addBush(rng)
         elif static == 1:
-            newlayer = self.addEmpty()
+            newlayer = self.addEmpty(rng)
         elif static == 2:
-            newlayer = self.addLilypads()
+            newlayer = self.addLilypads(rng)
         lst.append(newlayer)
         
         return lst
@@ -225,196 +245,215 @@ class Lookalike(Sections):
     game Crossy Road.
     """
 
-    def addLogs(self):
+    def addLogs(self, rng):
         return Logs(
-                density=np.random.uniform(LOGS_DENSITY_LOW,LOGS_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[LOGS_DIRECTION_R,LOGS_DIRECTION_L,LOGS_DIRECTION_S]), 
-                cycle=np.random.randint(LOGS_CYCLE_LOW,LOGS_CYCLE_HIGH),
+                density=rng.uniform(self.config.LOGS_DENSITY_LOW,self.config.LOGS_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.LOGS_DIRECTION_R,self.config.LOGS_DIRECTION_L,self.config.LOGS_DIRECTION_S]), 
+                cycle=rng.integers(self.config.LOGS_CYCLE_LOW,self.config.LOGS_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addRoad(self):
+    def addRoad(self, rng):
         return Road(
-                density=np.random.uniform(ROAD_DENSITY_LOW,ROAD_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[ROAD_DIRECTION_R,ROAD_DIRECTION_L,ROAD_DIRECTION_S]), 
-                cycle=np.random.randint(ROAD_CYCLE_LOW,ROAD_CYCLE_HIGH),
+                density=rng.uniform(self.config.ROAD_DENSITY_LOW,self.config.ROAD_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.ROAD_DIRECTION_R,self.config.ROAD_DIRECTION_L,self.config.ROAD_DIRECTION_S]), 
+                cycle=rng.integers(self.config.ROAD_CYCLE_LOW,self.config.ROAD_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addRails(self):
+    def addRails(self, rng):
         return Rail(
-                direction=np.random.choice(['r','l','s'], p=[RAIL_DIRECTION_R,RAIL_DIRECTION_L,RAIL_DIRECTION_S]),
-                speed=np.random.randint(RAIL_SPEED_LOW,RAIL_SPEED_HIGH+1),
-                interval=np.random.randint(RAIL_INTERVAL_LOW,RAIL_INTERVAL_HIGH),
+                direction=rng.choice(['r','l','s'], p=[self.config.RAIL_DIRECTION_R,self.config.RAIL_DIRECTION_L,self.config.RAIL_DIRECTION_S]),
+                speed=rng.integers(self.config.RAIL_SPEED_LOW,self.config.RAIL_SPEED_HIGH+1),
+                interval=rng.integers(self.config.RAIL_INTERVAL_LOW,self.config.RAIL_INTERVAL_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addLilypads(self):
+    def addLilypads(self, rng):
         return Lilypad(
-                density=np.random.uniform(LILYPAD_DENSITY_LOW,LILYPAD_DENSITY_HIGH),
+                density=rng.uniform(self.config.LILYPAD_DENSITY_LOW,self.config.LILYPAD_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addBush(self):
+    def addBush(self, rng):
         return Bush(
-                density=np.random.uniform(BUSH_DENSITY_LOW,BUSH_DENSITY_HIGH),
+                density=rng.uniform(self.config.BUSH_DENSITY_LOW,self.config.BUSH_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addEmpty(self):
-        return Empty(
-                )
+    def addEmpty(self, rng):
+        return Empty(rng=rng, config=self.config)
     
     @env_checker
-    def add(self,t):
+    def add(self, t, rng):
 
         def carSection():
             base = 1
-            lst = [self.addRoad()]
+            lst = [self.addRoad(rng)]
 
-            while np.random.uniform() <= base:
+            while rng.uniform() <= base:
                 base *= 0.7
-                lst.append(self.addRoad())
+                lst.append(self.addRoad(rng))
             
-            lst.append(self.addBush())
+            lst.append(self.addBush(rng))
             return lst
         
         def logSection():
             base = 1
-            lst = [self.addLogs()]
+            lst = [self.addLogs(rng)]
 
-            while np.random.uniform() <= base:
+            while rng.uniform() <= base:
                 base *= 0.5
-                lst.append(self.addLogs())
+                lst.append(self.addLogs(rng))
             
-            if np.random.uniform() <= 0.3:
-                lst.append(self.addBush())
+            if rng.uniform() <= 0.3:
+                lst.append(self.addBush(rng))
             else:
-                lst.append(self.addLilypads())
+                lst.append(self.addLilypads(rng))
 
             return lst
         
         def trainSection():
-            if np.random.uniform() <= 0.5:
-                return [self.addRails(), self.addRails(), self.addBush()]
-            return [self.addRails(), self.addBush()]
+            if rng.uniform() <= 0.5:
+                return [self.addRails(rng), self.addRails(rng), self.addBush(rng)]
+            return [self.addRails(rng), self.addBush(rng)]
 
         def emptySection():
             base = 1
-            lst = [self.addEmpty()]
+            lst = [self.addEmpty(rng)]
 
-            while np.random.uniform() <= base:
+            while rng.uniform() <= base:
                 base *= 0.2
-                if np.random.uniform() <= 0.1:
-                    lst.append(self.addEmpty())
+                if rng.uniform() <= 0.1:
+                    lst.append(self.addEmpty(rng))
                 else:
-                    lst.append(self.addBush())
+                    lst.append(self.addBush(rng))
             return lst
         
         
         dic = {
-            0: logSection(),
-            1: carSection(),
-            2: trainSection(),
-            3: emptySection()
+            0: logSection,
+            1: carSection,
+            2: trainSection,
+            3: emptySection
         }
-        lst = dic[np.random.randint(4)]
+        lst = dic[rng.integers(4)]()
 
         return lst
 
 class LookalikeIncDif(Sections):
-    def __init__(self):
+    def __init__(self, config: Config = DEFAULT_CONFIG):
         """
         This section maker focusses on reproducing the structure of the actual
         game Crossy Road.
         """
+        super().__init__(config)
         self.base = 0.5
 
-    def addLogs(self):
+    def addLogs(self, rng):
         return Logs(
-                density=np.random.uniform(LOGS_DENSITY_LOW,LOGS_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[LOGS_DIRECTION_R,LOGS_DIRECTION_L,LOGS_DIRECTION_S]), 
-                cycle=np.random.randint(LOGS_CYCLE_LOW,LOGS_CYCLE_HIGH),
+                density=rng.uniform(self.config.LOGS_DENSITY_LOW,self.config.LOGS_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.LOGS_DIRECTION_R,self.config.LOGS_DIRECTION_L,self.config.LOGS_DIRECTION_S]), 
+                cycle=rng.integers(self.config.LOGS_CYCLE_LOW,self.config.LOGS_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addRoad(self):
+    def addRoad(self, rng):
         return Road(
-                density=np.random.uniform(ROAD_DENSITY_LOW,ROAD_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[ROAD_DIRECTION_R,ROAD_DIRECTION_L,ROAD_DIRECTION_S]), 
-                cycle=np.random.randint(ROAD_CYCLE_LOW,ROAD_CYCLE_HIGH),
+                density=rng.uniform(self.config.ROAD_DENSITY_LOW,self.config.ROAD_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.ROAD_DIRECTION_R,self.config.ROAD_DIRECTION_L,self.config.ROAD_DIRECTION_S]), 
+                cycle=rng.integers(self.config.ROAD_CYCLE_LOW,self.config.ROAD_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addRails(self):
+    def addRails(self, rng):
         return Rail(
-                direction=np.random.choice(['r','l','s'], p=[RAIL_DIRECTION_R,RAIL_DIRECTION_L,RAIL_DIRECTION_S]),
-                speed=np.random.randint(RAIL_SPEED_LOW,RAIL_SPEED_HIGH+1),
-                interval=np.random.randint(RAIL_INTERVAL_LOW,RAIL_INTERVAL_HIGH),
+                direction=rng.choice(['r','l','s'], p=[self.config.RAIL_DIRECTION_R,self.config.RAIL_DIRECTION_L,self.config.RAIL_DIRECTION_S]),
+                speed=rng.integers(self.config.RAIL_SPEED_LOW,self.config.RAIL_SPEED_HIGH+1),
+                interval=rng.integers(self.config.RAIL_INTERVAL_LOW,self.config.RAIL_INTERVAL_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addLilypads(self):
+    def addLilypads(self, rng):
         return Lilypad(
-                density=np.random.uniform(LILYPAD_DENSITY_LOW,LILYPAD_DENSITY_HIGH),
+                density=rng.uniform(self.config.LILYPAD_DENSITY_LOW,self.config.LILYPAD_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addBush(self):
+    def addBush(self, rng):
         return Bush(
-                density=np.random.uniform(BUSH_DENSITY_LOW,BUSH_DENSITY_HIGH),
+                density=rng.uniform(self.config.BUSH_DENSITY_LOW,self.config.BUSH_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 )
     
-    def addEmpty(self):
-        return Empty(
-                )
+    def addEmpty(self, rng):
+        return Empty(rng=rng, config=self.config)
     
     @env_checker
-    def add(self,t):
+    def add(self, t, rng):
 
         def carSection():
             base = self.base
-            lst = [self.addRoad()]
+            lst = [self.addRoad(rng)]
 
-            while np.random.uniform() <= base:
+            while rng.uniform() <= base:
                 base *= 0.7
-                lst.append(self.addRoad())
+                lst.append(self.addRoad(rng))
             
-            lst.append(self.addBush())
+            lst.append(self.addBush(rng))
             return lst
         
         def logSection():
             base = self.base
-            lst = [self.addLogs()]
+            lst = [self.addLogs(rng)]
 
-            while np.random.uniform() <= base:
+            while rng.uniform() <= base:
                 base *= 0.5
-                lst.append(self.addLogs())
+                lst.append(self.addLogs(rng))
             
-            if np.random.uniform() <= 0.3:
-                lst.append(self.addBush())
+            if rng.uniform() <= 0.3:
+                lst.append(self.addBush(rng))
             else:
-                lst.append(self.addLilypads())
+                lst.append(self.addLilypads(rng))
 
             return lst
         
         def trainSection():
-            if np.random.uniform() <= 0.5:
-                return [self.addRails(), self.addRails(), self.addBush()]
-            return [self.addRails(), self.addBush()]
+            if rng.uniform() <= 0.5:
+                return [self.addRails(rng), self.addRails(rng), self.addBush(rng)]
+            return [self.addRails(rng), self.addBush(rng)]
 
         def emptySection():
             base = 1
-            lst = [self.addEmpty()]
+            lst = [self.addEmpty(rng)]
 
-            while np.random.uniform() <= base:
+            while rng.uniform() <= base:
                 base *= 0.2
-                if np.random.uniform() <= 0.1:
-                    lst.append(self.addEmpty())
+                if rng.uniform() <= 0.1:
+                    lst.append(self.addEmpty(rng))
                 else:
-                    lst.append(self.addBush())
+                    lst.append(self.addBush(rng))
             return lst
         
         self.base += 0.01
         
         dic = {
-            0: logSection(),
-            1: carSection(),
-            2: trainSection(),
-            3: emptySection()
+            0: logSection,
+            1: carSection,
+            2: trainSection,
+            3: emptySection
         }
-        lst = dic[np.random.randint(4)]
+        lst = dic[rng.integers(4)]()
 
         return lst
 
@@ -424,13 +463,15 @@ class AllGrass(Sections):
     """
 
     @env_checker
-    def add(self,t):
+    def add(self, t, rng):
         lst = []
         for i in range(5):
-            lst.append(np.random.choice([
-            Empty(),
+            lst.append(rng.choice([
+            Empty(rng=rng, config=self.config),
             Bush(
-                density=np.random.uniform(BUSH_DENSITY_LOW,BUSH_DENSITY_HIGH),
+                density=rng.uniform(self.config.BUSH_DENSITY_LOW,self.config.BUSH_DENSITY_HIGH),
+                rng=rng,
+                config=self.config,
                 ),
             ], p=[0.8,0.2]))
         return lst
@@ -439,17 +480,30 @@ class AllLogs(Sections):
     """
     The section with all default settings
     """
-    def addLogs(self):
+    def addLogs(self, rng):
         return Logs(
-                density=np.random.uniform(LOGS_DENSITY_LOW,LOGS_DENSITY_HIGH), 
-                direction=np.random.choice(['r','l','s'], p=[LOGS_DIRECTION_R,LOGS_DIRECTION_L,LOGS_DIRECTION_S]), 
-                cycle=np.random.randint(LOGS_CYCLE_LOW,LOGS_CYCLE_HIGH),
+                density=rng.uniform(self.config.LOGS_DENSITY_LOW,self.config.LOGS_DENSITY_HIGH), 
+                direction=rng.choice(['r','l','s'], p=[self.config.LOGS_DIRECTION_R,self.config.LOGS_DIRECTION_L,self.config.LOGS_DIRECTION_S]), 
+                cycle=rng.integers(self.config.LOGS_CYCLE_LOW,self.config.LOGS_CYCLE_HIGH),
+                rng=rng,
+                config=self.config,
                 )
         
     @env_checker
-    def add(self,t):
+    def add(self, t, rng):
         lst = []
         for i in range(3):
-            lst.append(self.addLogs())
-        lst.append(Empty())
-        return lst
\ No newline at end of file
+            lst.append(self.addLogs(rng))
+        lst.append(Empty(rng=rng, config=self.config))
+        return lst
+
+# Section makers by name, as used for WORLD_GENERATOR
+GENERATORS = {
+    'default': Default,
+    'nologs': NoLogs,
+    'hybrid': Hybrid,
+    'lookalike': Lookalike,
+    'lookalikeincdif': LookalikeIncDif,
+    'allgrass': AllGrass,
+    'alllogs': AllLogs
+}
\ No newline at end of file
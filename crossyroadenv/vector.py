@@ -0,0 +1,222 @@
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
+from crossyroadenv.world import World
+from crossyroadenv.layers import Logs
+from crossyroadenv.mask import Mask
+from crossyroadenv.observation import Observer
+
+"""
+Batched version of CrossyRoadEnv. All N worlds are stepped at once: the agent
+state, the world time and the visible window of every world are kept in
+contiguous arrays, so that the game rules only cost a handful of numpy ops
+per step instead of a Python loop over N environments.
+
+The visible windows are stored as tile codes, see TILES in const.py.
+"""
+
+ACTION_DX = np.array([ACTION_TUPLES[a][0] for a in range(5)])
+ACTION_DY = np.array([ACTION_TUPLES[a][1] for a in range(5)])
+
+class CrossyRoadVectorEnv(VectorEnv):
+    """
+    Vectorized CrossyRoadEnv, which produces the same transitions as N
+    scalar environments seeded with the same seeds.
+    Finished worlds are reset on the next call to step, in which case that
+    step returns the first observation of the new world with a reward of 0.
+    All N worlds share a single Config, given like for CrossyRoadEnv.
+    """
+
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(self, num_envs = 1, render_mode = None, config: Config = None, obs_mode = None, obs_dtype = None, obs_window = None, copy = True, **kwargs):
+        if render_mode is not None:
+            raise ValueError("CrossyRoadVectorEnv does not support rendering")
+
+        self.config: Config = DEFAULT_CONFIG if config is None else config
+        if kwargs:
+            self.config = self.config.replace(**kwargs)
+
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+
+        # Observation, as in CrossyRoadEnv
+        self.observer: Observer = Observer(obs_mode, obs_dtype, obs_window, config=self.config)
+        self.mask: Mask = self.observer.mask
+        self.copy = copy
+        self._obs = np.empty((num_envs, *self.observer.shape), dtype=self.observer.dtype)
+
+        self.single_action_space = spaces.Discrete(5)
+        self.single_observation_space = self.observer.space
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        # Agents
+        self.x = np.zeros(num_envs, dtype=np.int64)
+        self.y = np.zeros(num_envs, dtype=np.int64)
+        self.highscore = np.zeros(num_envs, dtype=np.int64)
+        self.lastAction = np.zeros(num_envs, dtype=np.int64)
+
+        # Worlds
+        self.worlds: list[World] = [None]*num_envs
+        self.t = np.zeros(num_envs, dtype=np.int64)
+
+        # Visible windows
+        height, width = self.config.GRIDHEIGHT, self.config.GRIDWIDTH
+        self.codes = np.zeros((num_envs, height, width), dtype=np.uint8)
+        self.direction = np.zeros((num_envs, height), dtype=np.int8)
+        self.offset = np.zeros((num_envs, height), dtype=np.float64)
+        self._visible = [None]*num_envs
+
+        self._autoreset = np.zeros(num_envs, dtype=bool)
+
+    def _resetWorld(self, i, seed = None) -> None:
+        if self.worlds[i] is not None:
+            self.worlds[i].close()
+        self.worlds[i] = World(seed=seed, config=self.config)
+        self._visible[i] = None
+
+        self.x[i], self.y[i] = self.config.STARTLOCATION
+        self.highscore[i] = 0
+        self.lastAction[i] = 2
+        self.t[i] = 0
+
+    def _addSections(self, i) -> None:
+        """Generates new sections and frees old layers of world i, like CrossyRoadEnv.step"""
+        world = self.worlds[i]
+        world.t = int(self.t[i])
+        while self.highscore[i] > len(world)-self.config.HORIZON:
+            world.add_section()
+        if self.config.MAX_LAYERS_BEHIND != -1:
+            world.evict(self.highscore[i] - self.config.MAX_LAYERS_BEHIND)
+
+    def _updateWindow(self, i) -> None:
+        """
+        Stores the visible window of world i as tile codes. Layers that were already
+        visible keep their row, unless their observation depends on t (see Layer.period).
+        """
+        t = int(self.t[i])
+        base = self.y[i]-self.config.LAYERS_UNDERNEATH+1
+        visible = self.worlds[i][base:base+self.config.GRIDHEIGHT]
+        previous = self._visible[i]
+
+        for j, layer in enumerate(visible):
+            if layer.isStatic:
+                self.direction[i, j] = 0
+                self.offset[i, j] = 0
+            else:
+                self.direction[i, j] = 1 if layer.direction == "r" else -1
+                self.offset[i, j] = layer.phase(t)
+
+            if layer.period > 1 or previous is None or previous[j] is not layer:
+                self.codes[i, j] = layer.observation(t)
+
+        self._visible[i] = visible
+
+    def _getObservation(self) -> np.ndarray:
+        """Batched CrossyRoadEnv._getObservation over all visible windows"""
+        out = None if self.copy else self._obs
+        return self.observer.encode_batch(self.codes, self.direction, self.offset, self.x, out)
+
+    def _getInfo(self) -> dict:
+        onLayer = np.empty(self.num_envs, dtype=object)
+        for i in range(self.num_envs):
+            onLayer[i] = self._visible[i][self.config.LAYERS_UNDERNEATH-1]
+        return {"onLayer": onLayer, "_onLayer": np.ones(self.num_envs, dtype=bool)}
+
+    def reset(self, seed = None, options = None):
+        if seed is None:
+            seed = [None]*self.num_envs
+        elif isinstance(seed, int):
+            seed = [seed+i for i in range(self.num_envs)]
+        if len(seed) != self.num_envs:
+            raise ValueError(f"Expected {self.num_envs} seeds, got {len(seed)}")
+
+        for i in range(self.num_envs):
+            self._resetWorld(i, seed[i])
+            self._updateWindow(i)
+        self._autoreset[:] = False
+
+        info = self._getInfo()
+        info["newHighscore"] = np.zeros(self.num_envs, dtype=bool)
+        info["_newHighscore"] = np.ones(self.num_envs, dtype=bool)
+
+        return self._getObservation(), info
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        n = np.arange(self.num_envs)
+        config = self.config
+        width = config.GRIDWIDTH
+
+        # Worlds that finished last step are reset instead of stepped
+        resetting = self._autoreset.copy()
+        for i in np.flatnonzero(resetting):
+            self._resetWorld(i)
+        active = ~resetting
+
+        dx = ACTION_DX[actions]
+        dy = ACTION_DY[actions]
+        row = config.LAYERS_UNDERNEATH-1+dy
+        outOfTime = config.MAX_AGE != -1 and self.t > config.MAX_AGE
+
+        nx = self.x+dx
+        isTruncated = ~((0 <= nx) & (nx < width)) | outOfTime
+        target = self.codes[n, row, np.clip(nx, 0, width-1)]
+        isInvalid = ~isTruncated & ((self.y+dy == 0) | TILE_INVALID[target])
+
+        # Correct for log offset
+        for i in np.flatnonzero(active & (actions == 4)):
+            layer = self.worlds[i][self.y[i]]
+            if type(layer) == Logs and layer.moved(int(self.t[i])):
+                if layer.direction == "r":
+                    self.x[i] += 1
+                elif layer.direction == "l":
+                    self.x[i] -= 1
+
+        nx = self.x+dx
+        isTruncated = ~((0 <= nx) & (nx < width)) | outOfTime
+        target = self.codes[n, row, np.clip(nx, 0, width-1)]
+        isTerminal = ~isTruncated & TILE_TERMINAL[target]
+
+        newHighscore = ~isInvalid & ~isTerminal & (self.y+dy > self.highscore)
+
+        # Do the actual step in the environments
+        move = active & ~isTruncated & ~isInvalid
+        self.x[move] += dx[move]
+        self.y[move] += dy[move]
+        self.lastAction[move & (actions != 4)] = actions[move & (actions != 4)]
+        self.highscore[move] = np.maximum(self.highscore[move], self.y[move])
+
+        r = np.select(
+            [isInvalid, isTruncated, isTerminal, newHighscore],
+            [config.REWARD_INVALID, config.REWARD_TRUNCATED, config.REWARD_TERMINATED, config.REWARD_NEWLAYER],
+            config.ACTION_REWARDS[actions])
+
+        # Update worlds
+        self.t[active] += 1
+        for i in np.flatnonzero(move):
+            self._addSections(i)
+        for i in range(self.num_envs):
+            self._updateWindow(i)
+
+        r[resetting] = 0
+        isTerminal &= active
+        isTruncated &= active
+        newHighscore &= active
+        self._autoreset = isTerminal | isTruncated
+
+        info = self._getInfo()
+        info["newHighscore"] = newHighscore
+        info["_newHighscore"] = np.ones(self.num_envs, dtype=bool)
+
+        obs = self._getObservation()
+        return obs, r, isTerminal, isTruncated, info
+
+    def close_extras(self, **kwargs):
+        for world in self.worlds:
+            if world is not None:
+                world.close()
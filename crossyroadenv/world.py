@@ -1,75 +1,251 @@
 from crossyroadenv.const import *
+from crossyroadenv.config import Config, DEFAULT_CONFIG
 from crossyroadenv.layers import *
 from crossyroadenv.sections import *
 from crossyroadenv.agent import *
+from crossyroadenv.bank import SectionBank
+from crossyroadenv import oracle
+from collections import OrderedDict, deque
+from itertools import islice
+import queue
+import threading
+import weakref
 import numpy as np
 
+GENERATED_SECTIONS = 1024   # Sections kept per world once its state is cloned, such that restored states regrow the same world
+
+def _allocate(name, shape, dtype) -> np.ndarray:
+    return np.empty(shape, dtype=dtype)
+
+def interpolateFloats(codes, direction, phase, tileRep = TILE_REP, out = None, buffer = _allocate) -> np.ndarray:
+    """
+    Float representation of windows of tile codes codes[..., H, W], for any number of
+    leading batch dimensions. Every cell of a moving row is blended with the neighbour
+    it moves away from or towards, by the sub-cell phase[..., H] of its row.
+    direction[..., H] is 1 for rows moving right, -1 for rows moving left and 0 for static rows.
+    tileRep is the float of every tile code, see Config.TILE_REP.
+    The result is written into out if given. Every intermediate array is taken from
+    buffer(name, shape, dtype), e.g. Observer._buffer to reuse them between calls.
+    """
+    shape, rows = codes.shape, codes.shape[:-1] + (1,)
+    middle = np.take(tileRep, codes, out=buffer('middle', shape, np.float64), mode='clip')
+    left = buffer('left', shape, np.float64)
+    left[..., 1:], left[..., 0] = middle[..., :-1], middle[..., -1]
+    right = buffer('right', shape, np.float64)
+    right[..., :-1], right[..., -1] = middle[..., 1:], middle[..., 0]
+    
+    # Every moving row is blended with one neighbour: the right one if its phase rounds up and it
+    # moves right, or if its phase rounds down and it moves left, otherwise the left one
+    d = np.reshape(phase, rows)
+    roundUp = np.equal(np.round(d, out=buffer('rounded', rows, np.float64)), 1, out=buffer('roundUp', rows, bool))
+    moving = np.reshape(direction, rows)
+    useRight = np.equal(moving, 1, out=buffer('useRight', rows, bool))
+    np.logical_and(useRight, roundUp, out=useRight)
+    movesLeft = np.equal(moving, -1, out=buffer('movesLeft', rows, bool))
+    np.logical_and(movesLeft, np.logical_not(roundUp, out=buffer('roundDown', rows, bool)), out=movesLeft)
+    np.logical_or(useRight, movesLeft, out=useRight)
+    neighbour = buffer('neighbour', shape, np.float64)
+    np.copyto(neighbour, left)
+    np.copyto(neighbour, right, where=useRight)
+    
+    # The neighbour is weighted by 1-d if the phase rounds up and by d otherwise, the cell itself by the rest
+    oneMinus = np.subtract(1, d, out=buffer('oneMinus', rows, np.float64))
+    weight = buffer('weight', rows, np.float64)
+    np.copyto(weight, d)
+    np.copyto(weight, oneMinus, where=roundUp)
+    rest = buffer('rest', rows, np.float64)
+    np.copyto(rest, oneMinus)
+    np.copyto(rest, d, where=roundUp)
+    
+    out = np.empty(shape, dtype=np.float64) if out is None else out
+    np.multiply(weight, neighbour, out=out)
+    np.add(out, np.multiply(rest, middle, out=neighbour), out=out)
+    
+    # Static rows, and cells whose neighbours are the same as themselves, keep their float
+    np.copyto(out, middle, where=np.equal(moving, 0, out=buffer('static', rows, bool)))
+    same = np.equal(left, right, out=buffer('same', shape, bool))
+    np.logical_and(same, np.equal(right, middle, out=buffer('sameRight', shape, bool)), out=same)
+    np.copyto(out, middle, where=same)
+    return np.round(out, 2, out=out)
+
+def _sectionRng(seedSequence, n) -> np.random.Generator:
+    """The child stream of section n, the same as the (n+1)-th stream spawned by the seed sequence"""
+    return np.random.default_rng(np.random.SeedSequence(seedSequence.entropy, spawn_key=seedSequence.spawn_key + (n+1,), pool_size=seedSequence.pool_size))
+
+def _prefetchSections(sections, stopped, generator, seedSequence, n) -> None:
+    """
+    Background thread of the prefetch mode, which puts sections n, n+1, ... into the queue sections
+    until stopped is set. Since it is unknown at which t a section will be added, prefetched sections
+    are validated at t = 0, the same t as the sections of the starting area. The sections are therefore
+    deterministic given the seed, but differ from the ones generated without prefetching.
+    The thread has its own generator and holds no reference to its world, see World.__init__.
+    """
+    while not stopped.is_set():
+        section = generator.add(0, _sectionRng(seedSequence, n))
+        n += 1
+        while not stopped.is_set():
+            try:
+                sections.put(section, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
 class World:
-    def __init__(self, seed = None, **kwargs):
+    def __init__(self, seed = None, prefetch = None, bank = None, config: Config = DEFAULT_CONFIG, **kwargs):
+        """
+        prefetch and bank default to PREFETCH_SECTIONS and SECTION_BANK of config
+        """
         
         self.seed = seed
-        np.random.seed(seed)
         self.t = 0
+        self.config = config
+        prefetch = config.PREFETCH_SECTIONS if prefetch is None else prefetch
+        bank = config.SECTION_BANK if bank is None else bank
+        
+        # Every world owns its random streams: the starting area is drawn from rng
+        # and every section from a new child stream of the seed sequence
+        self.seedSequence = np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seedSequence.spawn(1)[0])
         
         # World generation
-        self.worldGenerator = self.getWorldGenerator(WORLD_GENERATOR)
+        self.worldGenerator = self.getWorldGenerator(config.WORLD_GENERATOR)
+        
+        # Wall of bushes at the bottom of the world
+        self.bottom = Bush(density=1, rng=self.rng, config=config)
+        
+        # Only the layers from row self.offset up to the generation horizon are kept,
+        # World is indexed with absolute rows
+        self.offset = 0
+        self.world: deque[Layer] = deque([self.bottom]*(config.LAYERS_UNDERNEATH-1) + [
+                      Bush(density=0,border=True, rng=self.rng, config=config),
+                      Bush(density=0,border=True, rng=self.rng, config=config),
+                      ])
+        # Bank mode: sections are drawn from a pre-generated section bank
+        self.bank = SectionBank.open(bank) if isinstance(bank, str) else bank
+        if self.bank is not None:
+            self.bank.check(config)
         
-        self.world: list[Layer] = [Bush(density=1)]*(LAYERS_UNDERNEATH-1) + [
-                      Bush(density=0,border=True),
-                      Bush(density=0,border=True),
-                      ]
-        while len(self.world) < 20:
+        self.prefetch = prefetch
+        self._sections = None
+        self._window = None
+        
+        # Section n of the world is drawn from child n+1 of the seed sequence.
+        # Once the state is cloned, generated sections are kept such that restored states regrow the same world
+        self._added = 0
+        self._pulled = 0
+        self._shared = False
+        self._generated = None
+        self._occupancy = {}
+        while len(self) < config.HORIZON:
             self.add_section()
+        
+        # Prefetch mode: a background thread keeps a queue of validated sections. It draws them from
+        # a copy of the generator, whose state the world may change, and is stopped once the world is
+        # collected, if it is not closed before
+        if prefetch > 0 and self.bank is None:
+            self._pulled = self._added
+            self._sections = queue.Queue(maxsize=prefetch)
+            self._stopped = threading.Event()
+            self._prefetcher = threading.Thread(target=_prefetchSections, daemon=True,
+                                                args=(self._sections, self._stopped, self.worldGenerator.copy(), self.seedSequence, self._added))
+            self._prefetcher.start()
+            weakref.finalize(self, self._stopped.set)
     
-    def getObservationFloats(self, agent: Agent):
-        """Gets the representation usable for RL"""
-        obs = self.getObservation(agent)
-        layers = self.getObservationInfo(agent)
+    def _section(self, n) -> list[Layer]:
+        """
+        Section n, generated at the current t or taken from the prefetch queue. Sections that were
+        generated before, by a branch of a restored state, are reused
+        """
+        prefetched = self._sections is not None and n >= self._pulled
+        key = n if self._sections is not None else (n, self.t)
+        if self._generated is not None and key in self._generated:
+            self._generated.move_to_end(key)
+            return self._generated[key]
         
-        lst = []
-        for i in range(len(obs)):
-            if layers[i].isStatic:
-                lst.append([STATE_REP[x] for x in obs[i]])
-                
-            else:
-                rep = [0 for _ in range(GRIDWIDTH)]
-                d = ((layers[i].speed * self.t) % GRIDWIDTH) % 1
-                
-                for j in range(GRIDWIDTH):
-                    left = STATE_REP[obs[i][j-1]]
-                    right = STATE_REP[obs[i][0]] if j+1 == GRIDWIDTH else STATE_REP[obs[i][j+1]]
-                    middle = STATE_REP[obs[i][j]]
-                    
-                    if left == right == middle:
-                        rep[j] = middle
-                    else:
-                        if layers[i].direction == "l":
-                            if round(d) == 1:
-                                rep[j] = (1-d) * left + (d) * middle
-                            else:
-                                rep[j] = d * right + (1-d) * middle
-                        elif layers[i].direction == "r":
-                            if round(d) == 1:
-                                rep[j] = (1-d) * right + (d) * middle
-                            else:
-                                rep[j] = d * left + (1-d) * middle
-                
-                lst.append([round(x,2) for x in rep])
-        return lst    
+        if prefetched:
+            section = self._sections.get()
+            self._pulled += 1
+        else:
+            section = self.worldGenerator.add(0 if self._sections is not None else self.t, _sectionRng(self.seedSequence, n))
+        if self._generated is not None:
+            self._generated[key] = section
+            if len(self._generated) > GENERATED_SECTIONS:
+                self._generated.popitem(last=False)
+        return section
+    
+    def close(self) -> None:
+        """Stops the prefetching thread, if any"""
+        if self._sections is not None:
+            self._stopped.set()
+            self._prefetcher.join()
+    
+    def getWindow(self, agent: Agent) -> tuple[list[Layer], np.ndarray]:
+        """
+        The visible layers and their tile codes at the current t, one row per layer.
+        The window is cached: it is rebuilt when the agent changes rows or the world
+        changes, and only the rows of layers whose period is above 1 are re-evaluated
+        when just t changed.
+        The returned array is overwritten by later calls, copy it to keep it.
+        """
+        base = agent.y-self.config.LAYERS_UNDERNEATH+1
+        if self._window is not None and self._window[0] == base:
+            _, t, layers, codes, timed, direction, phase = self._window
+            if t != self.t:
+                for i in timed:
+                    codes[i] = layers[i].observation(self.t)
+                    phase[i] = layers[i].phase(self.t)
+                self._window = (base, self.t, layers, codes, timed, direction, phase)
+            return layers, codes
+        
+        layers = self[base:base+self.config.GRIDHEIGHT]
+        codes = np.empty((len(layers), self.config.GRIDWIDTH), dtype=np.uint8)
+        for i, layer in enumerate(layers):
+            codes[i] = layer.observation(self.t)
+        timed = [i for i, layer in enumerate(layers) if layer.period > 1]
+        
+        # Per row direction and sub-cell phase, as used by interpolateFloats
+        direction = np.zeros(len(layers), dtype=np.int8)
+        phase = np.zeros(len(layers), dtype=np.float64)
+        for i, layer in enumerate(layers):
+            if not layer.isStatic:
+                direction[i] = 1 if layer.direction == "r" else -1
+                phase[i] = layer.phase(self.t)
+        
+        self._window = (base, self.t, layers, codes, timed, direction, phase)
+        return layers, codes
+    
+    def getWindowMotion(self, agent: Agent) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Direction (1 right, -1 left, 0 static) and sub-cell phase of every row of the window.
+        Like the tile codes, the arrays are overwritten by later calls.
+        """
+        self.getWindow(agent)
+        return self._window[5:]
+    
+    def getObservationFloats(self, agent: Agent) -> np.ndarray:
+        """Gets the representation usable for RL, one row of floats per visible layer"""
+        _, codes = self.getWindow(agent)
+        direction, phase = self.getWindowMotion(agent)
+        return interpolateFloats(codes, direction, phase, self.config.TILE_REP)
                   
     def getObservation(self,agent: Agent):
-        """Raw observation: in terms of letters"""
-        obs = []
-        for layer in self.world[agent.y-LAYERS_UNDERNEATH+1:agent.y-LAYERS_UNDERNEATH+1+GRIDHEIGHT]:
-            obs.append(layer.observation(self.t))
-        return obs
+        """Raw observation: in terms of tile codes, one view per layer"""
+        return list(self.getWindow(agent)[1].copy())
     
     def getObservationInfo(self, agent: Agent):
         """Extracts the type(layer) in the visible world"""
-        obs = []
-        for layer in self.world[agent.y-LAYERS_UNDERNEATH+1:agent.y-LAYERS_UNDERNEATH+1+GRIDHEIGHT]:
-            obs.append(layer)
-        return obs
+        return list(self.getWindow(agent)[0])
+
+    def shortestPath(self, agent: Agent, row = None, maxSteps = oracle.ORACLE_STEPS) -> list[int]:
+        """
+        Shortest safe sequence of actions of agent to row, or to the highest row it can reach
+        if row is None. None if row cannot be reached within maxSteps ticks, see oracle.shortestPath
+        """
+        return oracle.shortestPath(self, agent.x, agent.y, row, maxSteps)
+    
+    def survival(self, agent: Agent, maxSteps = oracle.ORACLE_STEPS) -> int:
+        """Number of ticks agent can stay alive at best, at most maxSteps, see oracle.survivalPath"""
+        return len(oracle.survivalPath(self, agent.x, agent.y, maxSteps))
 
     def getWorldGenerator(self,wg:str):
         """
@@ -77,34 +253,95 @@ class World:
         If worldGenerator == None, the Default class will be used
         If worldGenerator does not match any of the classes, it will use default and warn the user
         """
-        if wg == None: return Default()
-        generators = {
-            'default': Default(),
-            'nologs': NoLogs(),
-            'hybrid': Hybrid(),
-            'lookalike': Lookalike(),
-            'lookalikeincdif': LookalikeIncDif(),
-            'allgrass': AllGrass(),
-            'alllogs': AllLogs()
-        }
-        if generators.get(wg, False): return generators[wg]
-        print(f"WARNING: {wg} is not in {list(generators.keys())}; using Default() instead.")
-        return Default()
+        if wg == None: return Default(self.config)
+        if GENERATORS.get(wg, False): return GENERATORS[wg](self.config)
+        print(f"WARNING: {wg} is not in {list(GENERATORS.keys())}; using Default() instead.")
+        return Default(self.config)
     
     def add_section(self) -> None:
         """
-        Adds a single layer, with properties defined in CONST
+        Adds a single layer, with properties defined in the config
         You can add sections as well, though these are lists of layers
         so you will have to append each layer or use the + operator
+        In prefetch mode, the section is taken from the queue of prefetched sections
+        In bank mode, a random section of the bank is used
         """
-        section = self.worldGenerator.add(self.t)
+        if self.bank is not None:
+            section = self.bank.section(self.rng.integers(len(self.bank)), self.config)
+        else:
+            section = self._section(self._added)
+        self._own()
         self.world.extend(section)
+        self._added += 1
+        self._window = None
+    
+    def evict(self, row) -> None:
+        """
+        Frees every layer below row and replaces the layer at row by a wall of bushes,
+        such that the agent can never go back to the freed layers
+        """
+        if row <= self.offset:
+            return
+        self._own()
+        while self.offset < row:
+            self.world.popleft()
+            self.offset += 1
+        self.world[0] = self.bottom
+        self._window = None
+    
+    def _own(self) -> None:
+        """Copies the layers before they are changed, if they are shared with a cloned state"""
+        if self._shared:
+            self.world = deque(self.world)
+            self._shared = False
+    
+    def cloneState(self) -> tuple:
+        """
+        Snapshot of the world, which restoreState restores. The layers are shared with the
+        world until it grows or evicts layers, and sections that are generated after the
+        snapshot are kept, such that every branch from it sees the same sections
+        """
+        self._shared = True
+        if self._generated is None:
+            self._generated = OrderedDict()
+        window = self._window
+        if window is not None:
+            window = window[:3] + (window[3].copy(),) + window[4:6] + (window[6].copy(),)
+        rng = self.rng.bit_generator.state if self.bank is not None else None
+        return (self.t, self.offset, self.world, self._added, window, rng)
+    
+    def restoreState(self, state: tuple) -> None:
+        """Restores a snapshot of cloneState of this world"""
+        self.t, self.offset, self.world, self._added, window, rng = state
+        self._shared = True
+        if window is not None:
+            window = window[:3] + (window[3].copy(),) + window[4:6] + (window[6].copy(),)
+        self._window = window
+        if rng is not None:
+            self.rng.bit_generator.state = rng
     
     def __len__(self):
-        return len(self.world)
+        """Number of rows generated so far, including the freed ones"""
+        return self.offset + len(self.world)
     def __iter__(self):
-        return self.world
+        return iter(self.world)
     def __getitem__(self,i):
-        return self.world[i]
+        """
+        Layers by absolute row, negative rows count from the top like for a list.
+        Slices leave out the freed rows, a freed row raises an IndexError.
+        """
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self.world[r-self.offset] for r in range(start, stop, step) if r >= self.offset]
+            start = max(start, self.offset)
+            return list(islice(self.world, start-self.offset, max(stop, start)-self.offset))
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"Layer {i} has not been generated, there are {len(self)} layers")
+        if i < 0:
+            i += len(self)
+        if i < self.offset:
+            raise IndexError(f"Layer {i} has been freed, the lowest layer kept is {self.offset}")
+        return self.world[i-self.offset]
   
   
\ No newline at end of file